@@ -0,0 +1,97 @@
+"""Пакеты действий: проверка формата и предусловий.
+
+Планировщик может вернуть вместе с "action" список "next_actions" -
+действия, которые выполняются сразу следом без нового вызова модели.
+У каждого из них может быть "precondition" - условие, при котором план
+еще актуален:
+
+    {"element_present": 3}       элемент с номером 3 из запроса на месте
+    {"url_unchanged": true}      URL не изменился с момента планирования
+    {"url_contains": "/cart"}    URL содержит подстроку
+    {"text_present": "Корзина"}  текст есть на странице
+
+Если условие не выполнено или действие завершилось ошибкой, остаток
+пакета отбрасывается и агент планирует заново.
+"""
+from typing import Dict, List, Optional
+
+ACTION_TYPES = {'navigate', 'click', 'type', 'press', 'scroll', 'wait', 'ask_user', 'complete'}
+
+# ask_user требует участия человека, поэтому в пакете не допускается
+BATCH_ACTION_TYPES = ACTION_TYPES - {'ask_user'}
+
+PRECONDITION_KEYS = {'element_present', 'url_unchanged', 'url_contains', 'text_present'}
+
+
+def extract_batch(plan: Dict, max_actions: int) -> List[Dict]:
+    """Действия пакета после основного; обрывается на первом некорректном"""
+    batch = []
+    for action in plan.get('next_actions') or []:
+        if len(batch) >= max_actions - 1:
+            break
+        if not isinstance(action, dict) or action.get('type') not in BATCH_ACTION_TYPES:
+            break
+        precondition = action.get('precondition') or {}
+        if not isinstance(precondition, dict) or set(precondition) - PRECONDITION_KEYS:
+            break
+        batch.append(action)
+        if action['type'] == 'complete':
+            break
+    return batch
+
+
+async def check_precondition(page, precondition: Optional[Dict], planned_state: Dict) -> Optional[str]:
+    """Проверка предусловия; возвращает причину отказа или None"""
+    if not precondition:
+        return None
+
+    if precondition.get('url_unchanged') and page.url != planned_state.get('url'):
+        return f"URL изменился: {page.url}"
+
+    url_part = precondition.get('url_contains')
+    if url_part and url_part not in page.url:
+        return f"URL не содержит '{url_part}'"
+
+    number = precondition.get('element_present')
+    if number is not None:
+        element = find_element(planned_state, number)
+        if element is None:
+            return f"Нет элемента {number} в списке"
+        locator = page.locator(f"xpath={element['xpath']}")
+        if await locator.count() == 0 or not await locator.first.is_visible():
+            return f"Элемент {number} больше не виден"
+
+    text = precondition.get('text_present')
+    if text and await page.get_by_text(text).count() == 0:
+        return f"Текст '{text}' не найден"
+
+    return None
+
+
+def parse_handle(value) -> Optional[int]:
+    """Номер элемента из ответа модели: 3, "3", "[3]" или 3.0; иначе None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else None
+    if isinstance(value, str):
+        value = value.strip().strip('[]').strip()
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def find_element(page_state: Dict, handle) -> Optional[Dict]:
+    """Элемент по номеру (handle из snapshot.py)"""
+    handle = parse_handle(handle)
+    if handle is None:
+        return None
+    for el in page_state.get('interactive_elements', []):
+        if el.get('handle') == handle:
+            return el
+    return None
+
+
+def describe(action: Dict) -> str:
+    return f"{action.get('type', '')}: {action.get('details', {})}"
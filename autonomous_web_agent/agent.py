@@ -1,26 +1,96 @@
 import asyncio
-from typing import Dict, Any, List
+import time
+from collections import Counter
+from typing import Dict, Any, List, Callable, Optional
 from browser_controller import BrowserController
-from ai_planner import AIPlanner
+from ai_planner import AIPlanner, PlannerSession
 from memory import Memory
 from config import Config
+from actions import extract_batch, check_precondition, describe
+from snapshot import structural_fingerprint
+from telemetry import SamplingProfiler, get_tracer
+from fast_path import FastPath
+from stall import ABORT, RECOVER, Stall, StallDetector, recovery_actions, stall_hint
+from site_knowledge import SiteKnowledge, target_element
+from checkpoint import CheckpointStore
 import json
 
 class AutonomousWebAgent:
-    def __init__(self, headless=False):
-        self.browser = BrowserController(headless=headless)
-        self.planner = AIPlanner()
+    def __init__(self, headless=False, browser: BrowserController = None, planner: AIPlanner = None,
+                 checkpoints: bool = False):
+        self.browser = browser or BrowserController(headless=headless)
+        # Свой планировщик агент закрывает сам, общий (TaskScheduler) - владелец
+        self._owns_planner = planner is None
+        self.planner = planner or AIPlanner()
+        # Состояние планирования текущей задачи: планировщик может быть общим
+        self.planner_session = PlannerSession()
         self.memory = Memory()
         self.running = False
         self.current_task = ""
+        self.planner_calls = 0
+        # Шаги, план которых взят из кэша решений, - без вызова модели
+        self.decision_cache_hits = 0
+        self.actions_executed = 0
+        # Локальные правила для очевидных шагов (fast_path.py)
+        self.fast_path = FastPath() if Config.FAST_PATH else None
+        self.fast_path_hits = 0
+        self.tokens: Counter = Counter()
+        # Обнаружение зацикливания (stall.py)
+        self.stall = StallDetector()
+        # Элементы, которые уже срабатывали на сайтах (site_knowledge.py)
+        self.knowledge = None
+        if Config.SITE_KNOWLEDGE:
+            try:
+                self.knowledge = SiteKnowledge(Config.SITE_KNOWLEDGE_PATH, Config.SITE_KNOWLEDGE_HALF_LIFE_DAYS)
+            except Exception as e:
+                print(f"Знания о сайтах недоступны: {e}")
+        self._learning: Optional[asyncio.Future] = None
+        # Контрольные точки для продолжения задачи после падения (checkpoint.py).
+        # Только для одиночной задачи из командной строки: задачи пакета и
+        # сервиса продолжать через --resume некому
+        self.checkpoints = None
+        if checkpoints:
+            try:
+                self.checkpoints = CheckpointStore(Config.CHECKPOINT_PATH, Config.CHECKPOINT_STORAGE_EVERY,
+                                                   storage=Config.CHECKPOINT_STORAGE)
+            except Exception as e:
+                print(f"Контрольные точки недоступны: {e}")
+        # Получатели событий шагов (запись трассы, прогресс и т.п.)
+        self.step_listeners: List[Callable[[Dict], None]] = []
+        self.tracer = get_tracer()
+        # Задача, запущенная из interactive_mode (ее прерывает /stop)
+        self._current: Optional[asyncio.Task] = None
         
-    async def initialize(self):
+    def add_step_listener(self, listener: Callable[[Dict], None]):
+        self.step_listeners.append(listener)
+    
+    def remove_step_listener(self, listener: Callable[[Dict], None]):
+        if listener in self.step_listeners:
+            self.step_listeners.remove(listener)
+    
+    def _emit(self, event: Dict):
+        for listener in list(self.step_listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"Ошибка обработчика событий: {e}")
+    
+    def stop(self):
+        """Остановка текущей задачи: цикл завершится, начатый шаг прерывается"""
+        self.running = False
+        if self._current is not None and not self._current.done():
+            self._current.cancel()
+    
+    async def initialize(self, storage_state: Optional[Dict] = None):
+        """storage_state - cookies и localStorage из контрольной точки"""
         print("Инициализация агента...")
-        await self.browser.start()
+        await self.browser.start(storage_state=storage_state)
         print("Браузер запущен")
         return True
     
-    async def run_task(self, task: str) -> Dict[str, Any]:
+    async def run_task(self, task: str, resume: Optional[Dict] = None) -> Dict[str, Any]:
+        """Выполнение задачи; resume - контрольная точка (CheckpointStore.latest),
+        с которой задача продолжается"""
         print(f"\nНачинаю выполнение задачи: {task}")
         print("=" * 50)
         
@@ -30,77 +100,356 @@ class AutonomousWebAgent:
         
         steps = 0
         max_steps = Config.MAX_STEPS
+        self.planner_calls = 0
+        self.decision_cache_hits = 0
+        self.actions_executed = 0
+        self.fast_path_hits = 0
+        self.tokens = Counter()
+        self.planner_session = PlannerSession()
+        if resume is not None:
+            steps = await self._restore(resume)
+        if self.checkpoints is not None:
+            self.checkpoints.begin(task, resume)
+        self.stall.reset()
+        if self.knowledge is not None:
+            self.knowledge.reset_cache()
+        if self.browser.cache_route is not None:
+            self.browser.cache_route.reset_stats()
+        if self.browser.prefetcher is not None:
+            self.browser.prefetcher.reset_stats()
+        self._emit({'event': 'task', 'task': task,
+                    'start_url': self.browser.page.url if self.browser.page else ''})
+        
+        profiler = SamplingProfiler() if Config.PROFILE else None
+        if profiler:
+            profiler.start()
         
         try:
             while self.running and steps < max_steps:
                 steps += 1
                 print(f"\nШаг {steps}/{max_steps}")
                 
-                print("Анализирую страницу...")
-                page_state = await self.browser.get_page_state()
-                self.memory.add_observation(page_state)
-                
-                print("Планирую следующее действие...")
-                plan = await self.planner.plan_next_action(
-                    task=self.current_task,
-                    history=[h['action'] for h in self.memory.get_recent_history(5)],
-                    page_state=page_state
-                )
-                
-                if 'thoughts' in plan:
-                    print(f"AI: {plan['thoughts']}")
-                
-                action = plan.get('action', {})
-                action_type = action.get('type', '')
-                confidence = plan.get('confidence', 0.5)
-                
-                print(f"Действие: {action_type} (уверенность: {confidence:.2f})")
+                with self.tracer.span('step', step=steps):
+                    outcome = await self._step(steps)
+                if outcome is not None:
+                    await self._finish_checkpoint()
+                    return outcome
+                await self._checkpoint(steps)
                 
-                if action_type == 'complete':
-                    result = action.get('details', {}).get('result', 'Задача выполнена')
-                    print(f"\nЗАДАЧА ВЫПОЛНЕНА: {result}")
-                    self.running = False
-                    return {
-                        'success': True,
-                        'result': result,
-                        'steps': steps,
-                        'history': self.memory.history
-                    }
-                
-                elif action_type == 'ask_user':
-                    question = action.get('details', {}).get('question', '')
-                    print(f"\nВОПРОС К ПОЛЬЗОВАТЕЛЮ: {question}")
-                    print("Для демо продолжаю выполнение...")
-                    action = {'type': 'wait', 'details': {'seconds': 1}}
-                
-                if action_type not in ['complete', 'ask_user']:
-                    result = await self.browser.execute_action(action)
-                    self.memory.add_action(action, result)
-                    
-                    if result.get('success'):
-                        print(f"Успешно: {result.get('result', '')}")
-                    else:
-                        print(f"Ошибка: {result.get('error', 'Неизвестная ошибка')}")
-                
-                await asyncio.sleep(Config.THINKING_DELAY)
+                if Config.THINKING_DELAY > 0:
+                    await asyncio.sleep(Config.THINKING_DELAY)
             
             if steps >= max_steps:
                 print(f"\nДостигнут лимит шагов ({max_steps})")
-                return {
-                    'success': False,
-                    'error': f'Достигнут лимит шагов ({max_steps})',
-                    'steps': steps,
-                    'history': self.memory.history
-                }
+                await self._finish_checkpoint()
+                return self._task_result(False, steps, error=f'Достигнут лимит шагов ({max_steps})')
+            
+            print("\nЗадача остановлена")
+            return self._task_result(False, steps, error='Задача остановлена', stopped=True)
                 
+        except asyncio.CancelledError:
+            # Отмена снаружи (/stop, отмена задания сервиса, таймаут) прерывает текущий шаг
+            self.running = False
+            self._task_result(False, steps, error='Задача отменена', stopped=True)
+            raise
         except Exception as e:
             print(f"\nКритическая ошибка: {e}")
-            return {
-                'success': False,
-                'error': str(e),
-                'steps': steps,
-                'history': self.memory.history
-            }
+            return self._task_result(False, steps, error=str(e))
+        finally:
+            if profiler:
+                profiler.stop()
+                print(profiler.report())
+    
+    async def _restore(self, checkpoint: Dict) -> int:
+        """Память, счетчики и страница из контрольной точки; возвращает номер шага"""
+        counters = checkpoint.get('counters', {})
+        self.memory.restore(checkpoint['task'], checkpoint.get('history', []),
+                            counters.get('total_actions', 0), counters.get('successful_actions', 0))
+        self.planner_calls = counters.get('planner_calls', 0)
+        self.decision_cache_hits = counters.get('decision_cache_hits', 0)
+        self.actions_executed = counters.get('actions_executed', 0)
+        self.fast_path_hits = counters.get('fast_path_hits', 0)
+        self.tokens = Counter(counters.get('tokens') or {})
+        url = checkpoint.get('url')
+        if url and self.browser.page is not None and self.browser.page.url != url:
+            await self.browser.page.goto(url, wait_until=self.browser.readiness.wait_until)
+        print(f"Продолжаю задачу с шага {checkpoint['step']} ({url})")
+        return checkpoint['step']
+    
+    async def _checkpoint(self, step: int):
+        if self.checkpoints is None or self.browser.page is None:
+            return
+        counters = {
+            'planner_calls': self.planner_calls,
+            'decision_cache_hits': self.decision_cache_hits,
+            'actions_executed': self.actions_executed,
+            'fast_path_hits': self.fast_path_hits,
+            'tokens': dict(self.tokens),
+        }
+        try:
+            await self.checkpoints.save(step, self.browser.page.url, self.memory, counters,
+                                        self.browser.context)
+        except Exception as e:
+            print(f"Ошибка контрольной точки: {e}")
+    
+    async def _finish_checkpoint(self):
+        """Задача завершилась сама - продолжать ее не понадобится"""
+        if self.checkpoints is None:
+            return
+        try:
+            await self.checkpoints.finish()
+        except Exception as e:
+            print(f"Ошибка удаления контрольной точки: {e}")
+    
+    async def _step(self, step: int) -> Optional[Dict[str, Any]]:
+        """Один шаг: наблюдение, планирование, действие.
+
+        Возвращает результат задачи, если она завершилась на этом шаге.
+        """
+        print("Анализирую страницу...")
+        step_started = time.perf_counter()
+        page_state = await self.browser.get_page_state()
+        self.memory.add_observation(page_state)
+        if self.knowledge is not None and page_state.get('url'):
+            page_state['site_knowledge'] = await self._site_knowledge(page_state['url'])
+        observed = time.perf_counter()
+        
+        hint = None
+        stall = self.stall.check()
+        if stall is not None:
+            level = self.stall.escalate(stall)
+            self._emit({'event': 'stall', 'step': step, 'kind': stall.kind,
+                        'reason': stall.reason, 'level': level})
+            if level >= ABORT:
+                print(f"\nЗадача остановлена досрочно: {stall.reason}")
+                return self._task_result(False, step, error=f'Агент зациклился: {stall.reason}',
+                                         stalled=stall.kind)
+            if level == RECOVER:
+                print(f"Агент застрял ({stall.reason}), пробую выйти из тупика")
+                await self._recover(stall, step, page_state)
+                return None
+            print(f"Агент застрял ({stall.reason}), подсказываю планировщику")
+            hint = stall_hint(stall)
+        
+        print("Планирую следующее действие...")
+        pending = {}
+        
+        async def dispatch(early_action):
+            # Действие из потока ответа запускаем сразу, пока модель дописывает ответ
+            if early_action.get('type') not in ('complete', 'ask_user'):
+                pending['action'] = early_action
+                pending['task'] = asyncio.create_task(self.browser.execute_action(early_action))
+        
+        history = [h['action'] for h in self.memory.get_recent_history(5)]
+        plan = None
+        # Правила смотрят на всю историю задачи: иначе поиск или клик по баннеру
+        # повторяются, когда их действие уходит из последних пяти. При подсказке
+        # о зацикливании решает модель - правила подсказку не учитывают
+        if self.fast_path is not None and hint is None:
+            task_history = [h['action'] for h in self.memory.get_recent_history(self.actions_executed)]
+            plan = self.fast_path.decide(self.current_task, task_history, page_state)
+        if plan is None:
+            # Пока модель думает, вероятные следующие страницы грузятся в фоне
+            await self.browser.prefetch(self.current_task, history, page_state)
+            plan = await self.planner.plan_next_action(
+                task=self.current_task,
+                history=history,
+                page_state=page_state,
+                on_action=dispatch,
+                hint=hint,
+                session=self.planner_session
+            )
+            if plan.get('cached'):
+                self.decision_cache_hits += 1
+            else:
+                self.planner_calls += 1
+                self.tokens.update(plan.get('tokens') or {})
+        else:
+            self.fast_path_hits += 1
+        planned = time.perf_counter()
+        step_info = {
+            'step': step,
+            'url': page_state.get('url', ''),
+            'fingerprint': page_state.get('fingerprint'),
+            'structure': structural_fingerprint(page_state),
+            'plan': {k: plan[k] for k in ('confidence', 'thoughts', 'cached', 'fast_path', 'tokens') if k in plan},
+            'timings': {
+                'observe_ms': round((observed - step_started) * 1000, 1),
+                'plan_ms': round((planned - observed) * 1000, 1),
+            },
+        }
+        
+        if 'thoughts' in plan:
+            print(f"AI: {plan['thoughts']}")
+        
+        action = pending.get('action') or plan.get('action', {})
+        action_type = action.get('type', '')
+        confidence = plan.get('confidence', 0.5)
+        
+        source = " [кэш]" if plan.get('cached') else ""
+        if plan.get('fast_path'):
+            source = f" [правило {plan['fast_path']}]"
+        print(f"Действие: {action_type} (уверенность: {confidence:.2f}){source}")
+        
+        if action_type == 'complete':
+            result = action.get('details', {}).get('result', 'Задача выполнена')
+            self._emit(dict(step_info, event='complete', action=action))
+            return self._complete(result, step)
+        
+        elif action_type == 'ask_user':
+            question = action.get('details', {}).get('question', '')
+            print(f"\nВОПРОС К ПОЛЬЗОВАТЕЛЮ: {question}")
+            print("Для демо продолжаю выполнение...")
+            action = {'type': 'wait', 'details': {'seconds': 1}}
+        
+        if action_type not in ['complete', 'ask_user']:
+            if 'task' in pending:
+                result = await pending['task']
+            else:
+                result = await self.browser.execute_action(action)
+            step_info['timings']['act_ms'] = round((time.perf_counter() - planned) * 1000, 1)
+            self._record_action(action, result, plan, step_info, page_state)
+            
+            if result.get('success'):
+                completion = await self._run_batch(plan, page_state, step_info)
+                if completion is not None:
+                    return self._complete(completion, step)
+        
+        return None
+    
+    async def _run_batch(self, plan: Dict, planned_state: Dict, step_info: Dict):
+        """Выполнение next_actions из плана без нового вызова модели.
+
+        Возвращает результат задачи, если пакет закончился действием complete.
+        """
+        for index, action in enumerate(extract_batch(plan, Config.MAX_BATCH_ACTIONS), 1):
+            precondition = action.get('precondition')
+            reason = await check_precondition(self.browser.page, precondition, planned_state)
+            if reason:
+                print(f"Пакет прерван перед '{describe(action)}': {reason}")
+                return None
+            
+            batch_info = dict(step_info, batch_index=index, precondition=precondition)
+            if action['type'] == 'complete':
+                self._emit(dict(batch_info, event='complete', action=action))
+                return action.get('details', {}).get('result', 'Задача выполнена')
+            
+            print(f"Действие из пакета: {describe(action)}")
+            action = {'type': action['type'], 'details': action.get('details', {})}
+            started = time.perf_counter()
+            result = await self.browser.execute_action(action)
+            batch_info['timings'] = {'act_ms': round((time.perf_counter() - started) * 1000, 1)}
+            self._record_action(action, result, plan, batch_info, planned_state)
+            if not result.get('success'):
+                return None
+        return None
+    
+    async def _recover(self, stall: Stall, step: int, page_state: Dict):
+        """Восстанавливающие действия без вызова планировщика"""
+        step_info = {
+            'step': step,
+            'url': page_state.get('url', ''),
+            'fingerprint': page_state.get('fingerprint'),
+            'structure': structural_fingerprint(page_state),
+            'plan': {'recovery': stall.kind},
+        }
+        last_action = self.memory.get_recent_history(1)
+        for action in recovery_actions(stall, last_action[0]['action'] if last_action else None):
+            print(f"Восстановление: {describe(action)}")
+            started = time.perf_counter()
+            result = await self.browser.execute_action(action)
+            info = dict(step_info, timings={'act_ms': round((time.perf_counter() - started) * 1000, 1)})
+            self._record_action(action, result, {}, info, page_state)
+    
+    def _record_action(self, action: Dict, result: Dict, plan: Dict, step_info: Dict,
+                       page_state: Optional[Dict] = None):
+        element = target_element(action, page_state) if page_state else None
+        self.memory.add_action(action, result, step_info.get('url', ''), element)
+        self.stall.record(step_info.get('url', ''), step_info.get('fingerprint'), action,
+                          bool(result.get('success')), bool(plan.get('fallback')))
+        self.actions_executed += 1
+        self._emit(dict(step_info, event='action', action=action, result=result))
+        
+        if result.get('success'):
+            print(f"Успешно: {result.get('result', '')}")
+            if 'wait_ms' in result:
+                timeout_note = " (по таймауту)" if result.get('timed_out') else ""
+                print(f"Ожидание страницы: {result['wait_ms']:.0f} мс{timeout_note}")
+            if result.get('prefetched'):
+                print(f"Страница загружена заранее, сэкономлено {result['saved_ms']:.0f} мс")
+            if result.get('network', {}).get('blocked'):
+                network = result['network']
+                print(f"Заблокировано запросов: {network['blocked']} из {network['requests']}, "
+                      f"~{network['bytes_saved'] // 1024} КБ")
+        else:
+            print(f"Ошибка: {result.get('error', 'Неизвестная ошибка')}")
+            self.planner.invalidate_decision(plan.get('cache_key'))
+    
+    async def _site_knowledge(self, url: str) -> List[Dict]:
+        """Записи о сайте; в базу - только при первом обращении к домену за задачу"""
+        try:
+            if self.knowledge.cached(url):
+                return self.knowledge.lookup(url)
+            return await asyncio.to_thread(self.knowledge.lookup, url)
+        except Exception as e:
+            print(f"Ошибка чтения знаний о сайте: {e}")
+            return []
+    
+    async def _learn(self, history: List[Dict], success: bool, final_url: str,
+                     previous: Optional[asyncio.Future]):
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        try:
+            learned = await asyncio.to_thread(self.knowledge.learn, history, success, final_url)
+            if learned:
+                print(f"Запомнено действий с элементами сайта: {learned}")
+        except Exception as e:
+            print(f"Ошибка записи знаний о сайте: {e}")
+    
+    def _complete(self, result: str, steps: int) -> Dict[str, Any]:
+        print(f"\nЗАДАЧА ВЫПОЛНЕНА: {result}")
+        self.running = False
+        return self._task_result(True, steps, result=result)
+    
+    def _task_result(self, success: bool, steps: int, **fields) -> Dict[str, Any]:
+        actions_per_plan = self.actions_executed / self.planner_calls if self.planner_calls else 0.0
+        print(f"Действий на вызов планировщика: {actions_per_plan:.2f}")
+        if self.fast_path_hits:
+            print(f"Шагов по локальным правилам (без вызова модели): {self.fast_path_hits}")
+        if self.decision_cache_hits:
+            print(f"Шагов из кэша решений (без вызова модели): {self.decision_cache_hits}")
+        if self.tokens:
+            print(f"Токены: промпт {self.tokens.get('prompt', self.tokens['estimated'])}, "
+                  f"из кэша контекста {self.tokens['cached']}, ответ {self.tokens['output']}")
+        if self.knowledge is not None and self.actions_executed:
+            # Запись в SQLite - в потоке, результат задачи ее не ждет
+            self._learning = asyncio.ensure_future(self._learn(
+                self.memory.get_recent_history(self.actions_executed), success,
+                self.browser.page.url if self.browser.page else '', self._learning))
+        if self.browser.cache_route is not None:
+            fields['response_cache'] = self.browser.cache_route.stats()
+            print(f"Кэш ответов: попаданий {fields['response_cache']['hits']}, "
+                  f"hit rate {fields['response_cache']['hit_rate']:.0%}, "
+                  f"отдано из кэша {fields['response_cache']['bytes_served'] // 1024} КБ")
+        if self.browser.prefetcher is not None:
+            fields['prefetch'] = self.browser.prefetcher.stats()
+            print(f"Упреждающая загрузка: попаданий {fields['prefetch']['hits']} "
+                  f"из {fields['prefetch']['opportunities']} переходов, "
+                  f"сэкономлено {fields['prefetch']['saved_ms'] / 1000:.1f} с")
+        self._emit({'event': 'end', 'success': success, 'steps': steps, **fields})
+        return {
+            'success': success,
+            **fields,
+            'steps': steps,
+            'planner_calls': self.planner_calls,
+            'decision_cache_hits': self.decision_cache_hits,
+            'actions_executed': self.actions_executed,
+            'fast_path_hits': self.fast_path_hits,
+            'escalations': self.planner_session.escalations,
+            'tokens': dict(self.tokens),
+            'actions_per_plan': round(actions_per_plan, 2),
+            'history': self.memory.history
+        }
     
     async def interactive_mode(self):
         print("\n" + "="*50)
@@ -116,22 +465,50 @@ class AutonomousWebAgent:
         
         while True:
             try:
-                user_input = input("\nВведите команду или задачу: ").strip()
+                # input() в отдельном потоке: цикл событий продолжает выполнять задачу
+                user_input = (await asyncio.to_thread(input, "\nВведите команду или задачу: ")).strip()
                 
                 if not user_input:
                     continue
                 
                 if user_input.lower() == '/exit':
                     print("Выход...")
+                    self.stop()
                     break
                 
                 elif user_input.lower() == '/status':
+                    running = self._current is not None and not self._current.done()
+                    print(f"Задача: {self.current_task if running else 'нет'}")
                     print(f"{self.memory.get_summary()}")
+                    print(f"Вызовов планировщика: {self.planner_calls}, действий: {self.actions_executed}")
+                    print("Фазы шага:")
+                    print(self.tracer.aggregator.format())
+                    llm = getattr(self.planner, 'llm', None)
+                    if llm is not None:
+                        print(f"Вызовы модели: {llm.stats()}")
+                    if self.planner.cache is not None:
+                        print(f"Кэш решений: {self.planner.cache.stats()}")
+                    if self.fast_path is not None:
+                        print(f"Быстрый путь: {self.fast_path.stats()}")
+                    if self.stall.detections:
+                        print(f"Зацикливания: {dict(self.stall.detections)}")
+                    if self.knowledge is not None:
+                        print(f"Знания о сайтах: {self.knowledge.stats()}")
+                    if self.checkpoints is not None:
+                        print(f"Контрольные точки: {self.checkpoints.stats()}")
+                    if self.browser.prefetcher is not None:
+                        print(f"Упреждающая загрузка: {self.browser.prefetcher.stats()}")
+                    totals = self.browser.router.totals
+                    print(f"Сеть ({self.browser.router.profile}): заблокировано {totals['blocked']} "
+                          f"из {totals['requests']} запросов, ~{totals['bytes_saved'] // 1024} КБ")
                 
                 elif user_input.lower() == '/stop':
-                    self.running = False
+                    self.stop()
                     print("Агент остановлен")
                 
+                elif self._current is not None and not self._current.done():
+                    print("Задача еще выполняется: дождитесь ее или используйте /stop")
+                
                 elif user_input.lower().startswith('/url '):
                     url = user_input[5:].strip()
                     if url:
@@ -141,17 +518,35 @@ class AutonomousWebAgent:
                 elif user_input.lower().startswith('/task '):
                     task = user_input[6:].strip()
                     if task:
-                        await self.run_task(task)
+                        self._start_background(task)
                 
                 else:
-                    await self.run_task(user_input)
+                    self._start_background(user_input)
                     
-            except KeyboardInterrupt:
+            except (KeyboardInterrupt, EOFError):
                 print("\nПрервано пользователем")
+                self.stop()
                 break
             except Exception as e:
                 print(f"Ошибка: {e}")
+        
+        if self._current is not None:
+            await asyncio.gather(self._current, return_exceptions=True)
+    
+    def _start_background(self, task: str):
+        self._current = asyncio.create_task(self.run_task(task))
     
     async def close(self):
+        if self.knowledge is not None:
+            if self._learning is not None:
+                await asyncio.gather(self._learning, return_exceptions=True)
+            self.knowledge.close()
+            self.knowledge = None
+        if self.checkpoints is not None:
+            # Незаписанная точка прерванной задачи нужна для --resume
+            await self.checkpoints.flush()
+            self.checkpoints.close()
+        if self._owns_planner:
+            self.planner.close()
         await self.browser.close()
         print("Агент завершил работу")
\ No newline at end of file
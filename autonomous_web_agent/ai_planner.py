@@ -1,13 +1,55 @@
-import google.genai as genai
 import json
 import re
-from typing import Dict, Any, List
+import time
+from typing import Dict, Any, List, Callable, Awaitable, Optional
 from config import Config
+from json_stream import ActionStreamParser
+from decision_cache import DecisionCache
+from telemetry import get_tracer
+from prompt_compiler import ENCODING_LEGEND, PrefixCache, PromptCompiler
+from llm_client import LLMClient
+
+
+class PlannerSession:
+    """Состояние планирования одной задачи.
+
+    Один AIPlanner может обслуживать несколько задач сразу (TaskScheduler),
+    поэтому все, что зависит от прошлых шагов задачи, хранит агент и
+    передает в plan_next_action.
+    """
 
-class AIPlanner:
     def __init__(self):
-        self.client = genai.Client(api_key=Config.GEMINI_API_KEY)
+        # Прошлый ответ был неуверенным - следующий шаг у сильной модели
+        self.escalate_next = False
+        self.escalations = 0
+        # Отпечаток страницы из последнего отправленного модели промпта
+        self.sent_fingerprint: Optional[str] = None
+
+
+class AIPlanner:
+    def __init__(self, client=None, cache: Optional[DecisionCache] = None):
+        if client is None:
+            # SDK Gemini тяжелый - импортируем, только когда клиент действительно нужен
+            import google.genai as genai
+            client = genai.Client(api_key=Config.GEMINI_API_KEY)
+        self.client = client
         self.model_name = Config.GEMINI_MODEL
+        # Сроки, повторы, дубли запросов и общий лимит (llm_client.py)
+        self.llm = LLMClient(client, timeout=Config.LLM_TIMEOUT, retries=Config.LLM_RETRIES,
+                             hedge=Config.LLM_HEDGE, hedge_percentile=Config.LLM_HEDGE_PERCENTILE)
+        # Более сильная модель для трудных шагов: после ответа с низкой
+        # уверенностью и вместо неразобранного ответа быстрой модели
+        self.strong_model = Config.GEMINI_STRONG_MODEL or None
+        if cache is None and Config.DECISION_CACHE:
+            cache = DecisionCache(
+                max_entries=Config.DECISION_CACHE_SIZE,
+                ttl=Config.DECISION_CACHE_TTL,
+                path=Config.DECISION_CACHE_PATH,
+            )
+        self.cache = cache
+        self.compiler = PromptCompiler(Config.PROMPT_TOKEN_BUDGET, max_elements=Config.PROMPT_ELEMENTS,
+                                       viewport_height=Config.VIEWPORT['height'])
+        self.prefix_cache = PrefixCache(Config.CONTEXT_CACHE_TTL) if Config.CONTEXT_CACHE else None
         
         self.system_prompt = """Ты - автономный веб-агент, который управляет браузером.
 Твоя задача - выполнять сложные многошаговые задачи в веб-браузере.
@@ -24,118 +66,189 @@ class AIPlanner:
 - Предполагать структуру сайта заранее
 - Использовать хардкодированные подсказки
 
-Формат ответа - всегда JSON:
+Формат ответа - всегда JSON, поле action всегда первым:
 {
-    "thoughts": "Мои размышления о текущей ситуации и следующих шагах",
     "action": {
         "type": "navigate|click|type|press|scroll|wait|ask_user|complete",
         "details": {...}
     },
-    "confidence": 0.8
+    "next_actions": [],
+    "confidence": 0.8,
+    "thoughts": "Мои размышления о текущей ситуации и следующих шагах"
 }
 
+Если следующие шаги очевидны заранее (например, заполнение нескольких полей
+формы), верни их по порядку в "next_actions" - они выполнятся сразу после
+action без нового запроса. У каждого можно указать предусловие:
+{"type": "type", "details": {...}, "precondition": {"element_present": 4}}
+Предусловия: element_present (номер элемента в квадратных скобках), url_unchanged (true),
+url_contains (подстрока URL), text_present (текст на странице).
+Если предусловие не выполнится, остаток пакета будет отменен.
+
 Доступные действия:
 1. navigate: {"url": "https://..."}
-2. click: {"selector": "CSS селектор"} или {"x": 100, "y": 200}
-3. type: {"selector": "input selector", "text": "текст для ввода"}
+2. click: {"element": 12} (номер из списка элементов), {"selector": "CSS селектор"} или {"x": 100, "y": 200}
+3. type: {"element": 7, "text": "текст для ввода"} или {"selector": "input selector", "text": "..."}
 4. press: {"key": "Enter"}
 5. scroll: {"direction": "up|down", "amount": 300}
 6. wait: {"seconds": 2}
 7. ask_user: {"question": "ваш вопрос пользователю"}
 8. complete: {"result": "описание результата"}
 
-Важно: всегда анализируй видимые элементы и выбирай действия на основе текущего контекста."""
+Важно: всегда анализируй видимые элементы и выбирай действия на основе текущего контекста.""" + ENCODING_LEGEND
 
     async def plan_next_action(self, 
                              task: str,
                              history: List[Dict],
-                             page_state: Dict) -> Dict[str, Any]:
+                             page_state: Dict,
+                             on_action: Optional[Callable[[Dict], Awaitable[None]]] = None,
+                             hint: Optional[str] = None,
+                             session: Optional[PlannerSession] = None) -> Dict[str, Any]:
+        """Планирование следующего действия.
+
+        Ответ модели читается потоком через асинхронный клиент. Как только
+        объект "action" полностью получен, он передается в on_action, не
+        дожидаясь остальной части ответа.
         
-        context = self._create_context(task, history, page_state)
+        Если включен кэш решений и для задачи, страницы и истории уже есть
+        решение, оно возвращается без вызова модели (с 'cached': True).
         
-        try:
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=context
-            )
-            
-            if response.text:
-                return self._parse_response(response.text)
-            else:
-                return self._create_fallback_action()
-                
-        except Exception as e:
-            print(f"AI planning error: {e}")
-            return self._create_fallback_action()
-    
-    def _create_context(self, task: str, history: List[Dict], page_state: Dict) -> str:
+        hint - подсказка агента (например, о зацикливании, см. stall.py).
+        С подсказкой кэш не читается: закэшированное решение и привело к повтору.
         
-        recent_history = history[-5:] if len(history) > 5 else history
+        В plan['tokens'] - токены шага: оценка промпта компилятором
+        ('estimated') и, если провайдер их вернул, 'prompt', 'cached' и 'output'.
         
-        context = f"""
-{self.system_prompt}
-
-ТЕКУЩАЯ ЗАДАЧА: {task}
-
-ИСТОРИЯ ДЕЙСТВИЙ (последние {len(recent_history)}):
-{self._format_history(recent_history)}
-
-ТЕКУЩЕЕ СОСТОЯНИЕ СТРАНИЦЫ:
-- URL: {page_state.get('url', 'Unknown')}
-- Заголовок: {page_state.get('title', 'Unknown')}
-
-ВИДИМЫЙ ТЕКСТ (первые 2000 символов):
-{page_state.get('visible_text', '')[:2000]}
-
-ИНТЕРАКТИВНЫЕ ЭЛЕМЕНТЫ (первые 20):
-{self._format_elements(page_state.get('interactive_elements', [])[:20])}
-
-СТРУКТУРА СТРАНИЦЫ:
-{self._format_structure(page_state.get('page_structure', '[]'))}
-
-Что следует сделать дальше для выполнения задачи? Верни JSON с действием.
-"""
-        return context
-    
-    def _format_history(self, history: List[Dict]) -> str:
-        if not history:
-            return "Нет истории действий"
+        Если задана GEMINI_STRONG_MODEL, шаг после ответа с уверенностью ниже
+        Config.ESCALATE_CONFIDENCE планирует она же, а неразобранный ответ
+        быстрой модели сразу переспрашивается у нее. Модель шага - в plan['model'].
         
-        formatted = []
-        for i, action in enumerate(history, 1):
-            formatted.append(f"{i}. {action.get('type', 'unknown')}: {action.get('details', {})}")
-        return "\n".join(formatted)
-    
-    def _format_elements(self, elements: List[Dict]) -> str:
-        if not elements:
-            return "Нет интерактивных элементов"
+        session - состояние задачи между шагами (PlannerSession); без него
+        каждый вызов планируется как первый шаг.
+        """
+        if session is None:
+            session = PlannerSession()
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(task, page_state, history)
+            cached = None if hint else self.cache.get(cache_key)
+            if cached is not None:
+                return dict(cached, cached=True, cache_key=cache_key)
+        
+        tracer = get_tracer()
+        with tracer.span('prompt_build') as span:
+            context, report = self._create_context(task, history, page_state, hint,
+                                                   session.sent_fingerprint)
+            span.attrs['chars'] = len(context)
+            span.attrs['tokens'] = report['tokens']
+            span.attrs['sections'] = report['sections']
+        tokens = {'estimated': report['tokens']}
+        model = self.model_name
+        if self.strong_model and session.escalate_next:
+            model = self.strong_model
+            session.escalations += 1
+        session.escalate_next = False
+        plan, early_action = await self._call_model(model, context, on_action, report['tokens'], tokens)
+        session.sent_fingerprint = page_state.get('fingerprint')
+        if (plan.get('fallback') and early_action is None and self.strong_model
+                and model != self.strong_model):
+            # Быстрая модель не дала ответа - тот же шаг сразу у сильной
+            model = self.strong_model
+            session.escalations += 1
+            plan, early_action = await self._call_model(model, context, on_action, report['tokens'], tokens)
         
-        formatted = []
-        for i, el in enumerate(elements, 1):
-            element_info = f"{i}. {el.get('tag', '')}"
-            
-            if el.get('text'):
-                element_info += f" текст: '{el.get('text')}'"
-            if el.get('placeholder'):
-                element_info += f" placeholder: '{el.get('placeholder')}'"
-            if el.get('type'):
-                element_info += f" type: {el.get('type')}"
-            if el.get('role'):
-                element_info += f" роль: {el.get('role')}"
-            
-            formatted.append(element_info)
+        # Действие уже могло уйти на выполнение - план должен с ним совпадать
+        if early_action is not None and plan.get('fallback'):
+            plan = {'action': early_action, 'confidence': 0.5, 'thoughts': ''}
+        elif early_action is not None:
+            plan['action'] = early_action
         
-        return "\n".join(formatted)
+        if self.strong_model and model != self.strong_model and not plan.get('fallback'):
+            try:
+                session.escalate_next = float(plan.get('confidence', 1.0)) < Config.ESCALATE_CONFIDENCE
+            except (TypeError, ValueError):
+                session.escalate_next = True
+        plan['model'] = model
+        
+        if cache_key is not None and not plan.get('fallback') and self.cache.put(cache_key, plan):
+            plan['cache_key'] = cache_key
+        plan['tokens'] = tokens
+        return plan
     
-    def _format_structure(self, structure_json: str) -> str:
-        try:
-            structure = json.loads(structure_json)
-            formatted = []
-            for item in structure:
-                formatted.append(f"{item.get('tag', '')}: {item.get('text', '')}")
-            return "\n".join(formatted)
-        except:
-            return "Не удалось проанализировать структуру"
+    async def _call_model(self, model: str, context: str, on_action, estimated: int,
+                          tokens: Dict) -> tuple:
+        """Потоковый вызов модели: (план, действие, переданное в on_action)"""
+        parser = ActionStreamParser()
+        early_action = None
+        chunks = []
+        
+        with get_tracer().span('llm', model=model) as span:
+            started = time.perf_counter()
+            try:
+                stream = self.llm.stream(model, context, await self._generation_config(model), estimated)
+                async for chunk in stream:
+                    text = chunk.text or ''
+                    chunks.append(text)
+                    self._record_usage(span, chunk, tokens)
+                    for _, action in parser.feed(text):
+                        if early_action is None:
+                            early_action = action
+                            span.attrs['time_to_action_ms'] = round((time.perf_counter() - started) * 1000, 1)
+                            if on_action:
+                                await on_action(action)
+                
+                response_text = ''.join(chunks)
+                plan = self._parse_response(response_text) if response_text else self._create_fallback_action()
+                    
+            except Exception as e:
+                print(f"AI planning error: {type(e).__name__}: {e}")
+                plan = self._create_fallback_action()
+            span.attrs['fallback'] = bool(plan.get('fallback'))
+        return plan, early_action
+    
+    def _record_usage(self, span, chunk, tokens: Dict):
+        """Число токенов из usage_metadata (приходит в последнем куске)"""
+        usage = getattr(chunk, 'usage_metadata', None)
+        if usage is None:
+            return
+        for key, field in (('prompt', 'prompt_token_count'),
+                           ('cached', 'cached_content_token_count'),
+                           ('output', 'candidates_token_count')):
+            value = getattr(usage, field, None)
+            if value is not None:
+                span.attrs[f'{key}_tokens'] = value
+                tokens[key] = value
+    
+    def close(self):
+        """Фиксация кэша решений; вызывает владелец планировщика"""
+        if self.cache is not None:
+            self.cache.close()
+    
+    def invalidate_decision(self, cache_key: Optional[str]):
+        """Удаление из кэша решения, действие которого завершилось ошибкой"""
+        if self.cache is not None and cache_key:
+            self.cache.invalidate(cache_key)
+    
+    def _create_context(self, task: str, history: List[Dict], page_state: Dict,
+                        hint: Optional[str] = None, sent_fingerprint: Optional[str] = None):
+        """Промпт шага без system_prompt и отчет о токенах (prompt_compiler.py)"""
+        return self.compiler.compile(task, history, page_state, hint,
+                                     sent_fingerprint=sent_fingerprint)
+    
+    async def _generation_config(self, model: str) -> Dict[str, Any]:
+        """system_prompt - из кэша контекста провайдера, если он доступен"""
+        config = {
+            'temperature': Config.TEMPERATURE,
+            'max_output_tokens': Config.MAX_TOKENS,
+        }
+        cached = None
+        if self.prefix_cache is not None:
+            cached = await self.prefix_cache.name(self.client, model, self.system_prompt)
+        if cached:
+            config['cached_content'] = cached
+        else:
+            config['system_instruction'] = self.system_prompt
+        return config
     
     def _parse_response(self, response_text: str) -> Dict[str, Any]:
         try:
@@ -161,5 +274,6 @@ class AIPlanner:
                 "type": "wait",
                 "details": {"seconds": 2}
             },
-            "confidence": 0.1
+            "confidence": 0.1,
+            "fallback": True
         }
\ No newline at end of file
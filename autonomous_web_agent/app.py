@@ -1,3 +1,273 @@
-fruits=["apple","banana","grape"]
-for fruit in fruits:
-    print(fruit)
\ No newline at end of file
+"""HTTP-сервис агента: очередь заданий и пул браузерных контекстов.
+
+Задания выполняет TaskScheduler (scheduler.py): один браузер, заранее
+созданные контексты, ограниченная очередь. Прогресс задания передается
+через Server-Sent Events: сначала все уже случившиеся события, затем
+новые по мере выполнения шагов.
+
+    POST   /jobs               {"task": ..., "url": ..., "group": ..., "timeout": ...}
+                               202 - принято, 429 - очередь заполнена
+    GET    /jobs               последние задания
+    GET    /jobs/{id}          статус и результат (?history=1 - с историей действий)
+    GET    /jobs/{id}/events   поток событий (text/event-stream)
+    DELETE /jobs/{id}          отмена: снимает с очереди или прерывает выполнение
+    GET    /stats              пропускная способность и задержки
+
+Запуск:
+
+    python app.py --port 8080 --concurrency 4
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+
+from config import Config
+from llm_client import get_rate_limiter
+from scheduler import TaskScheduler
+
+SPEC_KEYS = ('task', 'url', 'group', 'timeout')
+FINAL_STATUSES = ('succeeded', 'failed', 'cancelled')
+KEEPALIVE_SECONDS = 15
+
+
+class Job:
+    def __init__(self, spec: Dict[str, Any]):
+        self.id = uuid.uuid4().hex[:12]
+        self.spec = spec
+        self.status = 'queued'
+        self.result: Optional[Dict[str, Any]] = None
+        self.events = []
+        self.subscribers = set()
+        self.future: Optional[asyncio.Future] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINAL_STATUSES
+
+    def publish(self, event: Dict[str, Any]):
+        """Событие шага агента (вызывается как step listener)"""
+        if event.get('event') == 'task':
+            self.status = 'running'
+        self.events.append(event)
+        for queue in self.subscribers:
+            queue.put_nowait(event)
+
+    def finish(self, future: asyncio.Future):
+        if future.cancelled():
+            self.status = 'cancelled'
+        else:
+            self.result = future.result()
+            self.status = 'succeeded' if self.result.get('success') else 'failed'
+        self.finished_at = time.time()
+        self.publish({'event': 'job', 'status': self.status})
+        # None - конец потока для подписчиков SSE
+        for queue in self.subscribers:
+            queue.put_nowait(None)
+
+    def to_dict(self, history: bool = False) -> Dict[str, Any]:
+        data = {
+            'id': self.id,
+            'status': self.status,
+            'task': self.spec['task'],
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            'events': len(self.events),
+        }
+        if self.result is not None:
+            result = dict(self.result)
+            if not history:
+                result.pop('history', None)
+            data['result'] = result
+        return data
+
+
+class JobService:
+    def __init__(self, scheduler: TaskScheduler, max_jobs: int = Config.SERVICE_MAX_JOBS):
+        self.scheduler = scheduler
+        self.max_jobs = max_jobs
+        self.jobs: OrderedDict = OrderedDict()
+
+    def submit(self, spec: Dict[str, Any]) -> Job:
+        """Постановка задания; asyncio.QueueFull, если очередь заполнена"""
+        job = Job(spec)
+        job.future = self.scheduler.submit(spec, spec.get('group', 'default'), listener=job.publish)
+        job.future.add_done_callback(job.finish)
+        self.jobs[job.id] = job
+        self._prune()
+        return job
+
+    def cancel(self, job: Job) -> bool:
+        if job.done:
+            return False
+        return job.future.cancel()
+
+    def _prune(self):
+        # Храним не больше max_jobs заданий, вытесняем самые старые завершенные
+        excess = len(self.jobs) - self.max_jobs
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.done][:max(0, excess)]:
+            del self.jobs[job_id]
+
+
+def _json(data: Any, status: int = 200, **kwargs) -> web.Response:
+    return web.json_response(data, status=status,
+                             dumps=lambda obj: json.dumps(obj, ensure_ascii=False, default=str), **kwargs)
+
+
+def _get_job(request: web.Request) -> Job:
+    job = request.app['service'].jobs.get(request.match_info['job_id'])
+    if job is None:
+        raise web.HTTPNotFound(text='Задание не найдено')
+    return job
+
+
+async def create_job(request: web.Request) -> web.Response:
+    try:
+        body = await request.json()
+    except ValueError:
+        return _json({'error': 'Тело запроса должно быть JSON'}, status=400)
+    if not isinstance(body, dict):
+        return _json({'error': 'Тело запроса должно быть JSON-объектом'}, status=400)
+    task = body.get('task')
+    if not isinstance(task, str) or not task.strip():
+        return _json({'error': 'Не указана задача (task)'}, status=400)
+
+    spec = {key: body[key] for key in SPEC_KEYS if body.get(key) not in (None, '')}
+    spec['task'] = task.strip()
+    for key in ('url', 'group'):
+        if key in spec and not isinstance(spec[key], str):
+            return _json({'error': f'{key} должен быть строкой'}, status=400)
+    if 'timeout' in spec:
+        timeout = spec['timeout']
+        try:
+            timeout = float(timeout) if not isinstance(timeout, bool) else None
+        except (TypeError, ValueError):
+            timeout = None
+        if timeout is None or not 0 < timeout < float('inf'):
+            return _json({'error': 'timeout должен быть положительным числом секунд'}, status=400)
+        spec['timeout'] = timeout
+    try:
+        job = request.app['service'].submit(spec)
+    except asyncio.QueueFull:
+        return _json({'error': 'Очередь заполнена, повторите позже'}, status=429,
+                     headers={'Retry-After': '5'})
+    return _json(job.to_dict(), status=202, headers={'Location': f'/jobs/{job.id}'})
+
+
+async def list_jobs(request: web.Request) -> web.Response:
+    try:
+        limit = int(request.query.get('limit', 50))
+    except ValueError:
+        limit = 0
+    if limit <= 0:
+        return _json({'error': 'limit должен быть положительным целым числом'}, status=400)
+    jobs = list(request.app['service'].jobs.values())[-limit:]
+    return _json({'jobs': [job.to_dict() for job in reversed(jobs)]})
+
+
+async def get_job(request: web.Request) -> web.Response:
+    return _json(_get_job(request).to_dict(history=request.query.get('history') == '1'))
+
+
+async def cancel_job(request: web.Request) -> web.Response:
+    job = _get_job(request)
+    if not request.app['service'].cancel(job):
+        return _json({'error': f'Задание уже завершено ({job.status})'}, status=409)
+    return _json({'id': job.id, 'status': 'cancelling'}, status=202)
+
+
+async def job_events(request: web.Request) -> web.StreamResponse:
+    job = _get_job(request)
+    response = web.StreamResponse(headers={
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+    await response.prepare(request)
+
+    queue: asyncio.Queue = asyncio.Queue()
+    # Подписка и копия прошлых событий без await между ними - ничего не теряется
+    job.subscribers.add(queue)
+    backlog = list(job.events)
+    try:
+        for event in backlog:
+            await _send_event(response, event)
+        if job.done:
+            return response
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                await response.write(b': keepalive\n\n')
+                continue
+            if event is None:
+                break
+            await _send_event(response, event)
+    except ConnectionResetError:
+        # Клиент отключился - задание продолжает выполняться
+        pass
+    finally:
+        job.subscribers.discard(queue)
+    return response
+
+
+async def _send_event(response: web.StreamResponse, event: Dict[str, Any]):
+    data = json.dumps(event, ensure_ascii=False, default=str)
+    await response.write(f"event: {event.get('event', 'message')}\ndata: {data}\n\n".encode('utf-8'))
+
+
+async def get_stats(request: web.Request) -> web.Response:
+    service = request.app['service']
+    statuses: Dict[str, int] = {}
+    for job in service.jobs.values():
+        statuses[job.status] = statuses.get(job.status, 0) + 1
+    return _json({'scheduler': service.scheduler.stats(), 'jobs': statuses,
+                  'llm_rate_limiter': get_rate_limiter().stats()})
+
+
+def create_app(scheduler: Optional[TaskScheduler] = None) -> web.Application:
+    """Приложение aiohttp; scheduler можно передать свой (например, с другим планировщиком)"""
+    scheduler = scheduler or TaskScheduler(max_queue=Config.SERVICE_MAX_QUEUE)
+    app = web.Application()
+    app['service'] = JobService(scheduler)
+
+    async def on_startup(app):
+        await scheduler.start()
+
+    async def on_cleanup(app):
+        await scheduler.close()
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    app.router.add_post('/jobs', create_job)
+    app.router.add_get('/jobs', list_jobs)
+    app.router.add_get('/jobs/{job_id}', get_job)
+    app.router.add_delete('/jobs/{job_id}', cancel_job)
+    app.router.add_get('/jobs/{job_id}/events', job_events)
+    app.router.add_get('/stats', get_stats)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTTP-сервис веб-агента')
+    parser.add_argument('--host', type=str, default=Config.SERVICE_HOST)
+    parser.add_argument('--port', type=int, default=Config.SERVICE_PORT)
+    parser.add_argument('--concurrency', type=int, default=Config.CONCURRENCY)
+    parser.add_argument('--max-queue', type=int, default=Config.SERVICE_MAX_QUEUE)
+    parser.add_argument('--headed', action='store_true', help='Показывать окна браузера')
+    args = parser.parse_args()
+
+    scheduler = TaskScheduler(concurrency=args.concurrency, headless=not args.headed,
+                              max_queue=args.max_queue)
+    web.run_app(create_app(scheduler), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Пакетный запуск задач с потоковой записью результатов.
+
+Задачи читаются из файла или stdin ('-'):
+- JSONL: строка - объект {"task": ..., "url": ..., "id": ..., "group": ...,
+  "timeout": ...} или просто строка JSON с текстом задачи;
+- CSV: заголовок с колонкой task (остальные колонки - как в JSONL) или
+  без заголовка, тогда задача - первая колонка;
+- любой другой файл: одна задача на строку.
+
+Задачи выполняются через TaskScheduler с заданным параллелизмом. Результат
+каждой задачи дописывается в выходной JSONL сразу по завершении. С resume
+задачи, чьи id уже есть в выходном файле, пропускаются. id задачи берется
+из входа, иначе это хэш текста задачи и URL.
+"""
+import asyncio
+import contextlib
+import csv
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterable, List, Set, TextIO
+
+from scheduler import TaskScheduler
+from utils import latency_summary
+
+SPEC_KEYS = ('id', 'task', 'url', 'group', 'timeout')
+
+
+def task_id(spec: Dict) -> str:
+    if spec.get('id'):
+        return str(spec['id'])
+    raw = f"{spec['task']}\n{spec.get('url') or ''}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:12]
+
+
+def _normalize(spec: Dict) -> Dict:
+    spec = {k: v for k, v in spec.items() if k in SPEC_KEYS and v not in (None, '')}
+    if 'timeout' in spec:
+        spec['timeout'] = float(spec['timeout'])
+    spec['id'] = task_id(spec)
+    return spec
+
+
+def parse_tasks(lines: Iterable[str], fmt: str) -> List[Dict]:
+    lines = [line for line in lines if line.strip()]
+    if fmt == 'csv':
+        rows = list(csv.reader(lines))
+        if rows and 'task' in rows[0]:
+            header = rows[0]
+            specs = [dict(zip(header, row)) for row in rows[1:]]
+        else:
+            specs = [{'task': row[0]} for row in rows if row]
+    elif fmt == 'jsonl':
+        specs = []
+        for line in lines:
+            item = json.loads(line)
+            specs.append(item if isinstance(item, dict) else {'task': str(item)})
+    else:
+        specs = [{'task': line.strip()} for line in lines]
+    return [_normalize(spec) for spec in specs if spec.get('task')]
+
+
+def read_tasks(path: str) -> List[Dict]:
+    """Задачи из файла; формат определяется по расширению"""
+    if path == '-':
+        lines = sys.stdin.read().splitlines()
+        fmt = 'jsonl' if lines and lines[0].lstrip().startswith(('{', '"')) else 'text'
+        return parse_tasks(lines, fmt)
+    ext = os.path.splitext(path)[1].lower()
+    fmt = {'.csv': 'csv', '.jsonl': 'jsonl', '.json': 'jsonl'}.get(ext, 'text')
+    with open(path, encoding='utf-8', newline='') as f:
+        return parse_tasks(f.read().splitlines(), fmt)
+
+
+def completed_ids(path: str) -> Set[str]:
+    """id задач, уже записанных в выходной файл"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)['id'])
+            except (ValueError, KeyError):
+                # Строка, оборванная падением процесса
+                continue
+    return done
+
+
+class BatchRunner:
+    def __init__(self, output: str, parallel: int, headless: bool = True,
+                 keep_history: bool = False, quiet: bool = False):
+        self.output = output
+        self.parallel = parallel
+        self.headless = headless
+        self.keep_history = keep_history
+        self.quiet = quiet
+        self.succeeded = 0
+        self.failed = 0
+        self.latencies: List[float] = []
+
+    async def run(self, specs: List[Dict], resume: bool = False) -> Dict:
+        skipped = 0
+        if resume:
+            done = completed_ids(self.output)
+            skipped = sum(1 for spec in specs if spec['id'] in done)
+            specs = [spec for spec in specs if spec['id'] not in done]
+        self._progress(f"Задач: {len(specs)}, пропущено как выполненные: {skipped}")
+
+        scheduler = TaskScheduler(concurrency=self.parallel, headless=self.headless,
+                                  max_queue=self.parallel * 2)
+        started = time.perf_counter()
+        output = contextlib.redirect_stdout(io.StringIO()) if self.quiet else contextlib.nullcontext()
+        with open(self.output, 'a', encoding='utf-8') as out, output:
+            await scheduler.start()
+            try:
+                futures = []
+                for spec in specs:
+                    future = await scheduler.submit_wait(spec, spec.get('group', 'default'))
+                    future.add_done_callback(lambda f, spec=spec: self._write(out, spec, f))
+                    futures.append(future)
+                await asyncio.gather(*futures, return_exceptions=True)
+            finally:
+                await scheduler.close()
+
+        elapsed = time.perf_counter() - started
+        finished = self.succeeded + self.failed
+        return {
+            'tasks': finished,
+            'skipped': skipped,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'failure_rate': round(self.failed / finished, 3) if finished else 0.0,
+            'elapsed_seconds': round(elapsed, 2),
+            'tasks_per_minute': round(finished / elapsed * 60, 2) if elapsed else 0.0,
+            'latency_seconds': latency_summary(self.latencies),
+        }
+
+    def _write(self, out: TextIO, spec: Dict, future):
+        if future.cancelled():
+            return
+        result = future.result()
+        if not self.keep_history:
+            result.pop('history', None)
+        line = {'id': spec['id'], **result}
+        if spec.get('url'):
+            line['url'] = spec['url']
+        out.write(json.dumps(line, ensure_ascii=False, default=str) + '\n')
+        # Строка на диске сразу: resume после падения ее увидит
+        out.flush()
+
+        if result.get('success'):
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        self.latencies.append(result.get('latency', 0.0))
+        status = 'OK' if result.get('success') else 'FAIL'
+        self._progress(f"[{self.succeeded + self.failed}] {status} {spec['id']} "
+                       f"{result.get('latency', 0.0):.1f} с: {spec['task'][:60]}")
+
+    def _progress(self, message: str):
+        # stderr: в тихом режиме stdout агентов перенаправлен
+        print(message, file=sys.stderr, flush=True)
+
+
+def print_summary(summary: Dict):
+    latency = summary['latency_seconds']
+    print("\nИтоги пакета:")
+    print(f"  задач: {summary['tasks']} (пропущено: {summary['skipped']})")
+    print(f"  успешно: {summary['succeeded']}, с ошибкой: {summary['failed']} "
+          f"({summary['failure_rate']:.1%})")
+    print(f"  время: {summary['elapsed_seconds']} с, задач в минуту: {summary['tasks_per_minute']}")
+    print(f"  задержка задачи: p50 {latency['p50']:.1f} с, p90 {latency['p90']:.1f} с, "
+          f"max {latency['max']:.1f} с")
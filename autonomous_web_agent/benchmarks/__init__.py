@@ -0,0 +1,7 @@
+"""Бенчмарки агента на локальных HTML-фикстурах.
+
+Запуск из каталога autonomous_web_agent:
+
+    python -m benchmarks.bench_snapshot
+    python -m benchmarks.run_suite --output bench.json
+"""
@@ -0,0 +1,100 @@
+"""Стоимость контрольных точек на шаге: дописывание против полной перезаписи.
+
+Имитируется задача на --steps шагов с одним действием на шаг (запись
+действия с элементом из снимка, как в Memory). "incremental" -
+CheckpointStore: шаг ждет только сбора новых записей, запись в SQLite
+идет в фоне. "full" - прежний подход "сохранить все": на каждом шаге вся
+история сериализуется и переписывается в файл синхронно. Браузер не
+нужен: storage_state отдает заглушка.
+
+    python -m benchmarks.bench_checkpoint --steps 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from checkpoint import CheckpointStore
+from memory import Memory
+from utils import latency_summary
+
+STORAGE_STATE = {
+    'cookies': [{'name': f'cookie{i}', 'value': 'x' * 64, 'domain': 'example.com', 'path': '/'}
+                for i in range(20)],
+    'origins': [{'origin': 'https://example.com',
+                 'localStorage': [{'name': f'key{i}', 'value': 'y' * 200} for i in range(30)]}],
+}
+
+
+class FakeContext:
+    async def storage_state(self):
+        await asyncio.sleep(0.005)
+        return STORAGE_STATE
+
+
+def add_step(memory: Memory, step: int):
+    element = {'tag': 'a', 'text': f'Ссылка {step}', 'href': f'https://example.com/page/{step}',
+               'xpath': f'/html/body/main/div[{step}]/a[1]', 'handle': step, 'doc_y': 100 * step}
+    memory.add_action({'type': 'click', 'details': {'element': step}},
+                      {'success': True, 'result': f'Clicked xpath={element["xpath"]}', 'wait_ms': 120.0},
+                      f'https://example.com/page/{step}', element)
+
+
+async def incremental(steps: int, directory: str) -> dict:
+    store = CheckpointStore(os.path.join(directory, 'checkpoints.sqlite'), storage=True)
+    store.begin('Задача')
+    memory, blocking = Memory(), []
+    for step in range(1, steps + 1):
+        add_step(memory, step)
+        started = time.perf_counter()
+        await store.save(step, f'https://example.com/page/{step}', memory, {'planner_calls': step},
+                         FakeContext())
+        blocking.append((time.perf_counter() - started) * 1000)
+        # Время "шага": планирование и действие
+        await asyncio.sleep(0.01)
+    await store.flush()
+    stats = store.stats()
+    # Вместе с журналом WAL
+    size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)
+               if name.startswith('checkpoints.sqlite'))
+    store.close()
+    return {'step_blocking_ms': latency_summary(blocking), 'background_write_ms': stats['write_ms_mean'],
+            'db_kb': round(size / 1024, 1)}
+
+
+async def full_rewrite(steps: int, directory: str) -> dict:
+    path = os.path.join(directory, 'checkpoint.json')
+    memory, blocking = Memory(), []
+    for step in range(1, steps + 1):
+        add_step(memory, step)
+        started = time.perf_counter()
+        state = await FakeContext().storage_state()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'step': step, 'history': memory.history, 'storage_state': state}, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        blocking.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.01)
+    return {'step_blocking_ms': latency_summary(blocking), 'file_kb': round(os.path.getsize(path) / 1024, 1)}
+
+
+async def run(steps: int) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        return {
+            'steps': steps,
+            'incremental': await incremental(steps, directory),
+            'full': await full_rewrite(steps, directory),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Стоимость контрольных точек')
+    parser.add_argument('--steps', type=int, default=50)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.steps)), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
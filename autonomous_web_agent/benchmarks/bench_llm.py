@@ -0,0 +1,89 @@
+"""Устойчивость вызовов модели на заглушке со сбоями и хвостом задержек.
+
+Несколько агентов одновременно планируют шаги через общий
+FakeGenaiClient, который роняет часть запросов (503/429) и задерживает
+часть ответов. Сравниваются режимы llm_client.LLMClient:
+
+    plain      без повторов и дублей (прежнее поведение)
+    retry      повторы с задержкой и разбросом
+    hedged     повторы и дублирующий запрос после p95
+
+Для каждого - доля шагов, ушедших в запасное действие (wait), задержки
+шага и число запросов к модели. С --rpm все агенты делят общий лимит.
+
+    python -m benchmarks.bench_llm --agents 8 --steps 25 --error-rate 0.1 --slow-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from ai_planner import AIPlanner
+from benchmarks.bench_planner import PAGE_STATE
+from benchmarks.fake_gemini import FakeGenaiClient, plan_response
+from llm_client import LLMClient, RateLimiter
+from utils import latency_summary
+
+MODES = {
+    'plain': {'retries': 0, 'hedge': False},
+    'retry': {'retries': 2, 'hedge': False},
+    'hedged': {'retries': 2, 'hedge': True},
+}
+
+
+async def run_mode(mode: str, args) -> dict:
+    client = FakeGenaiClient([plan_response({'type': 'click', 'details': {'element': 1}})],
+                             first_token_latency=args.latency, token_delay=0.001, chunk_size=64,
+                             error_rate=args.error_rate, slow_rate=args.slow_rate,
+                             slow_latency=args.slow_latency, seed=args.seed)
+    limiter = RateLimiter(args.rpm)
+    llm = LLMClient(client, timeout=args.timeout, limiter=limiter, backoff_base=0.05,
+                    hedge_min_samples=10, **MODES[mode])
+    timings, fallbacks = [], 0
+
+    async def agent():
+        nonlocal fallbacks
+        planner = AIPlanner(client=client)
+        planner.cache = None
+        planner.prefix_cache = None
+        planner.llm = llm
+        for _ in range(args.steps):
+            started = time.perf_counter()
+            plan = await planner.plan_next_action('Открой товар', [], PAGE_STATE)
+            timings.append((time.perf_counter() - started) * 1000)
+            fallbacks += bool(plan.get('fallback'))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(agent() for _ in range(args.agents)))
+    steps = args.agents * args.steps
+    return {
+        'steps': steps,
+        'fallback_rate': round(fallbacks / steps, 3),
+        'step_ms': latency_summary(timings),
+        'requests': client.calls,
+        'injected_errors': client.errors,
+        'wall_s': round(time.perf_counter() - started, 2),
+        'llm': llm.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Устойчивость вызовов модели')
+    parser.add_argument('--agents', type=int, default=8)
+    parser.add_argument('--steps', type=int, default=25)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--error-rate', type=float, default=0.1)
+    parser.add_argument('--slow-rate', type=float, default=0.05)
+    parser.add_argument('--slow-latency', type=float, default=2.0)
+    parser.add_argument('--timeout', type=float, default=10.0)
+    parser.add_argument('--rpm', type=float, default=0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--modes', default=','.join(MODES))
+    args = parser.parse_args()
+
+    report = {mode: asyncio.run(run_mode(mode, args)) for mode in args.modes.split(',')}
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Объем памяти Memory на одного агента.
+
+Сравнивает прежнее хранение (полные словари состояния со скриншотом в
+списках с обрезкой срезом) с текущим Memory. Состояния синтетические:
+текст 5000 символов, 150 элементов, скриншот ~30 КБ; страница меняется
+раз в три шага, как при скроллах и ожиданиях.
+
+    python -m benchmarks.bench_memory --agents 50 --steps 50
+"""
+import argparse
+import base64
+import os
+import tracemalloc
+from datetime import datetime
+
+from memory import Memory
+
+
+class LegacyMemory:
+    """Прежняя реализация Memory (для сравнения)"""
+
+    def __init__(self, max_history=100):
+        self.max_history = max_history
+        self.history = []
+        self.observations = []
+
+    def add_action(self, action, result):
+        self.history.append({'timestamp': datetime.now().isoformat(), 'action': action,
+                             'result': result, 'success': result.get('success', False)})
+        if len(self.history) > self.max_history:
+            self.history = self.history[-self.max_history:]
+
+    def add_observation(self, observation):
+        self.observations.append({'timestamp': datetime.now().isoformat(), 'observation': observation})
+        if len(self.observations) > 20:
+            self.observations = self.observations[-20:]
+
+
+def make_state(step: int) -> dict:
+    version = step // 3
+    return {
+        'url': f'http://localhost/page/{version}',
+        'title': f'Страница {version}',
+        'screenshot': 'data:image/jpeg;base64,' + base64.b64encode(os.urandom(22000)).decode(),
+        'visible_text': (f'Версия {version}. ' + 'Текст страницы для агента. ' * 200)[:5000],
+        'interactive_elements': [
+            {'tag': 'a', 'text': f'Ссылка {i}', 'href': f'http://localhost/item/{i}',
+             'xpath': f'/html/body/main/div[{i}]/a[1]', 'center_x': 100, 'center_y': 20 * i}
+            for i in range(150)
+        ],
+        'page_structure': [{'tag': 'h2', 'text': f'Раздел {i}', 'id': ''} for i in range(20)],
+        'fingerprint': f'{version:08x}',
+    }
+
+
+def measure(factory, agents: int, steps: int) -> int:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    memories = [factory() for _ in range(agents)]
+    for memory in memories:
+        for step in range(steps):
+            # Каждый шаг агент получает новое состояние со своими строками
+            memory.add_observation(make_state(step))
+            memory.add_action({'type': 'scroll', 'details': {'direction': 'down'}},
+                              {'success': True, 'result': 'Scrolled down', 'wait_ms': 120.0})
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del memories
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк памяти Memory')
+    parser.add_argument('--agents', type=int, default=20)
+    parser.add_argument('--steps', type=int, default=50)
+    args = parser.parse_args()
+
+    legacy = measure(LegacyMemory, args.agents, args.steps)
+    current = measure(Memory, args.agents, args.steps)
+    print(f"legacy:  {legacy / args.agents / 1024:.1f} КБ на агента")
+    print(f"current: {current / args.agents / 1024:.1f} КБ на агента")
+    print(f"экономия: {legacy / max(current, 1):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
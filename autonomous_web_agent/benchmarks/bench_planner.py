@@ -0,0 +1,67 @@
+"""Время до первого действия: потоковый планировщик против полного ответа.
+
+Использует FakeGenaiClient, поэтому ключ API и сеть не нужны.
+
+    python -m benchmarks.bench_planner --iterations 5
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from ai_planner import AIPlanner
+from benchmarks.fake_gemini import FakeGenaiClient, plan_response
+
+PAGE_STATE = {
+    'url': 'http://localhost/',
+    'title': 'Fixture',
+    'visible_text': 'Каталог товаров',
+    'interactive_elements': [{'tag': 'a', 'text': 'Товар 1', 'xpath': '/html/body/a[1]'}],
+    'page_structure': [],
+}
+
+
+async def run(iterations: int):
+    client = FakeGenaiClient([plan_response({'type': 'click', 'details': {'selector': 'a'}})])
+    planner = AIPlanner(client=client)
+
+    first_action, full_response = [], []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        marks = {}
+
+        async def on_action(action):
+            marks['action'] = time.perf_counter()
+
+        await planner.plan_next_action('Открой товар', [], PAGE_STATE, on_action=on_action)
+        finished = time.perf_counter()
+        first_action.append((marks['action'] - started) * 1000)
+        full_response.append((finished - started) * 1000)
+
+        # Проверяем, что цикл событий не блокируется во время запроса
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker_task = asyncio.create_task(ticker())
+        await planner.plan_next_action('Открой товар', [], PAGE_STATE)
+        ticker_task.cancel()
+
+    print(f"время до действия:      {statistics.median(first_action):.1f} мс")
+    print(f"время до конца ответа:  {statistics.median(full_response):.1f} мс")
+    print(f"тиков цикла событий во время запроса: {ticks}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк потокового планировщика')
+    parser.add_argument('--iterations', type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args.iterations))
+
+
+if __name__ == "__main__":
+    main()
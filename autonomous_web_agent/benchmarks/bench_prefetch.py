@@ -0,0 +1,97 @@
+"""Упреждающая загрузка страниц: пролистывание списка с медленным сервером.
+
+Агент проходит /list?page=1..5, нажимая "Дальше". Планировщик -
+заглушка с задержкой (--planner-latency), сервер отвечает с задержкой
+--server-delay. Без упреждающей загрузки каждый клик ждет ответа сервера;
+с ней следующая страница грузится в фоне, пока "думает" планировщик.
+Печатаются время задачи, время действий и статистика prefetch.py.
+
+    python -m benchmarks.bench_prefetch --planner-latency 0.5 --server-delay 0.4
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import time
+from collections import Counter
+
+from agent import AutonomousWebAgent
+from benchmarks.mock_planner import ScriptedPlanner
+from benchmarks.sites import FixtureServer
+from browser_controller import BrowserController
+from config import Config
+from utils import latency_summary
+
+TASK = "Дойди до последней страницы списка, нажимая Дальше"
+
+
+class NextPagePlanner(ScriptedPlanner):
+    """Клик по ссылке "Дальше", пока она есть на странице"""
+
+    def __init__(self, latency: float):
+        super().__init__([], latency=latency)
+
+    async def plan_next_action(self, task, history, page_state, on_action=None, hint=None, session=None):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        link = next((el for el in page_state.get('interactive_elements', [])
+                     if el.get('text') == 'Дальше'), None)
+        if link is None:
+            action = {'type': 'complete', 'details': {'result': 'Последняя страница'}}
+        else:
+            action = {'type': 'click', 'details': {'element': link['handle']}}
+        return {'action': action, 'confidence': 1.0}
+
+
+async def run_mode(prefetch: bool, args, base_url: str) -> dict:
+    Config.PREFETCH = prefetch
+    Config.PREFETCH_PAGES = args.pages
+    controller = BrowserController(headless=True)
+    await controller.start()
+    task_seconds, act_ms, stats = [], [], Counter()
+    try:
+        for _ in range(args.repetitions):
+            await controller.page.goto(f"{base_url}/list?page=1")
+            agent = AutonomousWebAgent(browser=controller, planner=NextPagePlanner(args.planner_latency))
+            agent.fast_path = None
+            agent.knowledge = None
+            events = []
+            agent.add_step_listener(events.append)
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = await agent.run_task(TASK)
+            task_seconds.append(time.perf_counter() - started)
+            act_ms += [event['timings']['act_ms'] for event in events if event.get('event') == 'action']
+            stats.update({key: value for key, value in result.get('prefetch', {}).items()
+                          if key in ('opportunities', 'hits', 'saved_ms', 'wasted', 'evicted')})
+    finally:
+        await controller.close()
+    return {
+        'task_seconds': latency_summary(task_seconds),
+        'act_ms': latency_summary(act_ms),
+        'prefetch': dict(stats, hit_rate=round(stats['hits'] / stats['opportunities'], 3)
+                         if stats['opportunities'] else 0.0),
+    }
+
+
+async def run(args) -> dict:
+    with FixtureServer(delay=args.server_delay) as server:
+        return {
+            'off': await run_mode(False, args, server.base_url),
+            'on': await run_mode(True, args, server.base_url),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Упреждающая загрузка страниц')
+    parser.add_argument('--repetitions', type=int, default=3)
+    parser.add_argument('--planner-latency', type=float, default=0.5)
+    parser.add_argument('--server-delay', type=float, default=0.4)
+    parser.add_argument('--pages', type=int, default=2)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Токены на шаг: прежний промпт против prompt_compiler с кэшем контекста.
+
+"legacy" повторяет прежний AIPlanner._create_context: system_prompt в
+каждом запросе, первые 2000 символов текста, первые 20 элементов в
+подробной записи и вся структура страницы. "compiled" - текущий
+планировщик с FakeGenaiClient: токены берутся из usage_metadata заглушки
+(оценка estimate_tokens), префикс лежит в ее кэше контекста. Страница -
+синтетический каталог, как fixtures.catalog_page, без браузера.
+
+    python -m benchmarks.bench_prompt --steps 10 --budget 1500
+"""
+import argparse
+import asyncio
+import json
+import statistics
+
+from ai_planner import AIPlanner
+from benchmarks.fake_gemini import FakeGenaiClient, plan_response
+from config import Config
+from prompt_compiler import PrefixCache, estimate_tokens
+from text_ranking import split_blocks
+
+TASK = "Найди в каталоге товар 731 и добавь его в корзину"
+
+
+def catalog_state(items: int, scroll_y: int = 0) -> dict:
+    lines, positions, elements = ["Каталог"], [20], [
+        {'tag': 'input', 'type': 'search', 'placeholder': 'Поиск', 'handle': 1, 'doc_y': 20,
+         'xpath': '/html/body/header/input[1]'},
+    ]
+    for i in range(items):
+        y = 100 + i * 60
+        lines += [f"Товар {i}", f"Цена {i * 10} ₽", "В корзину"]
+        positions += [y, y, y]
+        elements.append({'tag': 'a', 'text': f'Товар {i}', 'href': f'http://localhost/item/{i}',
+                         'handle': 2 + 2 * i, 'doc_y': y, 'xpath': f'/html/body/main/div[{i + 1}]/a[1]'})
+        elements.append({'tag': 'button', 'text': 'В корзину', 'type': 'submit', 'handle': 3 + 2 * i,
+                         'doc_y': y, 'xpath': f'/html/body/main/div[{i + 1}]/button[1]'})
+    structure = [{'tag': 'h1', 'text': 'Каталог'}] + [
+        {'tag': 'section', 'text': ' '.join(lines[1 + 60 * k:1 + 60 * (k + 1)])[:200]} for k in range(items // 20)
+    ]
+    return {
+        'url': 'http://localhost/catalog',
+        'title': 'Каталог',
+        'visible_text': '\n'.join(lines),
+        'text_blocks': split_blocks(lines, positions),
+        'interactive_elements': elements,
+        'page_structure': structure,
+        'scroll': {'x': 0, 'y': scroll_y},
+        'page_size': {'height': positions[-1] + 100, 'viewport': 1080},
+    }
+
+
+def legacy_prompt(system_prompt: str, task: str, history: list, page_state: dict) -> str:
+    history_lines = "\n".join(f"{i}. {a.get('type')}: {a.get('details', {})}"
+                              for i, a in enumerate(history[-5:], 1)) or "Нет истории действий"
+    elements = []
+    for i, el in enumerate(page_state['interactive_elements'][:20], 1):
+        line = f"{i}. {el.get('tag', '')}"
+        for key, title in (('text', 'текст'), ('placeholder', 'placeholder')):
+            if el.get(key):
+                line += f" {title}: '{el[key]}'"
+        if el.get('type'):
+            line += f" type: {el['type']}"
+        elements.append(line)
+    structure = "\n".join(f"{item['tag']}: {item['text']}" for item in page_state['page_structure'])
+    return (f"{system_prompt}\n\nТЕКУЩАЯ ЗАДАЧА: {task}\n\nИСТОРИЯ ДЕЙСТВИЙ:\n{history_lines}\n\n"
+            f"ТЕКУЩЕЕ СОСТОЯНИЕ СТРАНИЦЫ:\n- URL: {page_state['url']}\n- Заголовок: {page_state['title']}\n\n"
+            f"ВИДИМЫЙ ТЕКСТ (первые 2000 символов):\n{page_state['visible_text'][:2000]}\n\n"
+            f"ИНТЕРАКТИВНЫЕ ЭЛЕМЕНТЫ (первые 20):\n" + "\n".join(elements) +
+            f"\n\nСТРУКТУРА СТРАНИЦЫ:\n{structure}\n\n"
+            "Что следует сделать дальше для выполнения задачи? Верни JSON с действием.")
+
+
+async def run(steps: int, items: int) -> dict:
+    client = FakeGenaiClient([plan_response({'type': 'scroll', 'details': {'direction': 'down', 'amount': 1000}})],
+                             first_token_latency=0, token_delay=0, chunk_size=4096)
+    planner = AIPlanner(client=client)
+    planner.cache = None
+    # Заглушка кэширует префикс любого размера
+    planner.prefix_cache = PrefixCache(Config.CONTEXT_CACHE_TTL, min_tokens=client.min_cache_tokens)
+
+    legacy, prompt, cached = [], [], []
+    found = {'legacy': 0, 'compiled': 0}
+    history = []
+    for step in range(steps):
+        state = catalog_state(items, scroll_y=step * 1000)
+        old = legacy_prompt(planner.system_prompt, TASK, history, state)
+        legacy.append(estimate_tokens(old))
+        found['legacy'] += "'Товар 731'" in old
+        plan = await planner.plan_next_action(TASK, history, state)
+        tokens = plan['tokens']
+        prompt.append(tokens.get('prompt', tokens['estimated']))
+        cached.append(tokens.get('cached') or 0)
+        context, _ = planner._create_context(TASK, history, state)
+        found['compiled'] += '"Товар 731"' in context
+        history.append(plan['action'])
+
+    uncached = [p - c for p, c in zip(prompt, cached)]
+    return {
+        'steps': steps,
+        'budget': Config.PROMPT_TOKEN_BUDGET,
+        'legacy_tokens_per_step': round(statistics.mean(legacy)),
+        'compiled_tokens_per_step': round(statistics.mean(prompt)),
+        'of_them_from_context_cache': round(statistics.mean(cached)),
+        'billed_uncached_per_step': round(statistics.mean(uncached)),
+        'steps_with_target_element': found,
+        'prefix_caches_created': planner.prefix_cache.created if planner.prefix_cache else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Токены промпта на шаг')
+    parser.add_argument('--steps', type=int, default=10)
+    parser.add_argument('--items', type=int, default=1000)
+    parser.add_argument('--budget', type=int, default=Config.PROMPT_TOKEN_BUDGET)
+    args = parser.parse_args()
+    Config.PROMPT_TOKEN_BUDGET = args.budget
+
+    print(json.dumps(asyncio.run(run(args.steps, args.items)), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
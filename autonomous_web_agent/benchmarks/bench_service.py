@@ -0,0 +1,133 @@
+"""Проверка HTTP-сервиса (app.py) локальным клиентом на фикстурных сайтах.
+
+Сервис поднимается в этом же процессе со сценарным планировщиком. Клиент
+отправляет пачку заданий больше емкости очереди (часть получает 429),
+читает поток событий одного задания, отменяет другое и ждет остальные.
+
+    python -m benchmarks.bench_service --jobs 12 --concurrency 2 --max-queue 4
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List
+
+import aiohttp
+from aiohttp import web
+
+from app import create_app
+from benchmarks.mock_planner import ScriptedPlanner, step
+from benchmarks.sites import FixtureServer
+from scheduler import TaskScheduler
+from utils import latency_summary
+
+
+class HistoryScriptedPlanner(ScriptedPlanner):
+    """Сценарий по числу уже выполненных действий: один планировщик на все задания"""
+
+    async def plan_next_action(self, task: str, history: List[Dict], page_state: Dict,
+                               on_action=None, hint=None, session=None) -> Dict[str, Any]:
+        self.calls = len(history)
+        return await super().plan_next_action(task, history, page_state, on_action, hint, session)
+
+
+def search_script(base_url: str) -> list:
+    return [
+        step('navigate', url=f'{base_url}/search'),
+        step('type', selector="input[name='q']", text='python'),
+        step('press', key='Enter'),
+        step('complete', result='Найдены результаты по запросу python'),
+    ]
+
+
+async def read_events(session: aiohttp.ClientSession, url: str, started: float) -> Dict[str, Any]:
+    """Чтение SSE до конца потока; время до первого события и их число"""
+    first_event_ms = None
+    names = []
+    async with session.get(url) as response:
+        async for raw in response.content:
+            line = raw.decode('utf-8').strip()
+            if line.startswith('event:'):
+                names.append(line[len('event:'):].strip())
+                if first_event_ms is None:
+                    first_event_ms = round((time.perf_counter() - started) * 1000, 1)
+    return {'events': len(names), 'first_event_ms': first_event_ms, 'last': names[-1] if names else None}
+
+
+async def wait_done(session: aiohttp.ClientSession, base: str, job_id: str) -> Dict[str, Any]:
+    while True:
+        async with session.get(f'{base}/jobs/{job_id}') as response:
+            job = await response.json()
+        if job['status'] in ('succeeded', 'failed', 'cancelled'):
+            return job
+        await asyncio.sleep(0.05)
+
+
+async def run(jobs: int, concurrency: int, max_queue: int, planner_latency: float) -> Dict[str, Any]:
+    with FixtureServer() as fixtures:
+        planner = HistoryScriptedPlanner(search_script(fixtures.base_url), latency=planner_latency)
+        scheduler = TaskScheduler(concurrency=concurrency, headless=True, planner=planner,
+                                  max_queue=max_queue)
+        runner = web.AppRunner(create_app(scheduler))
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        base = f'http://127.0.0.1:{port}'
+
+        try:
+            async with aiohttp.ClientSession() as session:
+                accepted, rejected = [], 0
+                submitted_at = {}
+                for i in range(jobs):
+                    async with session.post(f'{base}/jobs', json={'task': f'Найди python #{i}'}) as response:
+                        if response.status == 429:
+                            rejected += 1
+                            continue
+                        job = await response.json()
+                        accepted.append(job['id'])
+                        submitted_at[job['id']] = time.perf_counter()
+
+                streamed = asyncio.create_task(read_events(
+                    session, f"{base}/jobs/{accepted[0]}/events", submitted_at[accepted[0]]))
+                cancelled = accepted[-1] if len(accepted) > 1 else None
+                if cancelled:
+                    async with session.delete(f'{base}/jobs/{cancelled}') as response:
+                        await response.read()
+
+                latencies = []
+                statuses: Dict[str, int] = {}
+                for job_id in accepted:
+                    job = await wait_done(session, base, job_id)
+                    latencies.append(time.perf_counter() - submitted_at[job_id])
+                    statuses[job['status']] = statuses.get(job['status'], 0) + 1
+
+                async with session.get(f'{base}/stats') as response:
+                    stats = await response.json()
+                return {
+                    'submitted': jobs,
+                    'accepted': len(accepted),
+                    'rejected_429': rejected,
+                    'statuses': statuses,
+                    'sse': await streamed,
+                    'job_seconds': latency_summary(latencies),
+                    'scheduler': stats['scheduler'],
+                }
+        finally:
+            await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Проверка HTTP-сервиса агента')
+    parser.add_argument('--jobs', type=int, default=12)
+    parser.add_argument('--concurrency', type=int, default=2)
+    parser.add_argument('--max-queue', type=int, default=4)
+    parser.add_argument('--planner-latency', type=float, default=0.0)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.jobs, args.concurrency, args.max_queue, args.planner_latency))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
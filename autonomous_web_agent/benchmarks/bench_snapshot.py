@@ -0,0 +1,149 @@
+"""Сравнение задержки снимка страницы: до и после snapshot.py.
+
+"legacy" повторяет прежний get_page_state: три отдельных page.evaluate,
+каждый со своим обходом DOM, плюс JPEG-скриншот на каждом шаге.
+"snapshot" - текущий BrowserController.get_page_state с полным
+пересбором модели, "unchanged" - повторный снимок неизменной страницы.
+
+    python -m benchmarks.bench_snapshot --iterations 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from playwright.async_api import async_playwright
+
+from benchmarks.fixtures import FIXTURES
+from browser_controller import BrowserController
+
+LEGACY_TEXT_SCRIPT = """
+() => {
+    const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT, null, false);
+    let texts = [];
+    let node;
+    while (node = walker.nextNode()) {
+        if (node.parentElement && node.parentElement.offsetParent !== null &&
+            node.textContent.trim().length > 0) {
+            texts.push(node.textContent.trim());
+        }
+    }
+    return texts.join('\\n');
+}
+"""
+
+LEGACY_ELEMENTS_SCRIPT = """
+() => {
+    const selectors = [
+        'a', 'button', 'input', 'textarea', 'select',
+        '[role="button"]', '[role="link"]', '[role="textbox"]',
+        '[onclick]', '[href]', '[type="submit"]', '[type="button"]'
+    ];
+    const allElements = [];
+    selectors.forEach(selector => {
+        document.querySelectorAll(selector).forEach(el => {
+            if (el.offsetParent !== null && (el.offsetWidth > 0 || el.offsetHeight > 0)) {
+                const rect = el.getBoundingClientRect();
+                allElements.push({
+                    tag: el.tagName.toLowerCase(),
+                    text: el.textContent?.trim().substring(0, 100) || '',
+                    placeholder: el.placeholder || '',
+                    type: el.type || '',
+                    href: el.href || '',
+                    id: el.id || '',
+                    class: el.className || '',
+                    role: el.getAttribute('role') || '',
+                    xpath: getXPath(el),
+                    center_x: Math.floor(rect.left + rect.width / 2),
+                    center_y: Math.floor(rect.top + rect.height / 2),
+                    visible: true
+                });
+            }
+        });
+    });
+    function getXPath(element) {
+        if (element.id !== '') return '//*[@id="' + element.id + '"]';
+        if (element === document.body) return '/html/body';
+        var ix = 0;
+        var siblings = element.parentNode.childNodes;
+        for (var i = 0; i < siblings.length; i++) {
+            var sibling = siblings[i];
+            if (sibling === element)
+                return getXPath(element.parentNode) + '/' + element.tagName.toLowerCase() + '[' + (ix + 1) + ']';
+            if (sibling.nodeType === 1 && sibling.tagName === element.tagName) ix++;
+        }
+    }
+    return allElements;
+}
+"""
+
+LEGACY_STRUCTURE_SCRIPT = """
+() => {
+    const elements = [];
+    const tags = ['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'nav', 'header', 'footer', 'main', 'section', 'article'];
+    tags.forEach(tag => {
+        document.querySelectorAll(tag).forEach(el => {
+            if (el.offsetParent !== null) {
+                elements.push({tag: tag, text: el.textContent?.trim().substring(0, 200) || '', id: el.id || ''});
+            }
+        });
+    });
+    return JSON.stringify(elements);
+}
+"""
+
+
+async def legacy_page_state(page) -> dict:
+    """Прежняя реализация get_page_state"""
+    return {
+        'url': page.url,
+        'title': await page.title(),
+        'screenshot': await page.screenshot(
+            type="jpeg", quality=30, clip={"x": 0, "y": 0, "width": 800, "height": 600}
+        ),
+        'visible_text': (await page.evaluate(LEGACY_TEXT_SCRIPT))[:5000],
+        'interactive_elements': await page.evaluate(LEGACY_ELEMENTS_SCRIPT),
+        'page_structure': await page.evaluate(LEGACY_STRUCTURE_SCRIPT),
+    }
+
+
+async def _measure(fn, iterations: int) -> list:
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+async def run(iterations: int):
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        page = await browser.new_page(viewport={'width': 1920, 'height': 1080})
+        controller = BrowserController(headless=True)
+        controller.page = page
+
+        print(f"{'fixture':<12} {'legacy, ms':>12} {'snapshot, ms':>14} {'unchanged, ms':>15} {'speedup':>9}")
+        for name, build in FIXTURES.items():
+            await page.set_content(build())
+            legacy = await _measure(lambda: legacy_page_state(page), iterations)
+            current = await _measure(lambda: controller.get_page_state(full_refresh=True), iterations)
+            unchanged = await _measure(controller.get_page_state, iterations)
+            legacy_ms = statistics.median(legacy)
+            current_ms = statistics.median(current)
+            unchanged_ms = statistics.median(unchanged)
+            print(f"{name:<12} {legacy_ms:>12.1f} {current_ms:>14.1f} {unchanged_ms:>15.1f} "
+                  f"{legacy_ms / current_ms:>8.1f}x")
+
+        await browser.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк снимка страницы')
+    parser.add_argument('--iterations', type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(run(args.iterations))
+
+
+if __name__ == "__main__":
+    main()
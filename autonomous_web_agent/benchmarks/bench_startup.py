@@ -0,0 +1,96 @@
+"""Бенчмарк времени старта агента.
+
+Замеряет:
+- python main.py --help (отдельный процесс на каждый замер);
+- импорт модуля agent;
+- BrowserController.start() с запуском нового Chromium;
+- BrowserController.start() с подключением к прогретому браузеру
+  (демон warm_pool.py поднимается на время замера).
+
+    python -m benchmarks.bench_startup --repetitions 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from utils import latency_summary
+
+
+def time_process(args: list, repetitions: int) -> dict:
+    timings = []
+    for _ in range(repetitions):
+        started = time.perf_counter()
+        subprocess.run([sys.executable] + args, check=True, stdout=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - started) * 1000)
+    return latency_summary(timings)
+
+
+async def time_browser_start(repetitions: int) -> dict:
+    from browser_controller import BrowserController
+
+    timings = []
+    for _ in range(repetitions):
+        controller = BrowserController(headless=True)
+        started = time.perf_counter()
+        await controller.start()
+        timings.append((time.perf_counter() - started) * 1000)
+        await controller.close()
+    return latency_summary(timings)
+
+
+def start_daemon(state_file: str, port: int, timeout: float = 30.0) -> subprocess.Popen:
+    env = dict(os.environ, AGENT_WARM_STATE_FILE=state_file)
+    daemon = subprocess.Popen([sys.executable, 'warm_pool.py', '--port', str(port)],
+                              env=env, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(state_file):
+        if daemon.poll() is not None or time.monotonic() > deadline:
+            daemon.kill()
+            raise RuntimeError("Демон прогретого браузера не запустился")
+        time.sleep(0.05)
+    return daemon
+
+
+def run(repetitions: int, port: int) -> dict:
+    from config import Config
+
+    report = {
+        'help_ms': time_process(['main.py', '--help'], repetitions),
+        'import_agent_ms': time_process(['-c', 'import agent'], repetitions),
+    }
+    # Холодный старт: файла состояния демона нет
+    Config.WARM_BROWSER = None
+    Config.WARM_STATE_FILE = os.path.join(tempfile.mkdtemp(), 'warm.json')
+    report['browser_cold_ms'] = asyncio.run(time_browser_start(repetitions))
+
+    daemon = start_daemon(Config.WARM_STATE_FILE, port)
+    try:
+        report['browser_warm_ms'] = asyncio.run(time_browser_start(repetitions))
+    finally:
+        daemon.terminate()
+        daemon.wait()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк времени старта агента')
+    parser.add_argument('--repetitions', type=int, default=5)
+    parser.add_argument('--port', type=int, default=9333, help='CDP-порт демона на время замера')
+    parser.add_argument('--output', type=str, help='Сохранить результат в JSON')
+    args = parser.parse_args()
+
+    report = run(args.repetitions, args.port)
+    for name, stats in report.items():
+        print(f"{name:<18} p50 {stats['p50']:>8.1f} мс  p90 {stats['p90']:>8.1f} мс")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Отбор текста для промпта: обрезка начала страницы против ранжирования.
+
+Страница - длинная статья (как fixtures.article_page), в которую на
+разной глубине вставлен абзац с ответом на задачу. Для каждой глубины
+проверяется, попадает ли ответ в бюджет промпта при прежней обрезке
+первых N символов и при отборе блоков text_ranking. Браузер не нужен:
+строки и их позиции генерируются так же, как их отдает снимок страницы.
+
+    python -m benchmarks.bench_text_ranking --paragraphs 300 --budget 2000
+"""
+import argparse
+import json
+import time
+
+from text_ranking import build_query, format_blocks, select_blocks, split_blocks
+from utils import latency_summary
+
+TASK = "Узнай, сколько стоит годовая подписка на журнал"
+NEEDLE = "Годовая подписка на журнал стоит 4800 рублей, оплата картой"
+LINE_HEIGHT = 80
+VIEWPORT = 1080
+
+
+def article_lines(paragraphs: int, needle_at: int):
+    lines, positions = ["Главная", "Блог", "Длинная статья"], [0, 0, 100]
+    y = 200
+    for i in range(paragraphs):
+        if i % 20 == 0:
+            lines.append(f"Раздел {i // 20 + 1}")
+            positions.append(y)
+            y += LINE_HEIGHT
+        text = NEEDLE if i == needle_at else f"Абзац {i}: " + "текст для проверки извлечения " * 8
+        lines.append(text)
+        positions.append(y)
+        y += LINE_HEIGHT * 2
+    return lines, positions
+
+
+def run(paragraphs: int, budget: int, depths: int) -> dict:
+    head_hits = ranked_hits = 0
+    timings = []
+    for k in range(depths):
+        needle_at = paragraphs * k // depths
+        lines, positions = article_lines(paragraphs, needle_at)
+
+        head = '\n'.join(lines)[:budget]
+        head_hits += NEEDLE in head
+
+        started = time.perf_counter()
+        blocks = split_blocks(lines, positions)
+        selected = select_blocks(blocks, build_query(TASK, []), budget, view=(0, VIEWPORT))
+        text = format_blocks(selected, VIEWPORT, 0, positions[-1])
+        timings.append((time.perf_counter() - started) * 1000)
+        ranked_hits += NEEDLE in text
+
+    return {
+        'paragraphs': paragraphs,
+        'page_chars': len('\n'.join(lines)),
+        'budget': budget,
+        'depths': depths,
+        'needle_found': {'head': head_hits, 'ranked': ranked_hits},
+        'select_ms': latency_summary(timings),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Отбор текста страницы для промпта')
+    parser.add_argument('--paragraphs', type=int, default=300)
+    parser.add_argument('--budget', type=int, default=2000)
+    parser.add_argument('--depths', type=int, default=10)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.paragraphs, args.budget, args.depths), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Локальная заглушка google.genai.Client с потоковой выдачей ответа.
+
+Повторяет ту часть интерфейса, которой пользуется AIPlanner:
+client.aio.models.generate_content_stream(...) и client.aio.caches.create(...).
+Ответ режется на куски по chunk_size символов, перед каждым куском -
+задержка token_delay. В последнем куске - usage_metadata с числом токенов
+по оценке prompt_compiler.estimate_tokens: system_instruction считается в
+промпте каждого запроса, закэшированный префикс - в cached_content_token_count.
+
+Для проверки llm_client.py заглушка умеет вносить сбои: с вероятностью
+error_rate запрос падает с FakeAPIError (503 или 429), с вероятностью
+slow_rate первый кусок задерживается на slow_latency (хвост задержек).
+"""
+import asyncio
+import json
+import random
+from types import SimpleNamespace
+from typing import Callable, List, Optional, Union
+
+from prompt_compiler import estimate_tokens
+
+
+class FakeAPIError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class FakeChunk:
+    def __init__(self, text: str, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class _FakeModels:
+    def __init__(self, client: 'FakeGenaiClient'):
+        self.client = client
+
+    async def generate_content_stream(self, model: str, contents, config=None):
+        self.client.calls += 1
+        self.client.models_called.append(model)
+        rng = self.client.random
+        if rng.random() < self.client.error_rate:
+            self.client.errors += 1
+            await asyncio.sleep(self.client.first_token_latency / 2)
+            if rng.random() < 0.5:
+                raise FakeAPIError(429, 'RESOURCE_EXHAUSTED')
+            raise FakeAPIError(503, 'UNAVAILABLE')
+        latency = self.client.first_token_latency
+        if rng.random() < self.client.slow_rate:
+            latency = self.client.slow_latency
+        text = self.client.next_response(contents)
+        config = config or {}
+        cached = self.client.caches.get(config.get('cached_content'))
+        cached_tokens = estimate_tokens(cached) if cached else 0
+        usage = SimpleNamespace(
+            prompt_token_count=(estimate_tokens(str(contents)) + cached_tokens
+                                + estimate_tokens(config.get('system_instruction') or '')),
+            cached_content_token_count=cached_tokens or None,
+            candidates_token_count=estimate_tokens(text),
+        )
+        return self._stream(text, usage, latency)
+
+    async def _stream(self, text: str, usage, latency: float):
+        await asyncio.sleep(latency)
+        size = self.client.chunk_size
+        for i in range(0, len(text), size):
+            await asyncio.sleep(self.client.token_delay)
+            last = i + size >= len(text)
+            yield FakeChunk(text[i:i + size], usage if last else None)
+
+
+class _FakeCaches:
+    """Кэш контекста; min_tokens - минимальный размер, как у провайдера"""
+
+    def __init__(self, client: 'FakeGenaiClient'):
+        self.client = client
+
+    async def create(self, model: str, config=None):
+        text = (config or {}).get('system_instruction') or ''
+        if estimate_tokens(text) < self.client.min_cache_tokens:
+            raise ValueError(f"Cached content is too small: min {self.client.min_cache_tokens} tokens")
+        name = f"cachedContents/fake-{len(self.client.caches) + 1}"
+        self.client.caches[name] = text
+        return SimpleNamespace(name=name, model=model)
+
+    async def delete(self, name: str):
+        self.client.caches.pop(name, None)
+
+
+class _FakeAio:
+    def __init__(self, client: 'FakeGenaiClient'):
+        self.models = _FakeModels(client)
+        self.caches = _FakeCaches(client)
+
+
+class FakeGenaiClient:
+    def __init__(self,
+                 responses: Union[List[dict], Callable[[str], dict]],
+                 first_token_latency: float = 0.3,
+                 token_delay: float = 0.02,
+                 chunk_size: int = 8,
+                 min_cache_tokens: int = 0,
+                 error_rate: float = 0.0,
+                 slow_rate: float = 0.0,
+                 slow_latency: float = 5.0,
+                 seed: Optional[int] = None):
+        self.responses = responses
+        self.first_token_latency = first_token_latency
+        self.token_delay = token_delay
+        self.chunk_size = chunk_size
+        self.min_cache_tokens = min_cache_tokens
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.errors = 0
+        self.models_called: List[str] = []
+        # Имя кэша контекста -> закэшированный system_instruction
+        self.caches = {}
+        self.aio = _FakeAio(self)
+
+    def next_response(self, contents) -> str:
+        if callable(self.responses):
+            response = self.responses(contents)
+        else:
+            response = self.responses[(self.calls - 1) % len(self.responses)]
+        return response if isinstance(response, str) else json.dumps(response, ensure_ascii=False)
+
+
+def plan_response(action: dict, thoughts: Optional[str] = None, confidence: float = 0.9) -> dict:
+    """Ответ модели в формате system_prompt"""
+    return {
+        'action': action,
+        'confidence': confidence,
+        'thoughts': thoughts or 'Анализирую страницу и выбираю следующее действие. ' * 6,
+    }
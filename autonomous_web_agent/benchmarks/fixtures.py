@@ -0,0 +1,53 @@
+"""Генерация локальных HTML-страниц для бенчмарков"""
+
+
+def html_page(title: str, body: str) -> str:
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'>"
+        f"<title>{title}</title></head><body>{body}</body></html>"
+    )
+
+
+def article_page(paragraphs: int = 300) -> str:
+    """Длинная статья: много текста, мало элементов"""
+    body = ["<header><nav><a href='/'>Главная</a> <a href='/blog'>Блог</a></nav></header>",
+            "<main><article><h1>Длинная статья</h1>"]
+    for i in range(paragraphs):
+        if i % 20 == 0:
+            body.append(f"<h2>Раздел {i // 20 + 1}</h2>")
+        body.append(f"<p>Абзац {i}: " + "текст для проверки извлечения " * 8 + "</p>")
+    body.append("</article></main><footer>Подвал</footer>")
+    return html_page("Статья", "".join(body))
+
+
+def catalog_page(items: int = 1000) -> str:
+    """Каталог: тысячи ссылок и кнопок"""
+    body = ["<header><h1>Каталог</h1><input type='search' placeholder='Поиск'>"
+            "<button type='submit'>Найти</button></header><main><section>"]
+    for i in range(items):
+        body.append(
+            f"<div class='card'><a href='/item/{i}'>Товар {i}</a>"
+            f"<span>Цена {i * 10} ₽</span>"
+            f"<button onclick='void 0'>В корзину</button></div>"
+        )
+    body.append("</section></main>")
+    return html_page("Каталог", "".join(body))
+
+
+def dom_page(elements: int = 10000) -> str:
+    """Тяжелая страница: 10k вложенных элементов"""
+    body = ["<main>"]
+    for i in range(elements // 5):
+        body.append(
+            f"<div><section><h3>Блок {i}</h3><p>Описание блока {i}</p>"
+            f"<a href='#b{i}' role='link'>Ссылка {i}</a></section></div>"
+        )
+    body.append("</main>")
+    return html_page("DOM 10k", "".join(body))
+
+
+FIXTURES = {
+    'article': article_page,
+    'catalog_1k': catalog_page,
+    'dom_10k': dom_page,
+}
@@ -0,0 +1,48 @@
+"""Сценарный планировщик для офлайн-бенчмарков.
+
+Повторяет заранее заданную последовательность планов вместо вызова
+Gemini. Интерфейс совпадает с AIPlanner.plan_next_action, включая раннюю
+передачу действия через on_action.
+"""
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from ai_planner import AIPlanner
+from benchmarks.fake_gemini import FakeGenaiClient
+
+
+class ScriptedPlanner(AIPlanner):
+    def __init__(self, script: List[Dict[str, Any]], latency: float = 0.0):
+        # Модель не вызывается: заглушка вместо клиента Gemini нужна только
+        # для того, чтобы AIPlanner собрал остальные свои поля
+        super().__init__(client=FakeGenaiClient([]))
+        self.script = script
+        self.latency = latency
+        self.model_name = 'scripted'
+        # Кэши решений и контекста сценарию не нужны
+        self.cache = None
+        self.prefix_cache = None
+        self.calls = 0
+
+    async def plan_next_action(self, task: str, history: List[Dict], page_state: Dict,
+                               on_action=None, hint=None, session=None) -> Dict[str, Any]:
+        if self.calls < len(self.script):
+            plan = dict(self.script[self.calls])
+        else:
+            plan = {'action': {'type': 'complete', 'details': {'result': 'Сценарий исчерпан'}}}
+        self.calls += 1
+        plan.setdefault('confidence', 1.0)
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if on_action:
+            await on_action(plan['action'])
+        return plan
+
+
+def step(action_type: str, next_actions: Optional[List[Dict]] = None, **details) -> Dict[str, Any]:
+    """План из одного действия (и, возможно, пакета next_actions)"""
+    plan = {'action': {'type': action_type, 'details': details}}
+    if next_actions:
+        plan['next_actions'] = next_actions
+    return plan
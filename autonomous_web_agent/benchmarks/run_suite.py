@@ -0,0 +1,176 @@
+"""Офлайн-бенчмарк агента: локальные сайты и сценарный планировщик.
+
+Сеть и ключ Gemini не нужны. Для каждого сценария из scenarios.py агент
+выполняет задачу repetitions раз. Собирается задержка по фазам шага
+(observe / plan / act / wait), число шагов, память и задач в минуту.
+Результат пишется в JSON. С --baseline печатается сравнение с прошлым
+прогоном.
+
+    python -m benchmarks.run_suite --repetitions 3 --output bench.json
+    python -m benchmarks.run_suite --baseline bench.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from agent import AutonomousWebAgent
+from benchmarks.mock_planner import ScriptedPlanner
+from benchmarks.scenarios import build_scenarios
+from benchmarks.sites import FixtureServer
+from browser_controller import BrowserController
+from config import Config
+from utils import latency_summary
+
+PHASES = ('observe', 'plan', 'act', 'wait')
+
+JS_HEAP_SCRIPT = "() => performance.memory ? performance.memory.usedJSHeapSize : 0"
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return ''
+
+
+def collect_phases(events: list, phases: dict):
+    """Раскладка событий шагов по фазам, мс"""
+    for event in events:
+        if event.get('event') not in ('action', 'complete'):
+            continue
+        timings = event.get('timings', {})
+        if not event.get('batch_index'):
+            phases['observe'].append(timings.get('observe_ms', 0.0))
+            phases['plan'].append(timings.get('plan_ms', 0.0))
+        if event.get('event') == 'action':
+            wait_ms = event.get('result', {}).get('wait_ms', 0.0)
+            phases['wait'].append(wait_ms)
+            phases['act'].append(max(0.0, timings.get('act_ms', 0.0) - wait_ms))
+
+
+async def run_scenario(controller, scenario: dict, repetitions: int, planner_latency: float,
+                       verbose: bool) -> dict:
+    phases = {name: [] for name in PHASES}
+    task_seconds, steps, successes = [], [], 0
+    python_peak = 0
+
+    for _ in range(repetitions):
+        planner = ScriptedPlanner(scenario['script'], latency=planner_latency)
+        agent = AutonomousWebAgent(browser=controller, planner=planner)
+        events = []
+        agent.add_step_listener(events.append)
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        with output:
+            result = await agent.run_task(scenario['task']) or {}
+        task_seconds.append(time.perf_counter() - started)
+        python_peak = max(python_peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+        collect_phases(events, phases)
+        steps.append(result.get('steps', 0))
+        successes += 1 if result.get('success') else 0
+
+    js_heap = await controller.page.evaluate(JS_HEAP_SCRIPT)
+    return {
+        'tasks': repetitions,
+        'success_rate': round(successes / repetitions, 3),
+        'steps_mean': round(sum(steps) / len(steps), 2),
+        'phases_ms': {name: latency_summary(values) for name, values in phases.items()},
+        'task_seconds': latency_summary(task_seconds),
+        'python_peak_kb': round(python_peak / 1024, 1),
+        'js_heap_kb': round(js_heap / 1024, 1),
+    }
+
+
+async def run(repetitions: int, planner_latency: float, only, verbose: bool) -> dict:
+    with FixtureServer() as server:
+        controller = BrowserController(headless=True)
+        await controller.start()
+        try:
+            report = {
+                'meta': {
+                    'timestamp': datetime.now(timezone.utc).isoformat(),
+                    'commit': _git_commit(),
+                    'repetitions': repetitions,
+                    'planner_latency': planner_latency,
+                },
+                'scenarios': {},
+            }
+            started = time.perf_counter()
+            total_tasks = 0
+            for name, scenario in build_scenarios(server.base_url).items():
+                if only and name not in only:
+                    continue
+                report['scenarios'][name] = await run_scenario(
+                    controller, scenario, repetitions, planner_latency, verbose)
+                total_tasks += repetitions
+            elapsed = time.perf_counter() - started
+            report['totals'] = {
+                'tasks': total_tasks,
+                'elapsed_seconds': round(elapsed, 2),
+                'tasks_per_minute': round(total_tasks / elapsed * 60, 2) if elapsed else 0.0,
+            }
+            return report
+        finally:
+            await controller.close()
+
+
+def print_report(report: dict, baseline: dict = None):
+    header = f"{'scenario':<16} {'steps':>6} {'task p50, s':>12}" + "".join(
+        f" {phase + ' p50':>12}" for phase in PHASES)
+    print(header)
+    for name, data in report['scenarios'].items():
+        row = f"{name:<16} {data['steps_mean']:>6} {data['task_seconds']['p50']:>12.2f}"
+        row += "".join(f" {data['phases_ms'][phase]['p50']:>12.1f}" for phase in PHASES)
+        print(row)
+
+        old = (baseline or {}).get('scenarios', {}).get(name)
+        if old:
+            before = old['task_seconds']['p50']
+            after = data['task_seconds']['p50']
+            change = (after - before) / before * 100 if before else 0.0
+            print(f"{'':<16} против базы: {before:.2f} с -> {after:.2f} с ({change:+.1f}%)")
+    print(f"задач в минуту: {report['totals']['tasks_per_minute']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Офлайн-бенчмарк агента')
+    parser.add_argument('--repetitions', type=int, default=3)
+    parser.add_argument('--planner-latency', type=float, default=0.0,
+                        help='Имитация задержки планировщика, с')
+    parser.add_argument('--scenario', action='append', help='Запустить только этот сценарий')
+    parser.add_argument('--output', type=str, default='bench_results.json')
+    parser.add_argument('--baseline', type=str, help='JSON прошлого прогона для сравнения')
+    parser.add_argument('--verbose', action='store_true', help='Показывать вывод агента')
+    parser.add_argument('--fast-path', action='store_true',
+                        help='Включить локальные правила (сценарии рассчитаны на вызов планировщика на каждом шаге)')
+    args = parser.parse_args()
+    Config.FAST_PATH = args.fast_path
+    # Знания о сайтах из прошлых повторов меняли бы следующие, а писались бы
+    # в базу пользователя. Контрольные точки агент без checkpoints=True не пишет
+    Config.SITE_KNOWLEDGE = False
+
+    report = asyncio.run(run(args.repetitions, args.planner_latency, args.scenario, args.verbose))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результат сохранен в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
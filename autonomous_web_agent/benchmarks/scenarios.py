@@ -0,0 +1,51 @@
+"""Сценарии офлайн-бенчмарка: задача, стартовая страница и план действий"""
+from benchmarks.mock_planner import step
+from benchmarks.sites import FORM_FIELDS, LIST_PAGES
+
+
+def build_scenarios(base_url: str) -> dict:
+    form_batch = [
+        {'type': 'type', 'details': {'selector': f'#{name}', 'text': f'значение {name}'},
+         'precondition': {'url_unchanged': True}}
+        for name in FORM_FIELDS[1:]
+    ]
+    return {
+        'search': {
+            'task': 'Найди python на сайте поиска',
+            'script': [
+                step('navigate', url=f'{base_url}/search'),
+                step('type', selector="input[name='q']", text='python'),
+                step('press', key='Enter'),
+                step('complete', result='Найдены результаты по запросу python'),
+            ],
+        },
+        'pagination': {
+            'task': 'Дойди до последней страницы списка',
+            'script': [step('navigate', url=f'{base_url}/list?page=1')]
+                      + [step('click', selector='a.next') for _ in range(LIST_PAGES - 1)]
+                      + [step('complete', result=f'Открыта страница {LIST_PAGES}')],
+        },
+        'long_form': {
+            'task': 'Заполни анкету и отправь ее',
+            'script': [
+                step('navigate', url=f'{base_url}/form'),
+                step('type', selector=f'#{FORM_FIELDS[0]}', text=f'значение {FORM_FIELDS[0]}',
+                     next_actions=form_batch + [{'type': 'click', 'details': {'selector': '#submit'}}]),
+                step('complete', result='Анкета отправлена'),
+            ],
+        },
+        'dom_10k': {
+            'task': 'Открой последнюю ссылку на тяжелой странице',
+            'script': [
+                step('navigate', url=f'{base_url}/dom'),
+                step('click', selector='main > div:last-child a'),
+                step('complete', result='Ссылка открыта'),
+            ],
+        },
+        'infinite_scroll': {
+            'task': 'Прокрути ленту и найди сотый пост',
+            'script': [step('navigate', url=f'{base_url}/feed')]
+                      + [step('scroll', direction='down', amount=3000) for _ in range(5)]
+                      + [step('complete', result='Лента прокручена')],
+        },
+    }
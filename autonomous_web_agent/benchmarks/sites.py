@@ -0,0 +1,131 @@
+"""Локальные фикстурные сайты для бенчмарков.
+
+FixtureServer поднимает http.server в фоновом потоке на свободном порту.
+Сайты:
+    /search         форма поиска, /search?q=... - результаты
+    /list?page=N    постраничный список с ссылкой "Дальше"
+    /form           длинная форма из 12 полей, /form/done - подтверждение
+    /dom            страница на 10k элементов
+    /feed           бесконечная лента, подгружается при прокрутке
+
+delay - задержка ответа сервера в секундах (имитация удаленного сайта).
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.fixtures import html_page, dom_page
+
+FORM_FIELDS = [
+    'first_name', 'last_name', 'email', 'phone', 'company', 'position',
+    'country', 'city', 'street', 'zip', 'website', 'comment',
+]
+LIST_PAGES = 5
+
+
+def search_page(query: str = '') -> str:
+    form = ("<header><h1>Поиск</h1><form action='/search'>"
+            "<input type='search' name='q' placeholder='Что ищем?'>"
+            "<button type='submit'>Найти</button></form></header>")
+    if not query:
+        return html_page("Поиск", form + "<main><p>Введите запрос</p></main>")
+    results = "".join(
+        f"<article><h2><a href='/item/{i}'>{query} - результат {i}</a></h2>"
+        f"<p>Описание результата {i} по запросу {query}</p></article>"
+        for i in range(20)
+    )
+    return html_page(f"{query} - Поиск", form + f"<main><h1>Результаты: {query}</h1>{results}</main>")
+
+
+def list_page(page: int) -> str:
+    items = "".join(f"<li><a href='/item/{page}-{i}'>Позиция {page}.{i}</a></li>" for i in range(30))
+    nav = f"<a class='next' href='/list?page={page + 1}'>Дальше</a>" if page < LIST_PAGES else ""
+    return html_page(f"Список, стр. {page}",
+                     f"<main><h1>Страница {page} из {LIST_PAGES}</h1><ul>{items}</ul><nav>{nav}</nav></main>")
+
+
+def form_page() -> str:
+    fields = "".join(
+        f"<label>{name}<input name='{name}' id='{name}' placeholder='{name}'></label><br>"
+        for name in FORM_FIELDS
+    )
+    return html_page("Анкета", f"<main><h1>Анкета</h1><form action='/form/done'>{fields}"
+                               f"<button type='submit' id='submit'>Отправить</button></form></main>")
+
+
+def form_done_page() -> str:
+    return html_page("Анкета отправлена", "<main><h1>Спасибо, анкета отправлена</h1></main>")
+
+
+def feed_page() -> str:
+    script = """
+    <script>
+    let loaded = 0;
+    function more() {
+        const feed = document.getElementById('feed');
+        for (let i = 0; i < 20; i++, loaded++) {
+            const post = document.createElement('article');
+            post.innerHTML = '<h3>Пост ' + loaded + '</h3><p>Текст поста ' + loaded + '</p>'
+                + '<a href="/post/' + loaded + '">Читать</a>';
+            feed.appendChild(post);
+        }
+    }
+    more();
+    window.addEventListener('scroll', () => {
+        if (window.innerHeight + window.scrollY >= document.body.scrollHeight - 200) more();
+    });
+    </script>
+    """
+    return html_page("Лента", "<main><h1>Лента</h1><section id='feed'></section></main>" + script)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        routes = {
+            '/search': lambda: search_page(query.get('q', [''])[0]),
+            '/list': lambda: list_page(int(query.get('page', ['1'])[0])),
+            '/form': form_page,
+            '/form/done': form_done_page,
+            '/dom': dom_page,
+            '/feed': feed_page,
+        }
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        build = routes.get(url.path)
+        if build is None:
+            body = html_page("Страница", f"<main><h1>{url.path}</h1></main>")
+        else:
+            body = build()
+
+        payload = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, delay: float = 0.0):
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.delay = delay
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -1,178 +1,180 @@
-from playwright.async_api import async_playwright, Page
-import json
-from typing import Dict, List, Any
+from typing import Any, Dict, List, Optional
 import asyncio
+from actions import parse_handle
+from snapshot import SNAPSHOT_SCRIPT, TRACKER_SCRIPT, PageModel, snapshot_options
+from text_ranking import split_blocks
+from readiness import ACTION_BUDGETS, PageActivity, ReadinessWaiter
+from network import RequestRouter, parse_domains
+from response_cache import CacheRoute, attach_har, get_response_cache
+from config import Config
+from warm_pool import connect_or_launch
+from prefetch import Prefetcher
+from telemetry import get_tracer
 
 class BrowserController:
-    def __init__(self, headless=False):
+    def __init__(self, headless=False, context=None, network_profile=None):
         self.headless = headless
         self.playwright = None
         self.browser = None
+        # Контекст из общего пула (scheduler.ContextPool): браузером владеет пул
+        self.context = context
+        self._owns_context = False
         self.page = None
+        self.model = PageModel()
+        self.activity = PageActivity()
+        self.readiness = ReadinessWaiter(self.activity)
+        self.router = RequestRouter(network_profile or Config.NETWORK_PROFILE,
+                                    parse_domains(Config.BLOCKED_DOMAINS))
+        cache = get_response_cache()
+        self.cache_route = CacheRoute(cache) if cache is not None else None
+        # Фоновые страницы с вероятными следующими адресами (prefetch.py)
+        self.prefetcher = None
+        # Свой учет запросов у фоновых страниц: счетчики навигаций агента не смешиваются
+        self.background_router = RequestRouter(self.router.profile, self.router.blocked_domains)
         
-    async def start(self):
-        """Запуск браузера"""
-        self.playwright = await async_playwright().start()
-        self.browser = await self.playwright.chromium.launch(
-            headless=self.headless,
-            args=['--start-maximized']
-        )
-        self.page = await self.browser.new_page()
-        
-        # Настройка окна браузера
-        await self.page.set_viewport_size({'width': 1920, 'height': 1080})
+    async def start(self, storage_state: Optional[Dict] = None):
+        """Запуск браузера (или подключение к прогретому, см. warm_pool.py).
+
+        storage_state - cookies и localStorage из контрольной точки
+        (checkpoint.py). В контекст из пула переносятся только cookies.
+        """
+        if self.context is None:
+            # Playwright импортируется только при запуске: --help не ждет его загрузки
+            from playwright.async_api import async_playwright
+            self.playwright = await async_playwright().start()
+            self.browser, warm = await connect_or_launch(
+                self.playwright, self.headless, args=['--start-maximized'])
+            if warm:
+                print("Подключился к прогретому браузеру")
+            # Размер окна задается при создании контекста, без отдельного вызова
+            self.context = await self.browser.new_context(viewport=Config.VIEWPORT,
+                                                          storage_state=storage_state)
+            self._owns_context = True
+        elif storage_state and storage_state.get('cookies'):
+            await self.context.add_cookies(storage_state['cookies'])
         
+        self.page = await self.context.new_page()
+        await self._attach_page(self.page)
+        if Config.PREFETCH:
+            self.prefetcher = Prefetcher(self.context, self._attach_background, Config.PREFETCH_PAGES,
+                                         Config.PREFETCH_MEMORY_MB, Config.PREFETCH_MAX_AGE,
+                                         wait_until=self.readiness.wait_until)
         return self.page
     
+    async def _attach_page(self, page, background: bool = False):
+        """Трекер DOM в каждый новый документ и учет сетевой активности.
+
+        Обработчики route вызываются в обратном порядке регистрации:
+        HAR-архив, затем профиль сети, затем кэш ответов. Фоновые
+        страницы (background) не влияют на ожидание готовности и учет
+        запросов основной страницы.
+        """
+        await page.add_init_script(TRACKER_SCRIPT)
+        if not background:
+            self.activity.attach(page)
+        if self.cache_route is not None:
+            await self.cache_route.attach(page)
+        await (self.background_router if background else self.router).attach(page)
+        if Config.HAR_PATH:
+            await attach_har(page, Config.HAR_PATH, Config.HAR_MODE)
+    
+    async def _attach_background(self, page):
+        await self._attach_page(page, background=True)
+    
+    async def prefetch(self, task: str, history: List[Dict], page_state: Dict):
+        """Фоновая загрузка вероятных следующих страниц, пока думает планировщик"""
+        if self.prefetcher is None or not page_state:
+            return
+        try:
+            await self.prefetcher.prefetch(task, history, page_state)
+        except Exception as e:
+            print(f"Ошибка упреждающей загрузки: {e}")
+    
+    async def _adopt(self, page):
+        """Фоновая страница становится основной, прежняя закрывается"""
+        previous = self.page
+        self.activity.detach(previous)
+        self.activity.attach(page)
+        try:
+            # Запросы страницы теперь учитываются как запросы агента. Обработчик
+            # профиля встает первым в цепочке route - он только блокирует или
+            # передает запрос дальше, так что порядок не меняет результат
+            await self.background_router.detach(page)
+            await self.router.attach(page)
+        except Exception as e:
+            print(f"Ошибка перехвата запросов загруженной заранее страницы: {e}")
+        self.page = page
+        # Новый документ: следующий снимок будет полным
+        self.model = PageModel()
+        try:
+            await page.bring_to_front()
+            await previous.close()
+        except Exception as e:
+            print(f"Ошибка закрытия прежней страницы: {e}")
+    
     async def close(self):
         """Закрытие браузера"""
+        if self.prefetcher is not None:
+            await self.prefetcher.close()
+        if not self._owns_context:
+            # Контекст вернется в пул, закрываем только свою страницу
+            if self.page:
+                await self.page.close()
+            return
+        # HAR в режиме record сохраняется при закрытии контекста
+        await self.context.close()
         if self.browser:
+            # Прогретый браузер при этом не закрывается - только отключаемся
             await self.browser.close()
         if self.playwright:
             await self.playwright.stop()
     
-    async def get_page_state(self) -> Dict[str, Any]:
-        """Получение текущего состояния страницы"""
+    async def get_page_state(self, include_screenshot: bool = False,
+                             full_refresh: bool = False) -> Dict[str, Any]:
+        """Получение текущего состояния страницы.
+
+        Текст, интерактивные элементы и структура собираются одним
+        скриптом (см. snapshot.py). Из страницы приходят только изменения с
+        прошлого шага, полная модель собирается в self.model. Если DOM не
+        менялся, 'unchanged' = True. Скриншот снимается только по запросу.
+        """
         if not self.page:
             return {}
         
+        tracer = get_tracer()
         try:
-            # Получаем основную информацию о странице
+            full = full_refresh or self.model.fingerprint is None
+            with tracer.span('snapshot') as span:
+                snapshot = await self.page.evaluate(SNAPSHOT_SCRIPT, snapshot_options(full=full))
+                span.attrs['unchanged'] = bool(snapshot.get('unchanged'))
+                # Время отдельных частей скрипта внутри страницы
+                for part, duration in (snapshot.get('timings') or {}).items():
+                    tracer.record(f'snapshot.{part}', duration)
+            delta = self.model.apply(snapshot)
+            scroll = snapshot.get('scroll', [0, 0])
             state = {
                 'url': self.page.url,
-                'title': await self.page.title(),
-                'screenshot': await self._get_minimal_screenshot(),
-                'visible_text': await self._get_visible_text(),
-                'interactive_elements': await self._get_interactive_elements(),
-                'page_structure': await self._get_page_structure(),
+                'title': snapshot.get('title', ''),
+                'visible_text': self.model.visible_text(),
+                'interactive_elements': self.model.interactive_elements(scroll),
+                'page_structure': self.model.structure,
+                'fingerprint': self.model.fingerprint,
+                'unchanged': bool(snapshot.get('unchanged')),
+                'delta': delta,
+                'scroll': {'x': scroll[0], 'y': scroll[1]},
+                # Текст по блокам с позицией - для отбора в промпт (text_ranking.py)
+                'text_blocks': split_blocks(self.model.lines, self.model.positions),
+                'page_size': {'height': self.model.page_size[0], 'viewport': self.model.page_size[1]},
             }
+            if include_screenshot:
+                state['screenshot'] = await self._get_minimal_screenshot()
             return state
         except Exception as e:
+            # Модель могла разойтись со страницей - следующий снимок будет полным
+            self.model = PageModel()
             print(f"Error getting page state: {e}")
             return {}
     
-    async def _get_visible_text(self) -> str:
-        """Извлечение видимого текста со страницы"""
-        try:
-            # Получаем все видимые текстовые элементы
-            text = await self.page.evaluate("""
-                () => {
-                    const walker = document.createTreeWalker(
-                        document.body,
-                        NodeFilter.SHOW_TEXT,
-                        null,
-                        false
-                    );
-                    
-                    let texts = [];
-                    let node;
-                    while (node = walker.nextNode()) {
-                        if (node.parentElement && 
-                            node.parentElement.offsetParent !== null && 
-                            node.textContent.trim().length > 0) {
-                            texts.push(node.textContent.trim());
-                        }
-                    }
-                    return texts.join('\\n');
-                }
-            """)
-            return text[:5000]  # Ограничиваем размер
-        except:
-            return ""
-    
-    async def _get_interactive_elements(self) -> List[Dict]:
-        """Получение интерактивных элементов"""
-        try:
-            elements = await self.page.evaluate("""
-                () => {
-                    const selectors = [
-                        'a', 'button', 'input', 'textarea', 'select',
-                        '[role="button"]', '[role="link"]', '[role="textbox"]',
-                        '[onclick]', '[href]', '[type="submit"]', '[type="button"]'
-                    ];
-                    
-                    const allElements = [];
-                    selectors.forEach(selector => {
-                        document.querySelectorAll(selector).forEach(el => {
-                            if (el.offsetParent !== null &&  // Видимый элемент
-                                (el.offsetWidth > 0 || el.offsetHeight > 0)) {
-                                
-                                const rect = el.getBoundingClientRect();
-                                const centerX = Math.floor(rect.left + rect.width / 2);
-                                const centerY = Math.floor(rect.top + rect.height / 2);
-                                
-                                allElements.push({
-                                    tag: el.tagName.toLowerCase(),
-                                    text: el.textContent?.trim().substring(0, 100) || '',
-                                    placeholder: el.placeholder || '',
-                                    type: el.type || '',
-                                    href: el.href || '',
-                                    id: el.id || '',
-                                    class: el.className || '',
-                                    role: el.getAttribute('role') || '',
-                                    xpath: getXPath(el),
-                                    center_x: centerX,
-                                    center_y: centerY,
-                                    visible: true
-                                });
-                            }
-                        });
-                    });
-                    
-                    // Вспомогательная функция для получения XPath
-                    function getXPath(element) {
-                        if (element.id !== '')
-                            return '//*[@id="' + element.id + '"]';
-                        if (element === document.body)
-                            return '/html/body';
-                        
-                        var ix = 0;
-                        var siblings = element.parentNode.childNodes;
-                        
-                        for (var i = 0; i < siblings.length; i++) {
-                            var sibling = siblings[i];
-                            if (sibling === element)
-                                return getXPath(element.parentNode) + '/' + element.tagName.toLowerCase() + '[' + (ix + 1) + ']';
-                            if (sibling.nodeType === 1 && sibling.tagName === element.tagName)
-                                ix++;
-                        }
-                    }
-                    
-                    return allElements;
-                }
-            """)
-            return elements
-        except Exception as e:
-            print(f"Error getting interactive elements: {e}")
-            return []
-    
-    async def _get_page_structure(self) -> str:
-        """Получение структуры страницы (заголовки, секции)"""
-        try:
-            structure = await self.page.evaluate("""
-                () => {
-                    const elements = [];
-                    const tags = ['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'nav', 'header', 'footer', 'main', 'section', 'article'];
-                    
-                    tags.forEach(tag => {
-                        document.querySelectorAll(tag).forEach(el => {
-                            if (el.offsetParent !== null) {
-                                elements.push({
-                                    tag: tag,
-                                    text: el.textContent?.trim().substring(0, 200) || '',
-                                    id: el.id || ''
-                                });
-                            }
-                        });
-                    });
-                    
-                    return JSON.stringify(elements);
-                }
-            """)
-            return structure
-        except:
-            return "[]"
-    
     async def _get_minimal_screenshot(self) -> str:
         """Получение миниатюры скриншота (base64)"""
         try:
@@ -187,23 +189,73 @@ class BrowserController:
             return ""
     
     async def execute_action(self, action: Dict) -> Dict:
-        """Выполнение действия в браузере"""
+        """Выполнение действия в браузере.
+
+        После действия ждем готовности страницы (readiness.py) не дольше
+        бюджета для этого типа действия; время ожидания - в 'wait_ms'.
+        Если действие привело к навигации, в 'network' - сколько запросов
+        заблокировал профиль сети (network.py).
+        """
         action_type = action.get('type')
-        details = action.get('details', {})
+        tracer = get_tracer()
+        navigations = self.router.navigations
+        with tracer.span('action', type=action_type):
+            result = await self._from_prefetch(action)
+            if result is None:
+                result = await self._perform(action_type, action.get('details', {}))
+        
+        if result.get('success') and action_type in ACTION_BUDGETS:
+            try:
+                with tracer.span('action.wait', type=action_type) as span:
+                    result.update(await self.readiness.wait(self.page, action_type))
+                    span.attrs['timed_out'] = result['timed_out']
+            except Exception as e:
+                print(f"Ошибка ожидания готовности: {e}")
         
+        if self.router.navigations != navigations:
+            current = self.router.current
+            result['network'] = {key: current[key] for key in ('requests', 'blocked', 'bytes_saved')}
+        return result
+    
+    async def _from_prefetch(self, action: Dict) -> Optional[Dict]:
+        """Переход на заранее загруженную страницу вместо загрузки в основной вкладке"""
+        if self.prefetcher is None:
+            return None
+        details = action.get('details', {})
+        element = None
+        handle = parse_handle(details.get('element'))
+        if handle is not None:
+            element = self.model.element(handle)
+        url = self.prefetcher.match(action, element)
+        if url is None:
+            if action.get('type') in ('click', 'press'):
+                # Клик не по ссылке или отправка формы могли изменить состояние сайта
+                await self.prefetcher.clear()
+            return None
+        try:
+            warm = await self.prefetcher.claim(url)
+            if warm is None:
+                return None
+            page, saved_ms = warm
+            await self._adopt(page)
+        except Exception as e:
+            print(f"Не удалось открыть загруженную заранее страницу: {e}")
+            return None
+        return {'success': True, 'result': f'Opened prefetched {url}', 'prefetched': True,
+                'saved_ms': round(saved_ms, 1)}
+    
+    async def _perform(self, action_type: str, details: Dict) -> Dict:
         try:
             if action_type == 'navigate':
                 url = details.get('url')
                 if url:
-                    await self.page.goto(url, wait_until='networkidle')
-                    await asyncio.sleep(2)
+                    await self.page.goto(url, wait_until=self.readiness.wait_until)
                     return {'success': True, 'result': f'Navigated to {url}'}
             
             elif action_type == 'click':
-                selector = details.get('selector')
+                selector = self._resolve_selector(details)
                 if selector:
                     await self.page.click(selector)
-                    await asyncio.sleep(1)
                     return {'success': True, 'result': f'Clicked {selector}'}
                 
                 # Клик по координатам
@@ -211,22 +263,19 @@ class BrowserController:
                 y = details.get('y')
                 if x is not None and y is not None:
                     await self.page.mouse.click(x, y)
-                    await asyncio.sleep(1)
                     return {'success': True, 'result': f'Clicked at ({x}, {y})'}
             
             elif action_type == 'type':
-                selector = details.get('selector')
+                selector = self._resolve_selector(details)
                 text = details.get('text')
                 if selector and text:
                     await self.page.fill(selector, text)
-                    await asyncio.sleep(0.5)
                     return {'success': True, 'result': f'Typed "{text}" into {selector}'}
             
             elif action_type == 'press':
                 key = details.get('key')
                 if key:
                     await self.page.keyboard.press(key)
-                    await asyncio.sleep(0.5)
                     return {'success': True, 'result': f'Pressed {key}'}
             
             elif action_type == 'scroll':
@@ -238,15 +287,26 @@ class BrowserController:
                 else:
                     await self.page.evaluate(f"window.scrollBy(0, -{amount})")
                 
-                await asyncio.sleep(0.5)
                 return {'success': True, 'result': f'Scrolled {direction}'}
             
             elif action_type == 'wait':
                 seconds = details.get('seconds', 2)
                 await asyncio.sleep(seconds)
-                return {'success': True, 'result': f'Waited {seconds} seconds'}
+                return {'success': True, 'result': f'Waited {seconds} seconds',
+                        'wait_ms': seconds * 1000}
             
             return {'success': False, 'error': 'Unknown action type'}
             
         except Exception as e:
-            return {'success': False, 'error': str(e)}
\ No newline at end of file
+            return {'success': False, 'error': str(e)}
+    
+    def _resolve_selector(self, details: Dict):
+        """Селектор из "selector" или по номеру элемента из последнего снимка"""
+        handle = details.get('element')
+        if handle is None:
+            return details.get('selector')
+        number = parse_handle(handle)
+        element = self.model.element(number) if number is not None else None
+        if element is None:
+            raise ValueError(f"Элемент {handle} не найден на странице")
+        return f"xpath={element['xpath']}"
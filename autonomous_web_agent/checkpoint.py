@@ -0,0 +1,229 @@
+"""Контрольные точки длинных задач: продолжение после падения процесса.
+
+После каждого шага агент сохраняет в CheckpointStore (SQLite) то, что
+нужно для продолжения задачи с того же места:
+
+- номер шага, текущий URL и счетчики агента (вызовы модели, токены);
+- новые записи истории Memory с прошлой точки - история дописывается,
+  а не переписывается целиком;
+- по желанию (storage=True) - состояние хранилища браузера (cookies и
+  localStorage, context.storage_state). В нем сессионные cookies, и
+  пишется оно открытым текстом, поэтому по умолчанию не сохраняется, а
+  файл базы создается с правами только для владельца. Снятие состояния -
+  обход браузера: оно снимается при смене адреса и не чаще раза в
+  storage_every шагов, а записывается, только если изменилось.
+
+Запись идет в фоне (asyncio.to_thread): шаг ждет только сбора новых
+записей истории. Следующая точка начинается после того, как записана
+предыдущая, поэтому порядок записей сохраняется. База в режиме WAL с
+synchronous=NORMAL: фиксация не ждет fsync на каждом шаге.
+
+Завершенная задача (выполнена, провалена, лимит шагов) удаляет свою
+точку. Прерванная (/stop, отмена, падение) остается, и ее можно
+продолжить: main.py --resume. Точки помечаются источником (origin):
+latest() ищет только среди точек своего источника.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+
+class CheckpointStore:
+    def __init__(self, path: str, storage_every: int = 5, max_unfinished: int = 20,
+                 origin: str = 'cli', storage: bool = False):
+        self.origin = origin
+        self.storage = storage
+        self.storage_every = storage_every
+        self.max_unfinished = max_unfinished
+        self.saved = 0
+        self.write_ms = 0.0
+        # Запись идет из потоков asyncio.to_thread - соединение под замком
+        self._lock = threading.Lock()
+        if not os.path.exists(path):
+            # В базе может оказаться состояние браузера - только для владельца
+            os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o600))
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "task_id TEXT PRIMARY KEY, task TEXT NOT NULL, step INTEGER NOT NULL, "
+            "url TEXT NOT NULL, counters TEXT NOT NULL, storage_state TEXT, "
+            "started_at REAL NOT NULL, updated_at REAL NOT NULL, origin TEXT NOT NULL DEFAULT 'cli')"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(checkpoints)")}
+        if 'origin' not in columns:
+            # База, созданная до появления источников
+            self._db.execute("ALTER TABLE checkpoints ADD COLUMN origin TEXT NOT NULL DEFAULT 'cli'")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoint_actions ("
+            "task_id TEXT NOT NULL, seq INTEGER NOT NULL, record TEXT NOT NULL, "
+            "PRIMARY KEY (task_id, seq))"
+        )
+        self._db.commit()
+        self._pending: Optional[asyncio.Future] = None
+        # Состояние текущей задачи: сколько записей истории уже сохранено и т.п.
+        self.task_id: Optional[str] = None
+        self._saved_actions = 0
+        self._storage_hash: Optional[str] = None
+        self._storage_url = ''
+        self._storage_step = 0
+        self._task = ''
+        self._started = 0.0
+        self.purge()
+
+    def begin(self, task: str, resumed: Optional[Dict] = None) -> str:
+        """Новая задача или продолжение сохраненной (resumed из latest)"""
+        if resumed is not None:
+            self.task_id = resumed['task_id']
+            self._saved_actions = resumed['counters'].get('total_actions', 0)
+            self._storage_hash = _digest(resumed['storage_state']) if resumed.get('storage_state') else None
+            self._storage_url = resumed['url']
+            self._storage_step = resumed['step']
+            self._started = resumed['started_at']
+        else:
+            self.task_id = uuid.uuid4().hex
+            self._saved_actions = 0
+            self._storage_hash = None
+            self._storage_url = ''
+            self._storage_step = 0
+            self._started = time.time()
+        self._task = task
+        return self.task_id
+
+    async def save(self, step: int, url: str, memory, counters: Dict[str, Any], context=None):
+        """Точка после шага step; возвращается, не дожидаясь записи"""
+        if self.task_id is None:
+            return
+        total = memory.total_actions
+        records = memory.records_since(self._saved_actions)
+        self._saved_actions = total
+        counters = dict(counters, total_actions=total, successful_actions=memory.successful_actions)
+        take_storage = self.storage and context is not None and (
+            url != self._storage_url or step - self._storage_step >= self.storage_every)
+        if self._pending is not None:
+            # Отмена шага не должна отменять запись предыдущей точки
+            await asyncio.shield(self._pending)
+        entry = (self.task_id, self._task, self._started, step, url, records, counters)
+        self._pending = asyncio.ensure_future(self._save(entry, context if take_storage else None))
+
+    async def _save(self, entry: tuple, context):
+        url, step = entry[4], entry[3]
+        storage = None
+        if context is not None:
+            try:
+                state = json.dumps(await context.storage_state(), ensure_ascii=False, sort_keys=True)
+                self._storage_url, self._storage_step = url, step
+                digest = _digest(state)
+                if digest != self._storage_hash:
+                    storage, self._storage_hash = state, digest
+            except Exception as e:
+                print(f"Не удалось снять состояние браузера для контрольной точки: {e}")
+        try:
+            started = time.perf_counter()
+            await asyncio.to_thread(self._write, *entry, storage)
+            self.write_ms += (time.perf_counter() - started) * 1000
+            self.saved += 1
+        except Exception as e:
+            print(f"Ошибка записи контрольной точки: {e}")
+
+    def _write(self, task_id: str, task: str, started: float, step: int, url: str, records: List,
+               counters: Dict, storage: Optional[str]):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO checkpoints "
+                "(task_id, task, step, url, counters, storage_state, started_at, updated_at, origin) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(task_id) DO UPDATE SET step = excluded.step, url = excluded.url, "
+                "counters = excluded.counters, updated_at = excluded.updated_at, "
+                "storage_state = COALESCE(excluded.storage_state, checkpoints.storage_state)",
+                (task_id, task, step, url, json.dumps(counters), storage, started, time.time(),
+                 self.origin))
+            self._db.executemany(
+                "INSERT OR REPLACE INTO checkpoint_actions (task_id, seq, record) VALUES (?, ?, ?)",
+                [(task_id, seq, json.dumps(record, ensure_ascii=False, default=str))
+                 for seq, record in records])
+            self._db.commit()
+
+    async def flush(self):
+        if self._pending is not None:
+            await asyncio.gather(self._pending, return_exceptions=True)
+            self._pending = None
+
+    async def finish(self):
+        """Задача завершена - точка больше не нужна"""
+        await self.flush()
+        if self.task_id is None:
+            return
+        task_id, self.task_id = self.task_id, None
+        await asyncio.to_thread(self._delete, task_id)
+
+    def _delete(self, task_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM checkpoints WHERE task_id = ?", (task_id,))
+            self._db.execute("DELETE FROM checkpoint_actions WHERE task_id = ?", (task_id,))
+            self._db.commit()
+
+    def latest(self, task: Optional[str] = None, max_history: int = 100) -> Optional[Dict]:
+        """Последняя незавершенная задача этого источника (или последняя с таким текстом задачи)"""
+        query = ("SELECT task_id, task, step, url, counters, storage_state, started_at, updated_at "
+                 "FROM checkpoints WHERE origin = ?")
+        params: tuple = (self.origin,)
+        if task:
+            query += " AND task = ?"
+            params += (task,)
+        with self._lock:
+            row = self._db.execute(query + " ORDER BY updated_at DESC LIMIT 1", params).fetchone()
+            if row is None:
+                return None
+            task_id, task, step, url, counters, storage_state, started_at, updated_at = row
+            history = [json.loads(record) for (record,) in self._db.execute(
+                "SELECT record FROM checkpoint_actions WHERE task_id = ? ORDER BY seq DESC LIMIT ?",
+                (task_id, max_history))]
+        history.reverse()
+        return {
+            'task_id': task_id,
+            'task': task,
+            'step': step,
+            'url': url,
+            'counters': json.loads(counters),
+            'storage_state': json.loads(storage_state) if storage_state else None,
+            'started_at': started_at,
+            'updated_at': updated_at,
+            'history': history,
+        }
+
+    def purge(self):
+        """Старые незавершенные задачи этого источника сверх max_unfinished"""
+        with self._lock:
+            stale = [task_id for (task_id,) in self._db.execute(
+                "SELECT task_id FROM checkpoints WHERE origin = ? "
+                "ORDER BY updated_at DESC LIMIT -1 OFFSET ?",
+                (self.origin, self.max_unfinished))]
+        for task_id in stale:
+            self._delete(task_id)
+        return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            unfinished = self._db.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0]
+        return {
+            'saved': self.saved,
+            'write_ms_mean': round(self.write_ms / self.saved, 2) if self.saved else 0.0,
+            'unfinished': unfinished,
+        }
+
+    def close(self):
+        self._db.close()
+
+
+def _digest(value) -> str:
+    if not isinstance(value, str):
+        value = json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(value.encode('utf-8')).hexdigest()
@@ -6,6 +6,17 @@ load_dotenv()
 class Config:
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
     GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-2.0-flash')
+    # Сильная модель для шагов с низкой уверенностью (пусто - не используется)
+    GEMINI_STRONG_MODEL = os.getenv('GEMINI_STRONG_MODEL', '')
+    ESCALATE_CONFIDENCE = float(os.getenv('AGENT_ESCALATE_CONFIDENCE', '0.5'))
+    
+    # Вызовы модели (llm_client.py): срок, повторы, дубли после p95, лимиты на процесс
+    LLM_TIMEOUT = float(os.getenv('AGENT_LLM_TIMEOUT', '30'))
+    LLM_RETRIES = int(os.getenv('AGENT_LLM_RETRIES', '2'))
+    LLM_HEDGE = os.getenv('AGENT_LLM_HEDGE', '0') == '1'
+    LLM_HEDGE_PERCENTILE = float(os.getenv('AGENT_LLM_HEDGE_PERCENTILE', '95'))
+    LLM_RPM = float(os.getenv('AGENT_LLM_RPM', '0'))
+    LLM_TPM = float(os.getenv('AGENT_LLM_TPM', '0'))
     
     HEADLESS = False
     BROWSER_TYPE = "chromium"
@@ -13,6 +24,82 @@ class Config:
     
     TEMPERATURE = 0.1
     MAX_TOKENS = 1000
+    # Бюджет токенов промпта шага без system_prompt (prompt_compiler.py)
+    PROMPT_TOKEN_BUDGET = int(os.getenv('AGENT_PROMPT_TOKENS', '1500'))
+    # Сколько интерактивных элементов (с наибольшим рангом) попадает в промпт
+    PROMPT_ELEMENTS = int(os.getenv('AGENT_PROMPT_ELEMENTS', '20'))
+    # system_prompt один раз в кэше контекста Gemini вместо каждого запроса
+    CONTEXT_CACHE = os.getenv('AGENT_CONTEXT_CACHE', '0') == '1'
+    CONTEXT_CACHE_TTL = int(os.getenv('AGENT_CONTEXT_CACHE_TTL', '3600'))
     
     MAX_STEPS = 50
-    THINKING_DELAY = 1.0
\ No newline at end of file
+    # Максимум действий в одном ответе планировщика (action + next_actions)
+    MAX_BATCH_ACTIONS = 8
+    # Локальные правила для очевидных шагов без вызова модели (fast_path.py)
+    FAST_PATH = os.getenv('AGENT_FAST_PATH', '1') == '1'
+    # Пауза между шагами; готовность страницы отслеживает readiness.py
+    THINKING_DELAY = float(os.getenv('AGENT_THINKING_DELAY', '0'))
+    
+    # Упреждающая загрузка ссылок в фоновых страницах, пока думает модель (prefetch.py)
+    PREFETCH = os.getenv('AGENT_PREFETCH', '0') == '1'
+    PREFETCH_PAGES = int(os.getenv('AGENT_PREFETCH_PAGES', '2'))
+    PREFETCH_MEMORY_MB = float(os.getenv('AGENT_PREFETCH_MEMORY_MB', '256'))
+    PREFETCH_MAX_AGE = float(os.getenv('AGENT_PREFETCH_MAX_AGE', '60'))
+    
+    # Ожидание готовности: adaptive | longpoll (сайты с long-polling) | networkidle
+    WAIT_MODE = os.getenv('AGENT_WAIT_MODE', 'adaptive')
+    READY_QUIET_MS = 150
+    
+    # Перехват запросов (network.py): full | no-media | text-only
+    NETWORK_PROFILE = os.getenv('AGENT_NETWORK_PROFILE', 'full')
+    # Дополнительные домены для блокировки, через запятую
+    BLOCKED_DOMAINS = os.getenv('AGENT_BLOCKED_DOMAINS', '')
+    
+    # Дисковый кэш HTTP-ответов (response_cache.py)
+    RESPONSE_CACHE = os.getenv('AGENT_RESPONSE_CACHE', '0') == '1'
+    RESPONSE_CACHE_DIR = os.getenv('AGENT_RESPONSE_CACHE_DIR', '.response_cache')
+    RESPONSE_CACHE_MAX_MB = int(os.getenv('AGENT_RESPONSE_CACHE_MAX_MB', '500'))
+    # Принудительный TTL по доменам: example.com=3600,cdn.example.net=86400
+    RESPONSE_CACHE_TTLS = os.getenv('AGENT_RESPONSE_CACHE_TTLS', '')
+    # HAR-архив: replay - офлайн только из архива, record - дописывать
+    HAR_PATH = os.getenv('AGENT_HAR_PATH')
+    HAR_MODE = os.getenv('AGENT_HAR_MODE', 'replay')
+    
+    # Семплирующий профайлер вокруг цикла run_task (telemetry.py)
+    PROFILE = os.getenv('AGENT_PROFILE', '0') == '1'
+    
+    # Параллельное выполнение задач (scheduler.py)
+    CONCURRENCY = int(os.getenv('AGENT_CONCURRENCY', '4'))
+    TASK_TIMEOUT = float(os.getenv('AGENT_TASK_TIMEOUT', '300'))
+    VIEWPORT = {'width': 1920, 'height': 1080}
+    
+    # Прогретый браузер (warm_pool.py): CDP-адрес или файл состояния демона
+    WARM_BROWSER = os.getenv('AGENT_WARM_BROWSER')
+    WARM_STATE_FILE = os.getenv('AGENT_WARM_STATE_FILE',
+                                os.path.join(os.path.expanduser('~'), '.awa_warm_browser.json'))
+    
+    # HTTP-сервис (app.py)
+    SERVICE_HOST = os.getenv('AGENT_SERVICE_HOST', '127.0.0.1')
+    SERVICE_PORT = int(os.getenv('AGENT_SERVICE_PORT', '8080'))
+    SERVICE_MAX_QUEUE = int(os.getenv('AGENT_SERVICE_MAX_QUEUE', '100'))
+    # Сколько заданий (вместе с завершенными) сервис держит в памяти
+    SERVICE_MAX_JOBS = int(os.getenv('AGENT_SERVICE_MAX_JOBS', '1000'))
+    
+    # Кэш решений планировщика (decision_cache.py)
+    DECISION_CACHE = os.getenv('AGENT_DECISION_CACHE', '0') == '1'
+    DECISION_CACHE_SIZE = int(os.getenv('AGENT_DECISION_CACHE_SIZE', '1000'))
+    DECISION_CACHE_TTL = float(os.getenv('AGENT_DECISION_CACHE_TTL', '3600'))
+    DECISION_CACHE_PATH = os.getenv('AGENT_DECISION_CACHE_PATH')
+    
+    # Контрольные точки после каждого шага для main.py --resume (checkpoint.py)
+    CHECKPOINT = os.getenv('AGENT_CHECKPOINT', '1') == '1'
+    CHECKPOINT_PATH = os.getenv('AGENT_CHECKPOINT_PATH', '.checkpoints.sqlite')
+    # Сохранять в точке состояние браузера (cookies, localStorage) - открытым текстом
+    CHECKPOINT_STORAGE = os.getenv('AGENT_CHECKPOINT_STORAGE', '0') == '1'
+    # Состояние браузера снимается при смене адреса и раз в N шагов
+    CHECKPOINT_STORAGE_EVERY = int(os.getenv('AGENT_CHECKPOINT_STORAGE_EVERY', '5'))
+    
+    # Знания о сайтах между задачами (site_knowledge.py)
+    SITE_KNOWLEDGE = os.getenv('AGENT_SITE_KNOWLEDGE', '1') == '1'
+    SITE_KNOWLEDGE_PATH = os.getenv('AGENT_SITE_KNOWLEDGE_PATH', '.site_knowledge.sqlite')
+    SITE_KNOWLEDGE_HALF_LIFE_DAYS = float(os.getenv('AGENT_SITE_KNOWLEDGE_HALF_LIFE_DAYS', '30'))
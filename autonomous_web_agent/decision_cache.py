@@ -0,0 +1,161 @@
+"""Кэш решений планировщика.
+
+Ключ - нормализованная задача, URL, структурный отпечаток страницы и
+последние действия. При попадании план возвращается без вызова модели.
+Записи живут ttl секунд, при переполнении вытесняется самая давняя по
+использованию. Если указан path, кэш дублируется в SQLite и переживает
+перезапуск процесса. Записи в SQLite копятся и фиксируются пачкой по
+WRITE_BATCH (и при close), чтобы шаг агента не ждал commit.
+
+Ответы complete и ask_user не кэшируются: ключ не учитывает текст
+страницы, а в них - результат, извлеченный из текста.
+"""
+import hashlib
+import json
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from snapshot import structural_fingerprint
+
+WRITE_BATCH = 32
+UNCACHEABLE_ACTIONS = ('complete', 'ask_user')
+
+
+def normalize_task(task: str) -> str:
+    return re.sub(r'\s+', ' ', task.strip().lower()).strip(' .!?')
+
+
+def action_signature(action: Dict) -> str:
+    return json.dumps(
+        {'type': action.get('type'), 'details': action.get('details', {})},
+        sort_keys=True, ensure_ascii=False,
+    )
+
+
+class DecisionCache:
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600, path: Optional[str] = None,
+                 history_depth: int = 3):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.history_depth = history_depth
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+        # Незафиксированные изменения SQLite: ключ -> (план JSON, срок) или None (удаление)
+        self._pending: Dict[str, Optional[tuple]] = {}
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS decisions ("
+                "key TEXT PRIMARY KEY, plan TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM decisions WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+
+    def make_key(self, task: str, page_state: Dict, history: List[Dict]) -> str:
+        parts = [
+            normalize_task(task),
+            page_state.get('url', ''),
+            structural_fingerprint(page_state),
+        ]
+        recent = history[-self.history_depth:] if self.history_depth else []
+        parts.extend(action_signature(action) for action in recent)
+        return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is None and self._db is not None and key not in self._pending:
+            row = self._db.execute(
+                "SELECT plan, expires_at FROM decisions WHERE key = ?", (key,)
+            ).fetchone()
+            if row:
+                entry = (row[1], json.loads(row[0]))
+                self._store(key, entry)
+
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, plan = entry
+        if expires_at < now:
+            self.expirations += 1
+            self._delete(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return plan
+
+    def put(self, key: str, plan: Dict[str, Any]) -> bool:
+        """Сохранение плана; False, если такой план кэшировать нельзя"""
+        if plan.get('action', {}).get('type') in UNCACHEABLE_ACTIONS:
+            return False
+        plan = {k: v for k, v in plan.items() if k not in ('cached', 'cache_key')}
+        entry = (time.time() + self.ttl, plan)
+        self._store(key, entry)
+        self._write(key, (json.dumps(plan, ensure_ascii=False), entry[0]))
+        return True
+
+    def invalidate(self, key: str):
+        """Удаление решения, которое не сработало в браузере"""
+        if self._delete(key):
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+        }
+
+    def flush(self):
+        """Фиксация накопленных изменений в SQLite одной транзакцией"""
+        if self._db is None or not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        self._db.executemany(
+            "INSERT OR REPLACE INTO decisions (key, plan, expires_at) VALUES (?, ?, ?)",
+            [(key, *row) for key, row in pending.items() if row is not None])
+        self._db.executemany(
+            "DELETE FROM decisions WHERE key = ?",
+            [(key,) for key, row in pending.items() if row is None])
+        self._db.commit()
+
+    def close(self):
+        if self._db is not None:
+            self.flush()
+            self._db.close()
+            self._db = None
+
+    def _write(self, key: str, row: Optional[tuple]):
+        if self._db is None:
+            return
+        self._pending[key] = row
+        if len(self._pending) >= WRITE_BATCH:
+            self.flush()
+
+    def _store(self, key: str, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _delete(self, key: str) -> bool:
+        deleted = self._entries.pop(key, None) is not None
+        self._write(key, None)
+        return deleted
@@ -0,0 +1,235 @@
+"""Быстрый путь: локальные правила для очевидных шагов без вызова LLM.
+
+Перед планировщиком агент спрашивает правила по очереди. Первое правило,
+уверенное в действии, возвращает готовый план в формате AIPlanner; если
+ни одно не сработало, шаг планирует Gemini. Правила:
+
+    open_url        задача содержит URL или домен, а вкладка пустая
+    search_box      на странице одно поле поиска (или поле, которое уже
+                    срабатывало на этом сайте, см. site_knowledge.py), а
+                    запрос есть в задаче
+    cookie_banner   баннер cookies с кнопкой согласия
+
+Свое правило - объект с атрибутом name и методом
+match(task, history, page_state) -> Optional[Dict], который добавляется
+через FastPath.add_rule. Счетчики срабатываний по правилам - это число
+сэкономленных вызовов модели.
+"""
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+
+from site_knowledge import SEARCH_HINTS, SEARCH_NAMES, locator_for
+
+BLANK_URLS = ('', 'about:blank', 'chrome://newtab/')
+
+URL_RE = re.compile(r'https?://[^\s<>"\'«»]+', re.IGNORECASE)
+# Домен без схемы: "на сайте kulinar.ru", "открой habr.com/ru/news"
+DOMAIN_RE = re.compile(
+    r'(?<![@\w.])((?:[a-z0-9-]+\.)+(?:[a-z]{2,24}|рф))(/[^\s<>"\'«»]*)?(?![\w@])', re.IGNORECASE)
+# Без схемы похожее на домен слово - часто имя технологии или файла
+# (Node.js, index.html, ASP.NET). Сайтом оно считается, если начинается с
+# www., заканчивается известной зоной или идет сразу после слов вроде
+# "на сайте", "открой". Зона должна быть в нижнем регистре и не быть
+# расширением файла
+KNOWN_TLDS = {
+    'ru', 'рф', 'su', 'com', 'org', 'net', 'info', 'biz', 'edu', 'gov', 'io', 'ai', 'dev', 'app',
+    'me', 'co', 'tv', 'uk', 'us', 'eu', 'de', 'fr', 'it', 'es', 'pl', 'nl', 'ua', 'by', 'kz', 'uz',
+}
+FILE_SUFFIXES = {
+    'js', 'ts', 'jsx', 'tsx', 'mjs', 'vue', 'py', 'rb', 'go', 'rs', 'java', 'kt', 'cs', 'cpp', 'php',
+    'sh', 'html', 'htm', 'css', 'scss', 'json', 'xml', 'yaml', 'yml', 'toml', 'ini', 'cfg', 'md', 'txt',
+    'csv', 'log', 'sql', 'pdf', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'zip', 'gz', 'tar', 'exe',
+    'png', 'jpg', 'jpeg', 'gif', 'svg', 'mp3', 'mp4',
+}
+SITE_PHRASE_RE = re.compile(
+    r'(?:сайте?|сайт|открой|открыть|перейди(?:\s+на)?|зайди(?:\s+на)?|go to|open|visit|website|site)'
+    r'\s*[:«"]?\s*$', re.IGNORECASE)
+
+QUOTED_RE = re.compile(r'["«“]([^"»”]{2,100})["»”]')
+# Запрос без кавычек выделяем только в форме "найди X на сайте Y": так ясно,
+# что нужен поиск по сайту, а не, например, цена на открытой странице
+QUERY_RE = re.compile(
+    r'(?:найди|найти|поищи|ищи|search for|search|find|look up)\s+(.{2,100}?)'
+    r'(?:\s+(?:на сайте|on the site|on website)\s+\S+|\s+(?:на|on|at)\s+[\w-]+\.[\w./-]+)[.!?]*$',
+    re.IGNORECASE)
+
+
+COOKIE_HINTS = ('cookie', 'куки', 'файлы cookie', 'cookies')
+ACCEPT_TEXTS = (
+    'принять', 'принять все', 'принимаю', 'согласен', 'согласна', 'хорошо', 'понятно',
+    'ok', 'окей', 'accept', 'accept all', 'allow all', 'i agree', 'agree', 'got it',
+)
+
+
+def _plan(rule: str, action: Dict, thoughts: str, next_actions: Optional[List[Dict]] = None) -> Dict:
+    plan = {'action': action, 'confidence': 0.95, 'thoughts': thoughts, 'fast_path': rule}
+    if next_actions:
+        plan['next_actions'] = next_actions
+    return plan
+
+
+def element_selector(el: Dict) -> str:
+    if el.get('id') and re.fullmatch(r'[A-Za-z][\w-]*', el['id']):
+        return f"#{el['id']}"
+    return f"xpath={el['xpath']}"
+
+
+def find_domain(text: str):
+    """Первое упоминание домена без схемы (match DOMAIN_RE) или None"""
+    for match in DOMAIN_RE.finditer(text):
+        host = match.group(1)
+        tld = host.rsplit('.', 1)[1]
+        if host.lower().startswith('www.'):
+            return match
+        if tld != tld.lower() or tld in FILE_SUFFIXES:
+            continue
+        if tld in KNOWN_TLDS or SITE_PHRASE_RE.search(text[:match.start()]):
+            return match
+    return None
+
+
+def extract_url(task: str) -> Optional[str]:
+    match = URL_RE.search(task)
+    if match:
+        return match.group(0).rstrip('.,;:!?)')
+    match = find_domain(task)
+    if match:
+        return 'https://' + match.group(0).rstrip('.,;:!?)')
+    return None
+
+
+def extract_query(task: str) -> Optional[str]:
+    """Поисковый запрос из задачи; None, если его нельзя выделить уверенно"""
+    quoted = QUOTED_RE.search(task)
+    if quoted:
+        return quoted.group(1).strip()
+    match = QUERY_RE.search(task.strip())
+    if match:
+        query = match.group(1).strip(' ,.')
+        # Запрос с URL внутри - это не запрос, а адрес
+        if query and not URL_RE.search(query) and not find_domain(query):
+            return query
+    return None
+
+
+class OpenUrlRule:
+    name = 'open_url'
+
+    def match(self, task: str, history: List[Dict], page_state: Dict) -> Optional[Dict]:
+        if history or page_state.get('url', '') not in BLANK_URLS:
+            return None
+        url = extract_url(task)
+        if not url:
+            return None
+        return _plan(self.name, {'type': 'navigate', 'details': {'url': url}},
+                     f"Вкладка пустая, открываю адрес из задачи: {url}")
+
+
+class SearchBoxRule:
+    name = 'search_box'
+
+    def match(self, task: str, history: List[Dict], page_state: Dict) -> Optional[Dict]:
+        # Уже что-то вводили - дальше решает модель
+        if any(action.get('type') == 'type' for action in history):
+            return None
+        boxes = [el for el in page_state.get('interactive_elements', []) if self._is_search_box(el)]
+        if len(boxes) == 1:
+            selector = element_selector(boxes[0])
+        else:
+            # Полей несколько или эвристика их не узнала - берем известное по сайту
+            selector = self._known_box(page_state)
+            if selector is None:
+                return None
+        query = extract_query(task)
+        if not query:
+            return None
+        return _plan(
+            self.name,
+            {'type': 'type', 'details': {'selector': selector, 'text': query}},
+            f"На странице одно поле поиска, ищу: {query}",
+            next_actions=[{'type': 'press', 'details': {'key': 'Enter'},
+                           'precondition': {'url_unchanged': True}}],
+        )
+
+    @staticmethod
+    def _known_box(page_state: Dict) -> Optional[str]:
+        locators = {locator_for(el) for el in page_state.get('interactive_elements', [])}
+        for entry in page_state.get('site_knowledge') or []:
+            if entry['intent'] == 'search' and entry['action'] == 'type' and entry['locator'] in locators:
+                return entry['locator']
+        return None
+
+    @staticmethod
+    def _is_search_box(el: Dict) -> bool:
+        if el.get('tag') not in ('input', 'textarea'):
+            return False
+        if el.get('type') == 'search' or el.get('role') in ('searchbox', 'search'):
+            return True
+        if el.get('type') not in ('', 'text'):
+            return False
+        if (el.get('name') or '').lower() in SEARCH_NAMES:
+            return True
+        hints = ' '.join((el.get('placeholder', ''), el.get('id', ''), el.get('class', ''))).lower()
+        return any(hint in hints for hint in SEARCH_HINTS)
+
+
+class CookieBannerRule:
+    name = 'cookie_banner'
+
+    def match(self, task: str, history: List[Dict], page_state: Dict) -> Optional[Dict]:
+        text = page_state.get('visible_text', '').lower()
+        if not any(hint in text for hint in COOKIE_HINTS):
+            return None
+        clicked = {action.get('details', {}).get('selector') for action in history
+                   if action.get('type') == 'click'}
+        for el in page_state.get('interactive_elements', []):
+            if el.get('tag') not in ('button', 'a') and el.get('role') != 'button':
+                continue
+            label = el.get('text', '').strip().lower().rstrip('!.')
+            if label not in ACCEPT_TEXTS:
+                continue
+            selector = element_selector(el)
+            if selector in clicked:
+                # Уже нажимали, а баннер остался - пусть разбирается модель
+                return None
+            return _plan(self.name, {'type': 'click', 'details': {'selector': selector}},
+                         f"Закрываю баннер cookies кнопкой '{el.get('text', '').strip()}'")
+        return None
+
+
+class FastPath:
+    def __init__(self, rules: Optional[list] = None):
+        self.rules = list(rules) if rules is not None else [OpenUrlRule(), CookieBannerRule(), SearchBoxRule()]
+        self.hits: Counter = Counter()
+        self.misses = 0
+
+    def add_rule(self, rule, first: bool = False):
+        if first:
+            self.rules.insert(0, rule)
+        else:
+            self.rules.append(rule)
+
+    def decide(self, task: str, history: List[Dict], page_state: Dict) -> Optional[Dict]:
+        """План от первого сработавшего правила или None.
+
+        history - все действия текущей задачи, а не только последние.
+        """
+        for rule in self.rules:
+            try:
+                plan = rule.match(task, history, page_state)
+            except Exception as e:
+                print(f"Ошибка правила {getattr(rule, 'name', rule)}: {e}")
+                continue
+            if plan is not None:
+                self.hits[rule.name] += 1
+                return plan
+        self.misses += 1
+        return None
+
+    def stats(self) -> Dict:
+        return {
+            'hits': dict(self.hits),
+            'saved_calls': sum(self.hits.values()),
+            'misses': self.misses,
+        }
@@ -0,0 +1,98 @@
+"""Инкрементальный разбор JSON-ответа модели.
+
+Модель отдает ответ кусками. Парсер следит за вложенностью скобок и
+строками и возвращает значение ключа верхнего уровня (например "action"),
+как только его объект закрыт, не дожидаясь конца ответа.
+"""
+import json
+from typing import Any, Iterable, List, Tuple
+
+
+class ActionStreamParser:
+    def __init__(self, keys: Iterable[str] = ('action',)):
+        self.keys = set(keys)
+        self.buffer = ""
+        self.pos = 0
+        self.stack: List[str] = []
+        self.in_string = False
+        self.escape = False
+        self.string_start = 0
+        self.last_string = None
+        self.pending_key = None
+        # Ключ и начало объекта, который сейчас захватываем
+        self.capture_key = None
+        self.capture_start = None
+        self.capture_depth = 0
+        self.array_key = None
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Добавление куска ответа; возвращает новые завершенные значения"""
+        self.buffer += chunk
+        completed = []
+
+        while self.pos < len(self.buffer):
+            ch = self.buffer[self.pos]
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    self.last_string = self.buffer[self.string_start:self.pos]
+
+            elif not self.stack:
+                # Текст до JSON (например, ```json) пропускаем
+                if ch == '{':
+                    self.stack.append('{')
+
+            elif ch == '"':
+                self.in_string = True
+                self.string_start = self.pos + 1
+
+            elif ch == ':' and len(self.stack) == 1:
+                self.pending_key = self.last_string
+
+            elif ch == ',' and len(self.stack) == 1:
+                self.pending_key = None
+
+            elif ch in '{[':
+                if len(self.stack) == 1 and self.pending_key in self.keys:
+                    if ch == '{':
+                        self._start_capture(self.pending_key)
+                    else:
+                        self.array_key = self.pending_key
+                elif (ch == '{' and len(self.stack) == 2 and self.stack[-1] == '['
+                      and self.array_key is not None):
+                    self._start_capture(self.array_key)
+                self.stack.append(ch)
+
+            elif ch in '}]':
+                if self.stack:
+                    self.stack.pop()
+                if self.capture_start is not None and len(self.stack) == self.capture_depth:
+                    value = self._finish_capture()
+                    if value is not None:
+                        completed.append(value)
+                if ch == ']' and len(self.stack) == 1:
+                    self.array_key = None
+
+            self.pos += 1
+
+        return completed
+
+    def _start_capture(self, key: str):
+        self.capture_key = key
+        self.capture_start = self.pos
+        self.capture_depth = len(self.stack)
+
+    def _finish_capture(self):
+        raw = self.buffer[self.capture_start:self.pos + 1]
+        key = self.capture_key
+        self.capture_key = None
+        self.capture_start = None
+        try:
+            return key, json.loads(raw)
+        except json.JSONDecodeError:
+            return None
@@ -0,0 +1,256 @@
+"""Устойчивые вызовы модели: срок, повторы, дублирующие запросы, общий лимит.
+
+LLMClient оборачивает client.aio.models.generate_content_stream:
+
+- у вызова есть срок (timeout): и ожидание первого куска, и чтение
+  потока прерываются, когда он истекает;
+- ошибка или таймаут до первого куска ответа повторяется с
+  экспоненциальной задержкой со случайным разбросом (full jitter), но не
+  дольше срока вызова. Ошибки запроса (400, 403 и т.п.) не повторяются.
+  После первого куска повтор невозможен: действие из него уже могло
+  уйти на выполнение;
+- при hedge=True, если первый кусок не пришел за p95 времени первых
+  кусков прошлых вызовов, отправляется дублирующий запрос. Побеждает
+  тот, кто ответит первым, второй отменяется;
+- перед каждым запросом (и дублем) берется разрешение у общего на
+  процесс RateLimiter: корзины запросов и токенов в минуту, общие для
+  всех агентов процесса (get_rate_limiter).
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from config import Config
+from utils import percentile
+
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Корзина на capacity единиц, пополняется на rate единиц в секунду"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.available = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        """Сколько ждать до amount единиц (0 - можно сейчас)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate
+
+    def take(self, amount: float):
+        self.available -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """Лимит запросов и токенов в минуту (0 - без лимита).
+
+    Всплеск ограничен burst_seconds секундами квоты, чтобы агенты не
+    выбрали минутную квоту одной пачкой.
+    """
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 burst_seconds: float = 10):
+        self.requests = self._bucket(requests_per_minute, burst_seconds)
+        self.tokens = self._bucket(tokens_per_minute, burst_seconds)
+        self._lock = asyncio.Lock()
+        self.waited = 0.0
+        self.throttled = 0
+
+    @staticmethod
+    def _bucket(per_minute: float, burst_seconds: float) -> Optional[TokenBucket]:
+        if not per_minute:
+            return None
+        return TokenBucket(per_minute / 60, max(1.0, per_minute * burst_seconds / 60))
+
+    async def acquire(self, tokens: int = 0):
+        if self.requests is None and self.tokens is None:
+            return
+        # По одному: кто пришел раньше, тот раньше и получает разрешение
+        async with self._lock:
+            while True:
+                delay = max(self.requests.delay(1) if self.requests else 0.0,
+                            self.tokens.delay(tokens) if self.tokens else 0.0)
+                if delay <= 0:
+                    break
+                self.throttled += 1
+                self.waited += delay
+                await asyncio.sleep(delay)
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'throttled': self.throttled, 'waited_s': round(self.waited, 2)}
+
+
+_rate_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Общий лимит на процесс (Config.LLM_RPM, Config.LLM_TPM)"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter(Config.LLM_RPM, Config.LLM_TPM)
+    return _rate_limiter
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError, OSError)):
+        return True
+    code = getattr(error, 'code', None) or getattr(error, 'status_code', None)
+    return isinstance(code, int) and code in RETRYABLE_CODES
+
+
+def backoff(attempt: int, base: float, cap: float) -> float:
+    """Задержка перед повтором attempt (с 1): full jitter"""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class LLMClient:
+    def __init__(self, client, timeout: float = 30.0, retries: int = 2, hedge: bool = False,
+                 hedge_percentile: float = 95, hedge_min_samples: int = 20,
+                 limiter: Optional[RateLimiter] = None,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0):
+        self.client = client
+        self.timeout = timeout
+        self.retries = retries
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.limiter = limiter if limiter is not None else get_rate_limiter()
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Время до первого куска последних вызовов - по нему считается порог дубля
+        self.first_chunk_latencies: deque = deque(maxlen=200)
+        self.calls = 0
+        self.retried = 0
+        self.timeouts = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        if not self.hedge or len(self.first_chunk_latencies) < self.hedge_min_samples:
+            return None
+        return percentile(list(self.first_chunk_latencies), self.hedge_percentile)
+
+    async def stream(self, model: str, contents, config: Dict, tokens: int = 0) -> AsyncIterator:
+        """Куски ответа; исключение, если за срок и повторы ответа нет"""
+        self.calls += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        attempt = 0
+        while True:
+            try:
+                first, stream = await self._open_hedged(model, contents, config, tokens, deadline)
+                break
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.timeouts += 1
+                attempt += 1
+                delay = backoff(attempt, self.backoff_base, self.backoff_max)
+                if attempt > self.retries or not is_retryable(e) or loop.time() + delay >= deadline:
+                    raise
+                self.retried += 1
+                print(f"Ошибка запроса к модели ({type(e).__name__}: {e}), повтор {attempt} "
+                      f"через {delay:.1f} с")
+                await asyncio.sleep(delay)
+
+        if first is None:
+            return
+        yield first
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                self.timeouts += 1
+                raise asyncio.TimeoutError(f"ответ модели не уложился в {self.timeout} с")
+            try:
+                chunk = await asyncio.wait_for(stream.__anext__(), remaining)
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise
+            yield chunk
+
+    async def _open(self, model: str, contents, config: Dict, tokens: int) -> Tuple[Any, Any]:
+        """Запрос и первый кусок ответа (None, если ответ пустой)"""
+        await self.limiter.acquire(tokens)
+        started = time.perf_counter()
+        stream = await self.client.aio.models.generate_content_stream(
+            model=model, contents=contents, config=config)
+        try:
+            first = await stream.__anext__()
+        except StopAsyncIteration:
+            first = None
+        self.first_chunk_latencies.append(time.perf_counter() - started)
+        return first, stream
+
+    async def _open_hedged(self, model: str, contents, config: Dict, tokens: int,
+                           deadline: float) -> Tuple[Any, Any]:
+        loop = asyncio.get_running_loop()
+        primary = asyncio.ensure_future(self._open(model, contents, config, tokens))
+        tasks = {primary}
+        hedge_after = self.hedge_delay()
+        try:
+            if hedge_after is not None:
+                done, _ = await asyncio.wait(tasks, timeout=min(hedge_after, max(deadline - loop.time(), 0)))
+                if not done and loop.time() < deadline:
+                    self.hedged += 1
+                    tasks.add(asyncio.ensure_future(self._open(model, contents, config, tokens)))
+            while tasks:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError(f"нет ответа модели за {self.timeout} с")
+                done, tasks = await asyncio.wait(tasks, timeout=remaining,
+                                                 return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise asyncio.TimeoutError(f"нет ответа модели за {self.timeout} с")
+                winner = next((task for task in done if not task.exception()), None)
+                if winner is not None:
+                    if winner is not primary:
+                        self.hedge_wins += 1
+                    for task in done - {winner}:
+                        task.exception()
+                    return winner.result()
+                if not tasks:
+                    raise next(iter(done)).exception()
+            raise asyncio.TimeoutError(f"нет ответа модели за {self.timeout} с")
+        finally:
+            # Проигравший запрос отменяем, а уже открытый поток закрываем
+            for task in tasks:
+                task.cancel()
+                task.add_done_callback(_close_stream)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'retried': self.retried,
+            'timeouts': self.timeouts,
+            'hedged': self.hedged,
+            'hedge_wins': self.hedge_wins,
+            'hedge_after_ms': round((self.hedge_delay() or 0) * 1000, 1),
+            'rate_limiter': self.limiter.stats(),
+        }
+
+
+def _close_stream(task: asyncio.Future):
+    if task.cancelled() or task.exception() is not None:
+        return
+    _, stream = task.result()
+    close = getattr(stream, 'aclose', None)
+    if close is not None:
+        asyncio.ensure_future(close())
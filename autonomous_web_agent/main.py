@@ -1,18 +1,47 @@
 #!/usr/bin/env python3
-import asyncio
 import sys
-from agent import AutonomousWebAgent
 from config import Config
+from network import PROFILES
 import argparse
+import json
 
-async def main():
+# Модули агента (а с ними Playwright и SDK Gemini) импортируются в run()
+# после разбора аргументов: --help и ошибки в аргументах отвечают сразу
+
+def parse_args():
     parser = argparse.ArgumentParser(description='Автономный веб-агент')
     parser.add_argument('--task', type=str, help='Задача для выполнения')
     parser.add_argument('--url', type=str, help='Начальный URL')
     parser.add_argument('--headless', action='store_true', help='Запуск в headless режиме')
     parser.add_argument('--demo', action='store_true', help='Запуск демо-задачи')
-    
-    args = parser.parse_args()
+    parser.add_argument('--record', type=str, metavar='TRACE', help='Записать трассу шагов в JSONL-файл')
+    parser.add_argument('--replay', type=str, metavar='TRACE', help='Воспроизвести трассу без вызовов планировщика')
+    parser.add_argument('--spans', type=str, metavar='FILE', help='Писать спаны фаз шага в JSONL-файл')
+    parser.add_argument('--profile', action='store_true', help='Семплирующий профайлер цикла задачи')
+    parser.add_argument('--network-profile', choices=sorted(PROFILES),
+                        help='Какие ресурсы загружать: full, no-media, text-only')
+    parser.add_argument('--response-cache', action='store_true', help='Дисковый кэш HTTP-ответов')
+    parser.add_argument('--har', type=str, metavar='FILE', help='HAR-архив для офлайн-прогона')
+    parser.add_argument('--har-mode', choices=['replay', 'record'], default='replay',
+                        help='replay - только из архива, record - записать архив')
+    parser.add_argument('--batch', type=str, metavar='FILE',
+                        help='Пакет задач: JSONL, CSV или текст по строке; - для stdin')
+    parser.add_argument('--parallel', type=int, default=Config.CONCURRENCY, help='Задач одновременно')
+    parser.add_argument('--output', type=str, default='batch_results.jsonl',
+                        help='JSONL с результатами пакета')
+    parser.add_argument('--resume', action='store_true',
+                        help='Продолжить прерванную задачу с последней контрольной точки '
+                             '(в пакетном режиме - пропустить задачи, уже записанные в --output)')
+    parser.add_argument('--keep-history', action='store_true', help='Писать историю действий в результаты пакета')
+    parser.add_argument('--quiet', action='store_true', help='Не печатать вывод агентов в пакетном режиме')
+    return parser.parse_args()
+
+async def run(args):
+    import asyncio
+    from agent import AutonomousWebAgent
+    from recorder import TraceRecorder, TraceReplayer
+    from response_cache import get_response_cache
+    from telemetry import JsonlExporter, get_tracer
     
     # Проверка API ключа
     if not Config.GEMINI_API_KEY:
@@ -20,27 +49,63 @@ async def main():
         print("ℹ️ Получите ключ на: https://makersuite.google.com/app/apikey")
         sys.exit(1)
     
+    if args.spans:
+        get_tracer().add_exporter(JsonlExporter(args.spans))
+    if args.profile:
+        Config.PROFILE = True
+    if args.network_profile:
+        Config.NETWORK_PROFILE = args.network_profile
+    if args.response_cache:
+        Config.RESPONSE_CACHE = True
+    if args.har:
+        Config.HAR_PATH = args.har
+        Config.HAR_MODE = args.har_mode
+    
+    if args.batch:
+        await run_batch(args)
+        return
+    
     # Создаем агента
-    agent = AutonomousWebAgent(headless=args.headless)
+    agent = AutonomousWebAgent(headless=args.headless, checkpoints=Config.CHECKPOINT)
+    recorder = None
+    if args.record:
+        recorder = TraceRecorder(args.record)
+        agent.add_step_listener(recorder)
+    
+    # Прерванная задача (checkpoint.py): с --task - последняя с тем же текстом
+    checkpoint = None
+    if args.resume:
+        if agent.checkpoints is None:
+            print("❌ Контрольные точки выключены (AGENT_CHECKPOINT=0)")
+        else:
+            checkpoint = agent.checkpoints.latest(args.task)
+            if checkpoint is None:
+                print("ℹ️ Нет прерванной задачи для продолжения")
     
     try:
         # Инициализируем агента
-        await agent.initialize()
+        await agent.initialize(storage_state=checkpoint['storage_state'] if checkpoint else None)
         
-        # Если указан URL - переходим
-        if args.url:
+        # Если указан URL - переходим (при продолжении страница берется из контрольной точки)
+        if args.url and checkpoint is None:
             await agent.browser.page.goto(args.url)
             print(f"🌐 Перешли на {args.url}")
         
+        # Воспроизведение записанной трассы
+        if args.replay:
+            result = await TraceReplayer(agent, args.replay).replay()
+            save_result(result)
+        
+        # Продолжение прерванной задачи
+        elif checkpoint is not None:
+            print(f"🔁 Продолжаю задачу: {checkpoint['task']}")
+            result = await agent.run_task(checkpoint['task'], resume=checkpoint)
+            save_result(result)
+        
         # Если указана задача - выполняем
-        if args.task:
+        elif args.task:
             result = await agent.run_task(args.task)
-            
-            # Сохраняем историю
-            import json
-            with open('task_result.json', 'w', encoding='utf-8') as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
-            print("📁 Результат сохранен в task_result.json")
+            save_result(result)
         
         # Демо режим
         elif args.demo:
@@ -54,7 +119,7 @@ async def main():
             for i, task in enumerate(demo_tasks, 1):
                 print(f"\n{i}. {task}")
                 await agent.run_task(task)
-                input("Нажмите Enter для следующей задачи...")
+                await asyncio.to_thread(input, "Нажмите Enter для следующей задачи...")
         
         # Интерактивный режим
         else:
@@ -65,7 +130,42 @@ async def main():
     except Exception as e:
         print(f"❌ Ошибка: {e}")
     finally:
+        if recorder:
+            recorder.close()
+        get_tracer().close()
         await agent.close()
+        if get_response_cache() is not None:
+            get_response_cache().close()
+
+async def run_batch(args):
+    """Пакетный режим: результаты пишутся в --output по мере завершения задач"""
+    from batch import BatchRunner, print_summary, read_tasks
+    from response_cache import get_response_cache
+    from telemetry import get_tracer
+    
+    specs = read_tasks(args.batch)
+    # Пакет всегда выполняется без окон браузера
+    runner = BatchRunner(args.output, args.parallel, headless=True,
+                         keep_history=args.keep_history, quiet=args.quiet)
+    try:
+        summary = await runner.run(specs, resume=args.resume)
+        print_summary(summary)
+        print(f"📁 Результаты в {args.output}")
+    finally:
+        get_tracer().close()
+        if get_response_cache() is not None:
+            get_response_cache().close()
+
+def save_result(result):
+    """Сохранение результата задачи с историей"""
+    with open('task_result.json', 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print("📁 Результат сохранен в task_result.json")
+
+def main():
+    args = parse_args()
+    import asyncio
+    asyncio.run(run(args))
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    main()
\ No newline at end of file
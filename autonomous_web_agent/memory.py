@@ -1,63 +1,194 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Optional
+from collections import deque
 from datetime import datetime
+import hashlib
+import json
+import zlib
+
+# Поля состояния страницы, которые нужны только на текущем шаге
+TRANSIENT_KEYS = ('delta', 'unchanged', 'text_blocks', 'site_knowledge')
+
+
+class ActionRecord:
+    __slots__ = ('timestamp', 'action', 'result', 'success', 'url', 'element')
+
+    def __init__(self, action: Dict, result: Dict, url: str = '', element: Optional[Dict] = None):
+        self.timestamp = datetime.now().isoformat()
+        self.action = action
+        self.result = result
+        self.success = result.get('success', False)
+        # Страница и элемент из снимка, на которых выполнено действие (site_knowledge.py)
+        self.url = url
+        self.element = element
+
+    def to_dict(self) -> Dict:
+        record = {
+            'timestamp': self.timestamp,
+            'action': self.action,
+            'result': self.result,
+            'success': self.success,
+            'url': self.url,
+        }
+        if self.element is not None:
+            record['element'] = self.element
+        return record
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ActionRecord':
+        record = cls(data.get('action', {}), data.get('result', {}), data.get('url', ''), data.get('element'))
+        record.timestamp = data.get('timestamp', record.timestamp)
+        return record
+
+
+class ObservationRecord:
+    __slots__ = ('timestamp', 'url', 'digest')
+
+    def __init__(self, url: str, digest: str):
+        self.timestamp = datetime.now().isoformat()
+        self.url = url
+        self.digest = digest
+
+
+class SnapshotStore:
+    """Хранилище состояний страниц с адресацией по содержимому.
+
+    Одинаковые состояния хранятся один раз (по счетчику ссылок), тело
+    хранится сжатым и распаковывается только при обращении. Скриншоты
+    сохраняются, только если keep_screenshots=True.
+    """
+
+    def __init__(self, keep_screenshots: bool = False):
+        self.keep_screenshots = keep_screenshots
+        self._blobs: Dict[str, bytes] = {}
+        self._refs: Dict[str, int] = {}
+
+    def put(self, state: Dict) -> str:
+        state = {k: v for k, v in state.items() if k not in TRANSIENT_KEYS}
+        if not self.keep_screenshots:
+            state.pop('screenshot', None)
+        if state.get('fingerprint') and 'screenshot' not in state:
+            # Отпечаток из трекера уже адресует содержимое - не сериализуем
+            digest = f"{state.get('url', '')}#{state['fingerprint']}"
+            if digest in self._blobs:
+                self._refs[digest] += 1
+                return digest
+            raw = json.dumps(state, ensure_ascii=False).encode('utf-8')
+        else:
+            raw = json.dumps(state, ensure_ascii=False, sort_keys=True).encode('utf-8')
+            digest = hashlib.sha1(raw).hexdigest()
+            if digest in self._blobs:
+                self._refs[digest] += 1
+                return digest
+
+        self._blobs[digest] = zlib.compress(raw, 6)
+        self._refs[digest] = 1
+        return digest
+
+    def get(self, digest: str) -> Optional[Dict]:
+        blob = self._blobs.get(digest)
+        if blob is None:
+            return None
+        return json.loads(zlib.decompress(blob))
+
+    def release(self, digest: str):
+        refs = self._refs.get(digest, 0) - 1
+        if refs > 0:
+            self._refs[digest] = refs
+        else:
+            self._refs.pop(digest, None)
+            self._blobs.pop(digest, None)
+
+    def size_bytes(self) -> int:
+        return sum(len(blob) for blob in self._blobs.values())
+
+    def __len__(self):
+        return len(self._blobs)
+
 
 class Memory:
-    def __init__(self, max_history=100):
+    def __init__(self, max_history=100, max_observations=20, keep_screenshots=False):
         self.max_history = max_history
-        self.history: List[Dict] = []
-        self.observations: List[Dict] = []
+        self.max_observations = max_observations
+        self._history: deque = deque(maxlen=max_history)
+        self._observations: deque = deque()
+        self.snapshots = SnapshotStore(keep_screenshots)
         self.task = ""
-        
-    def add_action(self, action: Dict, result: Dict):
+        self.total_actions = 0
+        self.successful_actions = 0
+
+    @property
+    def history(self) -> List[Dict]:
+        """История действий в виде словарей (для сохранения результата)"""
+        return [record.to_dict() for record in self._history]
+
+    @property
+    def observations(self) -> List[Dict]:
+        return [
+            {'timestamp': record.timestamp, 'observation': self.snapshots.get(record.digest)}
+            for record in self._observations
+        ]
+
+    def add_action(self, action: Dict, result: Dict, url: str = '', element: Optional[Dict] = None):
         """Добавление действия в историю"""
-        entry = {
-            'timestamp': datetime.now().isoformat(),
-            'action': action,
-            'result': result,
-            'success': result.get('success', False)
-        }
-        
-        self.history.append(entry)
-        
-        # Ограничиваем размер истории
-        if len(self.history) > self.max_history:
-            self.history = self.history[-self.max_history:]
-    
+        record = ActionRecord(action, result, url, element)
+        # deque с maxlen сам вытесняет старые записи без копирования списка
+        self._history.append(record)
+
+        self.total_actions += 1
+        if record.success:
+            self.successful_actions += 1
+
     def add_observation(self, observation: Dict):
         """Добавление наблюдения (состояния страницы)"""
-        self.observations.append({
-            'timestamp': datetime.now().isoformat(),
-            'observation': observation
-        })
-        
-        if len(self.observations) > 20:  # Храним последние 20 состояний
-            self.observations = self.observations[-20:]
-    
+        if len(self._observations) >= self.max_observations:
+            self.snapshots.release(self._observations.popleft().digest)
+
+        digest = self.snapshots.put(observation)
+        self._observations.append(ObservationRecord(observation.get('url', ''), digest))
+
     def get_recent_history(self, count=10) -> List[Dict]:
         """Получение последних действий"""
-        return self.history[-count:] if len(self.history) > count else self.history
-    
+        start = max(0, len(self._history) - count)
+        return [self._history[i].to_dict() for i in range(start, len(self._history))]
+
+    def records_since(self, count: int) -> List[tuple]:
+        """Действия, добавленные после count-го: (порядковый номер, запись)"""
+        new = min(self.total_actions - count, len(self._history))
+        start = len(self._history) - max(new, 0)
+        first = self.total_actions - len(self._history)
+        return [(first + i, self._history[i].to_dict()) for i in range(start, len(self._history))]
+
+    def restore(self, task: str, history: List[Dict], total_actions: int, successful_actions: int):
+        """Восстановление после перезапуска из контрольной точки (checkpoint.py)"""
+        self.task = task
+        self._history = deque((ActionRecord.from_dict(item) for item in history), maxlen=self.max_history)
+        self.total_actions = total_actions
+        self.successful_actions = successful_actions
+
     def get_last_successful_action(self) -> Dict:
         """Получение последнего успешного действия"""
-        for action in reversed(self.history):
-            if action.get('success'):
-                return action
+        for record in reversed(self._history):
+            if record.success:
+                return record.to_dict()
         return {}
-    
+
+    def get_last_observation(self) -> Dict:
+        """Последнее сохраненное состояние страницы"""
+        if not self._observations:
+            return {}
+        return self.snapshots.get(self._observations[-1].digest) or {}
+
     def set_task(self, task: str):
         """Установка текущей задачи"""
         self.task = task
-    
+
     def get_task(self) -> str:
         """Получение текущей задачи"""
         return self.task
-    
+
     def get_summary(self) -> str:
         """Получение краткой сводки о прогрессе"""
-        if not self.history:
+        if not self.total_actions:
             return "Еще не выполнено действий"
-        
-        total = len(self.history)
-        successful = sum(1 for h in self.history if h.get('success', False))
-        
-        return f"Выполнено действий: {total}, успешных: {successful}"
\ No newline at end of file
+
+        return f"Выполнено действий: {self.total_actions}, успешных: {self.successful_actions}"
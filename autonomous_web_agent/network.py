@@ -0,0 +1,139 @@
+"""Профили перехвата запросов: не загружаем то, что агенту не нужно.
+
+Планировщик видит только текст и элементы страницы, поэтому картинки,
+шрифты, видео, реклама и аналитика только замедляют навигацию. Профили:
+
+    full       - без ограничений (перехват не включается вовсе)
+    no-media   - без картинок, видео и шрифтов, рекламные домены блокируются
+    text-only  - вдобавок без стилей и прочих вспомогательных ресурсов
+
+Черный список доменов действует во всех профилях, кроме full без
+списка. Учет ведется по навигациям: счетчики сбрасываются на каждом
+запросе документа главного фрейма. Размер заблокированных ответов
+неизвестен, поэтому сэкономленные байты оцениваются по средним размерам
+ресурсов каждого типа.
+
+Важно: при включенном перехвате Chromium не использует HTTP-кэш, поэтому
+профиль full перехват не ставит.
+"""
+from typing import Dict, FrozenSet, Iterable, Optional
+from urllib.parse import urlsplit
+
+PROFILES: Dict[str, FrozenSet[str]] = {
+    'full': frozenset(),
+    'no-media': frozenset({'image', 'media', 'font'}),
+    # Без стилей часть скрытых элементов может стать видимой - это
+    # приемлемо для задач, где нужен только текст
+    'text-only': frozenset({'image', 'media', 'font', 'stylesheet', 'texttrack',
+                            'manifest', 'eventsource', 'websocket', 'other'}),
+}
+
+# Реклама и аналитика: блокируются во всех профилях, кроме full
+AD_DOMAINS = (
+    'doubleclick.net', 'googlesyndication.com', 'googleadservices.com',
+    'google-analytics.com', 'googletagmanager.com', 'googletagservices.com',
+    'adservice.google.com', 'mc.yandex.ru', 'an.yandex.ru', 'top-fwz1.mail.ru',
+    'connect.facebook.net', 'ads.yahoo.com', 'hotjar.com',
+    'criteo.com', 'criteo.net', 'adnxs.com', 'taboola.com', 'outbrain.com',
+    'scorecardresearch.com', 'amplitude.com', 'segment.io', 'mixpanel.com',
+)
+
+# Средние размеры ответов по типу ресурса, байты (для оценки экономии)
+ESTIMATED_SIZES = {
+    'image': 45_000,
+    'media': 500_000,
+    'font': 35_000,
+    'stylesheet': 25_000,
+    'script': 30_000,
+    'xhr': 5_000,
+    'fetch': 5_000,
+}
+DEFAULT_SIZE = 5_000
+
+
+def parse_domains(value: Optional[str]) -> FrozenSet[str]:
+    """Список доменов из строки через запятую"""
+    if not value:
+        return frozenset()
+    return frozenset(d.strip().lower() for d in value.split(',') if d.strip())
+
+
+def _new_counters() -> Dict:
+    return {'requests': 0, 'blocked': 0, 'bytes_saved': 0, 'by_type': {}}
+
+
+class RequestRouter:
+    """Перехват запросов страницы по профилю и черному списку доменов"""
+
+    def __init__(self, profile: str = 'full', blocked_domains: Iterable[str] = ()):
+        if profile not in PROFILES:
+            raise ValueError(f"Неизвестный профиль сети: {profile}")
+        self.profile = profile
+        self.blocked_types = PROFILES[profile]
+        domains = set(blocked_domains)
+        if profile != 'full':
+            domains.update(AD_DOMAINS)
+        self.blocked_domains = frozenset(domains)
+        self.navigations = 0
+        self.current = _new_counters()
+        self.totals = _new_counters()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.blocked_types or self.blocked_domains)
+
+    async def attach(self, page):
+        if self.enabled:
+            await page.route('**/*', self._handle)
+
+    async def detach(self, page):
+        if self.enabled:
+            await page.unroute('**/*', self._handle)
+
+    def is_blocked(self, url: str, resource_type: str) -> bool:
+        if resource_type in self.blocked_types:
+            return True
+        if not self.blocked_domains:
+            return False
+        host = urlsplit(url).hostname or ''
+        # Проверяем сам хост и все его родительские домены
+        while host:
+            if host in self.blocked_domains:
+                return True
+            _, _, host = host.partition('.')
+        return False
+
+    def stats(self) -> Dict:
+        """Счетчики текущей навигации и итоги с момента запуска"""
+        return {
+            'profile': self.profile,
+            'navigations': self.navigations,
+            'current': dict(self.current, by_type=dict(self.current['by_type'])),
+            'totals': dict(self.totals, by_type=dict(self.totals['by_type'])),
+        }
+
+    async def _handle(self, route):
+        request = route.request
+        resource_type = request.resource_type
+        main_document = resource_type == 'document' and request.frame.parent_frame is None
+        if main_document:
+            self.navigations += 1
+            self.current = _new_counters()
+
+        # Документ главного фрейма не блокируем никогда: туда идет сам агент
+        if main_document or not self.is_blocked(request.url, resource_type):
+            self._count(resource_type, blocked=False)
+            # fallback, а не continue_: дальше могут стоять другие обработчики
+            await route.fallback()
+            return
+
+        self._count(resource_type, blocked=True)
+        await route.abort('blockedbyclient')
+
+    def _count(self, resource_type: str, blocked: bool):
+        for counters in (self.current, self.totals):
+            counters['requests'] += 1
+            if blocked:
+                counters['blocked'] += 1
+                counters['bytes_saved'] += ESTIMATED_SIZES.get(resource_type, DEFAULT_SIZE)
+                counters['by_type'][resource_type] = counters['by_type'].get(resource_type, 0) + 1
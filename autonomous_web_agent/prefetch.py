@@ -0,0 +1,245 @@
+"""Упреждающая загрузка вероятных следующих страниц в фоновых вкладках.
+
+Пока планировщик думает, браузер простаивает, а переход по ссылке
+начинается только после ответа модели. Prefetcher перед вызовом модели
+выбирает несколько ссылок текущей страницы с наибольшим рангом
+(text_ranking.rank_elements по задаче и последним действиям) и
+открывает их в фоновых страницах того же контекста. Если выбранное
+действие - navigate на один из этих адресов или клик по такой ссылке,
+BrowserController подменяет текущую страницу готовой фоновой
+(claim), а загрузка в основной вкладке не выполняется.
+
+Ограничения:
+
+- не больше slots фоновых страниц; ссылки, которые могут что-то
+  изменить на сайте (выход, удаление, корзина и т.п.), не загружаются;
+- суммарная память JS фоновых страниц (performance.memory) не больше
+  memory_mb: при превышении закрываются страницы с наименьшим рангом;
+- на каждом шаге пул сверяется с новыми кандидатами, лишние страницы
+  и страницы старше max_age секунд закрываются; клик не по ссылке или
+  нажатие клавиши (возможна отправка формы) очищают пул целиком.
+
+Статистика: сколько переходов было (opportunities), сколько из них
+пришлось на готовую страницу (hits), сэкономленное время загрузки
+(saved_ms) и сколько страниц загружено впустую (wasted).
+"""
+import asyncio
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urldefrag, urlparse
+
+from text_ranking import build_query, rank_elements
+
+# Ссылки, переход по которым может изменить состояние на сайте
+RISKY_LINK_RE = re.compile(
+    r'logout|log-out|signout|sign-out|выход|выйти|delete|remove|удалить|unsubscribe|отписат'
+    r'|cart|basket|корзин|checkout|оформ|order|заказ|buy|купить|vote|like|download|скачать',
+    re.IGNORECASE)
+# Ресурсы, которые не открываются как страница
+FILE_LINK_RE = re.compile(r'\.(?:pdf|zip|rar|7z|gz|exe|dmg|apk|docx?|xlsx?|pptx?|mp[34]|avi|mov)$',
+                          re.IGNORECASE)
+
+
+def _normalize(url: str) -> str:
+    return urldefrag(url)[0].rstrip('/')
+
+
+def prefetchable(el: Dict, current_url: str) -> bool:
+    """Ссылка, которую безопасно открыть заранее"""
+    href = el.get('href') or ''
+    if el.get('tag') != 'a' or not href.startswith(('http://', 'https://')):
+        return False
+    if _normalize(href) == _normalize(current_url):
+        return False
+    if FILE_LINK_RE.search(urlparse(href).path):
+        return False
+    return not RISKY_LINK_RE.search(' '.join((href, el.get('text') or '', el.get('label') or '')))
+
+
+def _close_created(creating: asyncio.Future):
+    if not creating.cancelled() and creating.exception() is None:
+        asyncio.ensure_future(creating.result().close())
+
+
+class _Entry:
+    def __init__(self, url: str, rank: int):
+        self.url = url
+        self.rank = rank
+        self.page = None
+        self.task: Optional[asyncio.Task] = None
+        self.started = time.monotonic()
+        self.load_ms: Optional[float] = None
+        self.memory = 0
+
+
+class Prefetcher:
+    def __init__(self, context, attach: Callable[[Any], Awaitable[None]], slots: int = 2,
+                 memory_mb: float = 256, max_age: float = 60, wait_until: str = 'domcontentloaded'):
+        self.context = context
+        # Подготовка фоновой страницы: трекер DOM, перехват запросов
+        self.attach = attach
+        self.slots = slots
+        self.memory_limit = memory_mb * 1024 * 1024
+        self.max_age = max_age
+        self.wait_until = wait_until
+        self.entries: Dict[str, _Entry] = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.opportunities = 0
+        self.hits = 0
+        self.saved_ms = 0.0
+        self.started = 0
+        self.wasted = 0
+        self.evicted = 0
+
+    def candidates(self, task: str, history: List[Dict], page_state: Dict) -> List[str]:
+        """Адреса ссылок текущей страницы с наибольшим рангом"""
+        current = page_state.get('url', '')
+        links = [el for el in page_state.get('interactive_elements', []) if prefetchable(el, current)]
+        if not links:
+            return []
+        top = page_state.get('scroll', {}).get('y', 0)
+        viewport = page_state.get('page_size', {}).get('viewport') or 1080
+        urls: List[str] = []
+        for el in rank_elements(links, build_query(task, history), len(links), view=(top, top + viewport)):
+            url = _normalize(el['href'])
+            if url not in urls:
+                urls.append(url)
+            if len(urls) >= self.slots:
+                break
+        return urls
+
+    async def prefetch(self, task: str, history: List[Dict], page_state: Dict):
+        """Сверка пула с кандидатами текущей страницы; загрузка идет в фоне"""
+        urls = self.candidates(task, history, page_state)
+        now = time.monotonic()
+        for url in [url for url, entry in self.entries.items()
+                    if url not in urls or now - entry.started > self.max_age]:
+            await self._discard(self.entries.pop(url))
+        for rank, url in enumerate(urls):
+            entry = self.entries.get(url)
+            if entry is not None:
+                entry.rank = rank
+                continue
+            entry = _Entry(url, rank)
+            self.entries[url] = entry
+            entry.task = asyncio.create_task(self._load(entry))
+            self.started += 1
+
+    async def _load(self, entry: _Entry):
+        try:
+            entry.page = await self._new_page()
+            await self.attach(entry.page)
+            await entry.page.goto(entry.url, wait_until=self.wait_until)
+            entry.load_ms = (time.monotonic() - entry.started) * 1000
+            entry.memory = await self._memory(entry.page)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Упреждающая загрузка {entry.url} не удалась: {e}")
+            if self.entries.get(entry.url) is entry:
+                del self.entries[entry.url]
+            await self._close(entry)
+            return
+        await self._enforce_memory()
+
+    async def _new_page(self):
+        """Новая страница контекста; при отмене созданная страница закрывается"""
+        creating = asyncio.ensure_future(self.context.new_page())
+        try:
+            return await asyncio.shield(creating)
+        except asyncio.CancelledError:
+            creating.add_done_callback(_close_created)
+            raise
+
+    @staticmethod
+    async def _memory(page) -> int:
+        try:
+            return int(await page.evaluate(
+                "() => (performance.memory && performance.memory.usedJSHeapSize) || 0"))
+        except Exception:
+            return 0
+
+    async def _enforce_memory(self):
+        """Закрытие страниц с наименьшим рангом, пока пул не уложится в лимит"""
+        loaded = sorted((e for e in self.entries.values() if e.load_ms is not None), key=lambda e: -e.rank)
+        total = sum(e.memory for e in loaded)
+        for entry in loaded:
+            if total <= self.memory_limit:
+                break
+            total -= entry.memory
+            del self.entries[entry.url]
+            self.evicted += 1
+            await self._discard(entry)
+
+    def match(self, action: Dict, element: Optional[Dict]) -> Optional[str]:
+        """Адрес, на который ведет действие, если оно - переход"""
+        action_type = action.get('type')
+        if action_type == 'navigate':
+            return _normalize(action.get('details', {}).get('url') or '') or None
+        if action_type == 'click' and element and element.get('tag') == 'a' and element.get('href'):
+            return _normalize(element['href'])
+        return None
+
+    async def claim(self, url: str):
+        """(страница, сэкономленные мс) для url или None; страница уходит из пула"""
+        self.opportunities += 1
+        entry = self.entries.pop(url, None)
+        if entry is None:
+            return None
+        if entry.load_ms is None:
+            # Загрузка еще идет: она началась раньше, чем начался бы переход
+            saved = (time.monotonic() - entry.started) * 1000
+            try:
+                await entry.task
+            except Exception:
+                pass
+            if entry.load_ms is None or entry.page is None:
+                return None
+        else:
+            saved = entry.load_ms
+        self.hits += 1
+        self.saved_ms += saved
+        return entry.page, saved
+
+    async def _discard(self, entry: _Entry):
+        if entry.load_ms is not None:
+            self.wasted += 1
+        # Из _enforce_memory страница может закрываться своей же задачей загрузки
+        if entry.task is not None and not entry.task.done() and entry.task is not asyncio.current_task():
+            entry.task.cancel()
+            await asyncio.gather(entry.task, return_exceptions=True)
+        await self._close(entry)
+
+    @staticmethod
+    async def _close(entry: _Entry):
+        if entry.page is not None:
+            try:
+                await entry.page.close()
+            except Exception:
+                pass
+            entry.page = None
+
+    async def clear(self):
+        """Закрытие всех фоновых страниц: их содержимое могло устареть"""
+        entries = list(self.entries.values())
+        self.entries.clear()
+        for entry in entries:
+            await self._discard(entry)
+
+    async def close(self):
+        await self.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'opportunities': self.opportunities,
+            'hits': self.hits,
+            'hit_rate': round(self.hits / self.opportunities, 3) if self.opportunities else 0.0,
+            'saved_ms': round(self.saved_ms, 1),
+            'started': self.started,
+            'wasted': self.wasted,
+            'evicted': self.evicted,
+            'pool': len(self.entries),
+        }
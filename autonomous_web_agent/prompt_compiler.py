@@ -0,0 +1,299 @@
+"""Сборка промпта планировщика в пределах бюджета токенов.
+
+Промпт шага состоит из секций: задача, история, текст страницы,
+элементы, структура и знания о сайте (site_knowledge.py). Задача, подсказка агента и адрес страницы входят
+всегда, остальной бюджет делится между секциями по долям SECTION_SHARES.
+Секция, которой нужно меньше своей доли, отдает остаток остальным.
+Внутри секции строки идут по важности (последние действия, релевантные
+блоки текста, элементы с наибольшим рангом) и добавляются, пока хватает
+ее бюджета.
+
+Кодировка компактная: элементы - "[12] input "текст" ph:"Поиск" t:search",
+действия - тип и детали в JSON без пробелов. Неизменная часть промпта
+(system_prompt) в секции не входит: ее один раз кладет в кэш контекста
+провайдера PrefixCache, а если кэш недоступен - она уходит в
+system_instruction.
+
+Токены оцениваются без токенизатора: латиница ~4 символа на токен,
+кириллица и прочее ~3 (ASCII_CHARS_PER_TOKEN, OTHER_CHARS_PER_TOKEN).
+"""
+import asyncio
+import hashlib
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+from site_knowledge import locator_for
+from text_ranking import build_query, format_blocks, rank_elements, select_blocks
+
+ASCII_CHARS_PER_TOKEN = 4.0
+OTHER_CHARS_PER_TOKEN = 3.0
+
+SECTION_SHARES = {
+    'history': 0.15,
+    'text': 0.40,
+    'elements': 0.35,
+    'structure': 0.07,
+    'knowledge': 0.08,
+}
+
+# Минимальный размер явного кэша контекста у моделей Gemini (токены)
+MIN_CACHE_TOKENS = 4096
+
+HISTORY_STEPS = 5
+MAX_FIELD_CHARS = 60
+MAX_STRUCTURE_CHARS = 80
+
+# Пояснение к компактной кодировке - часть неизменного префикса
+ENCODING_LEGEND = """
+Формат состояния страницы:
+- элементы: [номер] тег "текст" ph:"placeholder" t:type r:role al:"подпись";
+  номер передавай как {"element": номер}
+- текст: блоки с пометкой [экран N], "виден" - блок на текущем экране
+- история: тип действия и его детали, последние внизу
+- сайт: назначение, действие и селектор элементов, которые уже срабатывали
+  на этом сайте (успехов/ошибок); [номер] - элемент есть на странице"""
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    ascii_chars = sum(1 for ch in text if ch < '\x80')
+    other = len(text) - ascii_chars
+    return int(ascii_chars / ASCII_CHARS_PER_TOKEN + other / OTHER_CHARS_PER_TOKEN) + 1
+
+
+def _quote(value: str, limit: int = MAX_FIELD_CHARS) -> str:
+    value = ' '.join(value.split())
+    if len(value) > limit:
+        value = value[:limit - 1] + '…'
+    return '"' + value.replace('"', "'") + '"'
+
+
+def encode_element(el: Dict) -> str:
+    parts = [f"[{el.get('handle', '?')}]", el.get('tag', '')]
+    if el.get('text'):
+        parts.append(_quote(el['text']))
+    if el.get('placeholder'):
+        parts.append('ph:' + _quote(el['placeholder']))
+    if el.get('type') and el.get('type') != el.get('tag'):
+        parts.append('t:' + el['type'])
+    if el.get('role'):
+        parts.append('r:' + el['role'])
+    if el.get('label') and el.get('label') != el.get('text'):
+        parts.append('al:' + _quote(el['label']))
+    return ' '.join(parts)
+
+
+def encode_action(action: Dict) -> str:
+    details = json.dumps(action.get('details', {}), ensure_ascii=False, separators=(',', ':'))
+    return f"{action.get('type', 'unknown')} {details}"
+
+
+def encode_knowledge(entry: Dict, elements: List[Dict]) -> str:
+    handle = next((el.get('handle') for el in elements if locator_for(el) == entry['locator']), None)
+    line = f"{entry['intent']}: {entry['action']} {entry['locator']}"
+    if handle is not None:
+        line += f" [{handle}]"
+    return line + f" ({entry['successes']:g}/{entry['failures']:g})"
+
+
+def take_lines(lines: List[str], budget: int) -> List[str]:
+    """Строки (по порядку важности), которые помещаются в бюджет токенов"""
+    taken, used = [], 0
+    for line in lines:
+        cost = estimate_tokens(line)
+        if used + cost <= budget:
+            taken.append(line)
+            used += cost
+    return taken
+
+
+def allocate(budget: int, demands: Dict[str, int], shares: Dict[str, float] = SECTION_SHARES) -> Dict[str, int]:
+    """Бюджет по секциям: доля каждой, неиспользованное - остальным пропорционально"""
+    allocation = {name: 0 for name in demands}
+    open_sections = {name for name, demand in demands.items() if demand > 0}
+    left = budget
+    while open_sections and left > 0:
+        total_share = sum(shares.get(name, 0.1) for name in open_sections)
+        satisfied = set()
+        granted = 0
+        for name in open_sections:
+            part = int(left * shares.get(name, 0.1) / total_share)
+            need = demands[name] - allocation[name]
+            if need <= part:
+                allocation[name] += need
+                granted += need
+                satisfied.add(name)
+        if not satisfied:
+            for name in open_sections:
+                allocation[name] += int(left * shares.get(name, 0.1) / total_share)
+            break
+        open_sections -= satisfied
+        left -= granted
+    return allocation
+
+
+class PromptCompiler:
+    def __init__(self, budget: int, max_elements: int = 20, viewport_height: int = 1080):
+        self.budget = budget
+        self.max_elements = max_elements
+        self.viewport_height = viewport_height
+
+    def compile(self, task: str, history: List[Dict], page_state: Dict,
+                hint: Optional[str] = None, sent_fingerprint: Optional[str] = None) -> Tuple[str, Dict]:
+        """Текст промпта шага и отчет: оценка токенов всего и по секциям.
+
+        sent_fingerprint - отпечаток страницы из последнего отправленного
+        модели промпта. Модель не помнит прошлых запросов, поэтому текст
+        страницы уходит всегда; если страница с тех пор не изменилась, он
+        только сокращается до половины и помечается.
+        """
+        repeated = bool(page_state.get('unchanged') and page_state.get('fingerprint')
+                        and page_state.get('fingerprint') == sent_fingerprint)
+        recent = history[-HISTORY_STEPS:]
+        query = build_query(task, recent)
+        fixed = (f"ЗАДАЧА: {task}\n"
+                 f"СТРАНИЦА: {page_state.get('url', 'Unknown')} | {page_state.get('title', '')}")
+
+        candidates = {
+            'history': [encode_action(action) for action in reversed(recent)],
+            'elements': [encode_element(el) for el in self._elements(page_state, query)],
+            'structure': self._structure(page_state),
+            'knowledge': [encode_knowledge(entry, page_state.get('interactive_elements', []))
+                          for entry in page_state.get('site_knowledge') or []],
+        }
+        demands = {name: sum(estimate_tokens(line) for line in lines) for name, lines in candidates.items()}
+        demands['text'] = self._text_demand(page_state, repeated)
+        allocation = allocate(max(self.budget - estimate_tokens(fixed), 0), demands)
+
+        sections = {}
+        history_lines = take_lines(candidates['history'], allocation['history'])
+        sections['history'] = '\n'.join(reversed(history_lines)) or "нет"
+        sections['text'] = self._text(page_state, query, allocation['text'], repeated)
+        sections['elements'] = '\n'.join(take_lines(candidates['elements'], allocation['elements'])) or "нет"
+        sections['structure'] = '\n'.join(take_lines(candidates['structure'], allocation['structure'])) or "нет"
+        knowledge = take_lines(candidates['knowledge'], allocation['knowledge'])
+
+        prompt = (f"{fixed}\n\n"
+                  f"ИСТОРИЯ:\n{sections['history']}\n\n"
+                  f"ТЕКСТ:\n{sections['text']}\n\n"
+                  f"ЭЛЕМЕНТЫ:\n{sections['elements']}\n\n"
+                  f"СТРУКТУРА:\n{sections['structure']}\n\n")
+        if knowledge:
+            sections['knowledge'] = '\n'.join(knowledge)
+            prompt += f"САЙТ:\n{sections['knowledge']}\n\n"
+        prompt += "Следующее действие - JSON."
+        if hint:
+            prompt += f"\nВАЖНО: {hint}"
+        report = {
+            'tokens': estimate_tokens(prompt),
+            'budget': self.budget,
+            'sections': {name: estimate_tokens(text) for name, text in sections.items()},
+        }
+        return prompt, report
+
+    def _view(self, page_state: Dict) -> Tuple[int, int, int]:
+        scroll_y = page_state.get('scroll', {}).get('y', 0)
+        viewport = page_state.get('page_size', {}).get('viewport') or self.viewport_height
+        return scroll_y, scroll_y + viewport, viewport
+
+    def _elements(self, page_state: Dict, query: Dict[str, float]) -> List[Dict]:
+        top, bottom, _ = self._view(page_state)
+        return rank_elements(page_state.get('interactive_elements', []), query,
+                             self.max_elements, view=(top, bottom))
+
+    @staticmethod
+    def _structure(page_state: Dict) -> List[str]:
+        structure = page_state.get('page_structure') or []
+        if isinstance(structure, str):
+            try:
+                structure = json.loads(structure)
+            except ValueError:
+                return []
+        lines, previous = [], None
+        for item in structure:
+            text = ' '.join(str(item.get('text', '')).split())[:MAX_STRUCTURE_CHARS]
+            line = f"{item.get('tag', '')} {text}".strip()
+            if line != previous:
+                lines.append(line)
+            previous = line
+        return lines
+
+    @staticmethod
+    def _text_demand(page_state: Dict, repeated: bool = False) -> int:
+        demand = estimate_tokens(page_state.get('visible_text', ''))
+        # Текст, который модель уже видела, - вполовину короче
+        return demand // 2 + 20 if repeated else demand
+
+    def _text(self, page_state: Dict, query: Dict[str, float], budget: int, repeated: bool = False) -> str:
+        note = "(страница не изменилась после последнего действия)\n" if repeated else ""
+        # Бюджет в символах по кириллице; десятая часть - на пометки экранов
+        chars = int(budget * OTHER_CHARS_PER_TOKEN) - len(note)
+        blocks = page_state.get('text_blocks')
+        if not blocks:
+            return note + (page_state.get('visible_text', '')[:chars] or "нет")
+        top, bottom, viewport = self._view(page_state)
+        selected = select_blocks(blocks, query, chars * 9 // 10, view=(top, bottom))
+        return note + format_blocks(selected, viewport, top, page_state.get('page_size', {}).get('height'))
+
+
+class PrefixCache:
+    """Неизменный префикс промпта в кэше контекста провайдера.
+
+    Кэш создается один раз на модель и текст префикса через
+    client.aio.caches.create и пересоздается, когда истекает ttl; прежний
+    кэш при этом удаляется. Одновременные шаги (TaskScheduler) ждут одно
+    создание. Префикс короче MIN_CACHE_TOKENS провайдер не кэширует - он
+    сразу уходит как system_instruction. Если провайдер отказал, повторных
+    попыток для этого префикса нет.
+    """
+
+    def __init__(self, ttl: int = 3600, min_tokens: int = MIN_CACHE_TOKENS):
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self._entries: Dict[str, Tuple[str, float]] = {}
+        self._creating: Dict[str, asyncio.Future] = {}
+        self._failed = set()
+        self.created = 0
+        self.failures = 0
+
+    async def name(self, client, model: str, text: str) -> Optional[str]:
+        key = hashlib.sha1(f"{model}\n{text}".encode('utf-8')).hexdigest()
+        if key in self._failed:
+            return None
+        if estimate_tokens(text) < self.min_tokens:
+            self._failed.add(key)
+            return None
+        entry = self._entries.get(key)
+        # Пересоздаем заранее, чтобы кэш не истек посреди запроса
+        if entry and entry[1] - time.monotonic() > 60:
+            return entry[0]
+        creating = self._creating.get(key)
+        if creating is None:
+            creating = asyncio.ensure_future(self._create(client, model, text, key))
+            self._creating[key] = creating
+            creating.add_done_callback(lambda _: self._creating.pop(key, None))
+        return await asyncio.shield(creating)
+
+    async def _create(self, client, model: str, text: str, key: str) -> Optional[str]:
+        try:
+            cache = await client.aio.caches.create(
+                model=model,
+                config={'system_instruction': text, 'ttl': f'{self.ttl}s',
+                        'display_name': f'awa-prefix-{key[:8]}'},
+            )
+        except Exception as e:
+            print(f"Кэш контекста недоступен, префикс уйдет в каждом запросе: {e}")
+            self._failed.add(key)
+            self.failures += 1
+            return None
+        previous = self._entries.get(key)
+        self._entries[key] = (cache.name, time.monotonic() + self.ttl)
+        self.created += 1
+        if previous is not None:
+            try:
+                await client.aio.caches.delete(name=previous[0])
+            except Exception as e:
+                print(f"Не удалось удалить прежний кэш контекста: {e}")
+        return cache.name
@@ -0,0 +1,137 @@
+"""Ожидание готовности страницы после действия вместо фиксированных пауз.
+
+Страница считается готовой, когда одновременно:
+- документ не в состоянии 'loading';
+- нет незавершенных запросов (кроме долгих, см. long_request_ms);
+- DOM не менялся quiet_ms (время последней мутации берется из трекера
+  snapshot.TRACKER_SCRIPT);
+- высота документа не менялась quiet_ms (раскладка устоялась).
+
+Ожидание ограничено сверху бюджетом для каждого типа действия: если
+страница так и не успокоилась, агент продолжает работу по таймауту.
+"""
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+from config import Config
+
+# Верхняя граница ожидания, секунды
+ACTION_BUDGETS = {
+    'navigate': 10.0,
+    'click': 5.0,
+    'press': 3.0,
+    'type': 1.0,
+    'scroll': 1.0,
+}
+DEFAULT_BUDGET = 2.0
+
+# Режимы ожидания: wait_until для goto и порог "долгих" запросов, мс
+WAIT_MODES = {
+    'adaptive': {'wait_until': 'domcontentloaded', 'long_request_ms': 5000},
+    'longpoll': {'wait_until': 'domcontentloaded', 'long_request_ms': 500},
+    'networkidle': {'wait_until': 'networkidle', 'long_request_ms': 5000},
+}
+
+READY_PROBE_SCRIPT = """
+() => {
+    const t = window.__awaTracker;
+    return {
+        readyState: document.readyState,
+        quietFor: t ? performance.now() - t.lastMutationAt : null,
+        height: document.documentElement ? document.documentElement.scrollHeight : 0
+    };
+}
+"""
+
+
+class PageActivity:
+    """Незавершенные запросы и навигации страницы по событиям Playwright"""
+
+    def __init__(self):
+        self.inflight: Dict[Any, float] = {}
+        self.last_navigation = 0.0
+
+    def attach(self, page):
+        page.on('request', self._on_request)
+        page.on('requestfinished', self._on_done)
+        page.on('requestfailed', self._on_done)
+        page.on('framenavigated', self._on_navigated)
+
+    def detach(self, page):
+        page.remove_listener('request', self._on_request)
+        page.remove_listener('requestfinished', self._on_done)
+        page.remove_listener('requestfailed', self._on_done)
+        page.remove_listener('framenavigated', self._on_navigated)
+        self.inflight.clear()
+
+    def pending(self, long_request_ms: float) -> int:
+        """Число запросов в полете, не считая долгих (long-polling, стримы)"""
+        now = time.monotonic()
+        limit = long_request_ms / 1000
+        return sum(1 for started in self.inflight.values() if now - started < limit)
+
+    def _on_request(self, request):
+        self.inflight[request] = time.monotonic()
+
+    def _on_done(self, request):
+        self.inflight.pop(request, None)
+
+    def _on_navigated(self, frame):
+        if frame.parent_frame is None:
+            self.last_navigation = time.monotonic()
+
+
+class ReadinessWaiter:
+    def __init__(self,
+                 activity: PageActivity,
+                 mode: str = Config.WAIT_MODE,
+                 quiet_ms: float = Config.READY_QUIET_MS,
+                 poll_interval: float = 0.05):
+        self.activity = activity
+        self.mode = WAIT_MODES.get(mode, WAIT_MODES['adaptive'])
+        self.quiet_ms = quiet_ms
+        self.poll_interval = poll_interval
+
+    @property
+    def wait_until(self) -> str:
+        return self.mode['wait_until']
+
+    async def wait(self, page, action_type: str, budget: Optional[float] = None) -> Dict[str, Any]:
+        """Ожидание готовности; возвращает затраченное время и причину выхода"""
+        budget = budget if budget is not None else ACTION_BUDGETS.get(action_type, DEFAULT_BUDGET)
+        started = time.monotonic()
+        last_height = None
+        height_stable_since = started
+        timed_out = False
+
+        while True:
+            now = time.monotonic()
+            try:
+                probe = await page.evaluate(READY_PROBE_SCRIPT)
+            except Exception:
+                # Контекст страницы уничтожен навигацией - ждем новый документ
+                probe = None
+
+            if probe is not None:
+                if probe['height'] != last_height:
+                    last_height = probe['height']
+                    height_stable_since = now
+                quiet_for = probe['quietFor']
+                since_navigation = (now - self.activity.last_navigation) * 1000
+                if (probe['readyState'] != 'loading'
+                        and self.activity.pending(self.mode['long_request_ms']) == 0
+                        and (quiet_for is None or quiet_for >= self.quiet_ms)
+                        and (now - height_stable_since) * 1000 >= self.quiet_ms
+                        and since_navigation >= self.quiet_ms):
+                    break
+
+            if now - started >= budget:
+                timed_out = True
+                break
+            await asyncio.sleep(self.poll_interval)
+
+        return {
+            'wait_ms': round((time.monotonic() - started) * 1000, 1),
+            'timed_out': timed_out,
+        }
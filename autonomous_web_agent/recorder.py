@@ -0,0 +1,125 @@
+"""Запись трассы выполнения задачи и воспроизведение без планировщика.
+
+TraceRecorder подписывается на события шагов агента и дописывает их в
+JSONL-файл по одной строке на событие:
+
+    {"event": "task", "task": ..., "start_url": ...}
+    {"event": "action", "step": 1, "url": ..., "fingerprint": ..., "structure": ...,
+     "plan": {...}, "action": {...}, "result": {...}, "timings": {...}}
+    {"event": "complete", ...}
+    {"event": "end", "success": true, ...}
+
+TraceReplayer повторяет действия трассы через execute_action. Перед
+каждым запланированным шагом он сверяет структурный отпечаток страницы с
+записанным. При первом расхождении воспроизведение останавливается, и
+задача продолжается обычным планированием.
+"""
+import json
+import time
+from typing import Any, Dict, List
+
+from actions import check_precondition
+from snapshot import structural_fingerprint
+
+
+class TraceRecorder:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def __call__(self, event: Dict):
+        record = dict(event, ts=round(time.time(), 3))
+        self._file.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+        # Трасса должна пережить падение процесса - сбрасываем каждую строку
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+def load_trace(path: str) -> List[Dict[str, Any]]:
+    """События трассы; для нескольких задач в одном файле - последняя"""
+    events = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            event = json.loads(line)
+            if event.get('event') == 'task':
+                events = []
+            events.append(event)
+    return events
+
+
+class TraceReplayer:
+    def __init__(self, agent, path: str):
+        self.agent = agent
+        self.events = load_trace(path)
+
+    @property
+    def task(self) -> str:
+        header = self.events[0] if self.events else {}
+        return header.get('task', '')
+
+    async def replay(self) -> Dict[str, Any]:
+        """Воспроизведение трассы; при расхождении - живое планирование"""
+        if not self.events or self.events[0].get('event') != 'task':
+            raise ValueError("Трасса пуста или не содержит заголовка задачи")
+
+        browser = self.agent.browser
+        memory = self.agent.memory
+        memory.set_task(self.task)
+        print(f"\nВоспроизведение трассы: {self.task}")
+
+        start_url = self.events[0].get('start_url')
+        if start_url and start_url != 'about:blank' and browser.page.url != start_url:
+            await browser.execute_action({'type': 'navigate', 'details': {'url': start_url}})
+
+        replayed = 0
+        planned_state: Dict = {}
+        divergence = None
+        for event in self.events[1:]:
+            kind = event.get('event')
+            if kind not in ('action', 'complete'):
+                continue
+
+            if not event.get('batch_index'):
+                planned_state = await browser.get_page_state()
+                if structural_fingerprint(planned_state) != event.get('structure'):
+                    divergence = f"шаг {event.get('step')}: страница отличается от записанной"
+                    break
+            else:
+                reason = await check_precondition(browser.page, event.get('precondition'), planned_state)
+                if reason:
+                    divergence = f"шаг {event.get('step')}: {reason}"
+                    break
+
+            action = event['action']
+            if kind == 'complete':
+                result = action.get('details', {}).get('result', 'Задача выполнена')
+                print(f"Трасса воспроизведена полностью ({replayed} действий)")
+                return {
+                    'success': True,
+                    'result': result,
+                    'steps': event.get('step', 0),
+                    'replayed_actions': replayed,
+                    'planner_calls': 0,
+                    'history': memory.history
+                }
+
+            result = await browser.execute_action(action)
+            memory.add_action(action, result)
+            if not result.get('success'):
+                divergence = f"шаг {event.get('step')}: {result.get('error', 'ошибка действия')}"
+                break
+            replayed += 1
+            print(f"Повторено: {action.get('type')} {action.get('details', {})}")
+
+        print(f"Расхождение с трассой ({divergence or 'трасса закончилась'}), "
+              f"продолжаю с планировщиком")
+        result = await self.agent.run_task(self.task)
+        if result is not None:
+            result['replayed_actions'] = replayed
+        return result
@@ -0,0 +1,353 @@
+"""Дисковый кэш HTTP-ответов на уровне перехвата запросов браузера.
+
+Агенты раз за разом открывают одни и те же сайты и статику, в том числе
+между задачами и после перезапуска. Кэш стоит в цепочке page.route после
+профиля сети (network.py): заблокированные запросы до него не доходят.
+
+Кэшируются только GET-ответы со статусом 200. Срок жизни берется из
+Cache-Control (max-age за вычетом Age) или Expires; no-store, no-cache и
+Vary: * не кэшируются. Для доменов из domain_ttls срок задается
+принудительно, без учета заголовков срока. Тела лежат в отдельных файлах,
+индекс - в SQLite. При превышении max_bytes вытесняются записи, к которым
+дольше всего не обращались.
+
+Кэш общий для всех контекстов и задач процесса, поэтому персональные
+ответы в него не попадают (и не отдаются из него) даже с TTL домена:
+ответы с Cache-Control: private и Set-Cookie, запросы с Authorization, а
+запросы с Cookie - кроме статики (скрипты, стили, картинки, шрифты).
+Заголовки запроса из Vary ответа входят в ключ.
+
+Чтение и запись индекса и файлов идут в asyncio.to_thread, а не в цикле
+событий; время последнего обращения копится в памяти и пишется пачкой.
+
+Для полностью офлайн-прогонов используется HAR-архив (см. attach_har):
+в режиме replay запросы, которых нет в архиве, отклоняются. Ответы из
+HAR обслуживает сам Playwright, в статистику кэша они не попадают.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+from config import Config
+
+# Больше этого размера ответ не кэшируем (видео, архивы)
+MAX_ENTRY_BYTES = 5 * 1024 * 1024
+# Заголовки, которые нельзя отдавать вместе с уже распакованным телом
+DROP_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')
+# Статика: ее можно брать из общего кэша и для запросов с Cookie
+STATIC_TYPES = frozenset({'script', 'stylesheet', 'image', 'font', 'media'})
+# Сколько обращений копить перед записью last_used в индекс
+TOUCH_BATCH = 64
+
+
+def parse_domain_ttls(value: Optional[str]) -> Dict[str, float]:
+    """'example.com=3600,cdn.example.net=86400' -> {домен: секунды}"""
+    ttls = {}
+    for item in (value or '').split(','):
+        domain, _, ttl = item.partition('=')
+        if domain.strip() and ttl.strip():
+            ttls[domain.strip().lower()] = float(ttl)
+    return ttls
+
+
+def cache_control(headers: Dict[str, str]) -> Dict[str, Optional[str]]:
+    directives = {}
+    for part in headers.get('cache-control', '').split(','):
+        name, _, value = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = value.strip('"') or None
+    return directives
+
+
+def shareable(headers: Dict[str, str]) -> bool:
+    """Ответ можно отдавать другим контекстам и задачам"""
+    directives = cache_control(headers)
+    return 'private' not in directives and 'no-store' not in directives and 'set-cookie' not in headers
+
+
+def vary_names(headers: Dict[str, str]) -> List[str]:
+    return sorted({name.strip().lower() for name in headers.get('vary', '').split(',') if name.strip()})
+
+
+def freshness(headers: Dict[str, str], now: float) -> Optional[float]:
+    """Срок жизни ответа по заголовкам, секунды; None - не кэшировать"""
+    directives = cache_control(headers)
+    if 'no-store' in directives or 'no-cache' in directives:
+        return None
+    if headers.get('vary', '').strip() == '*':
+        return None
+    if directives.get('max-age'):
+        try:
+            age = float(headers.get('age', 0) or 0)
+            return float(directives['max-age']) - age
+        except ValueError:
+            return None
+    if headers.get('expires'):
+        try:
+            expires = parsedate_to_datetime(headers['expires']).timestamp()
+            date = parsedate_to_datetime(headers['date']).timestamp() if headers.get('date') else now
+        except (TypeError, ValueError):
+            # Expires: 0 и прочие некорректные даты означают "уже устарел"
+            return None
+        return expires - date
+    return None
+
+
+class ResponseCache:
+    """Хранилище ответов: индекс в SQLite, тела в файлах"""
+
+    def __init__(self, directory: str, max_bytes: int, domain_ttls: Optional[Dict[str, float]] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.domain_ttls = domain_ttls or {}
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+        # Индекс читается и пишется из потоков asyncio.to_thread
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = {}
+        self._db = sqlite3.connect(os.path.join(directory, 'index.sqlite'), check_same_thread=False,
+                                   timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, url TEXT NOT NULL, status INTEGER NOT NULL, "
+            "headers TEXT NOT NULL, size INTEGER NOT NULL, expires_at REAL NOT NULL, "
+            "last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_used)")
+        # Какие заголовки запроса (Vary) входят в ключ для данного адреса
+        self._db.execute("CREATE TABLE IF NOT EXISTS variants (base TEXT PRIMARY KEY, vary TEXT NOT NULL)")
+        self._db.commit()
+        self.total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self.variants: Dict[str, List[str]] = {
+            base: json.loads(vary) for base, vary in self._db.execute("SELECT base, vary FROM variants")}
+
+    @staticmethod
+    def make_key(method: str, url: str, vary: Optional[Dict[str, str]] = None) -> str:
+        raw = f"{method} {url}"
+        for name in sorted(vary or {}):
+            raw += f"\n{name}: {vary[name]}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def request_key(self, method: str, url: str, request_headers: Dict[str, str],
+                    vary: Optional[List[str]] = None) -> str:
+        """Ключ с заголовками запроса из Vary (сохраненного для адреса или ответа)"""
+        if vary is None:
+            vary = self.variants.get(self.make_key(method, url), [])
+        return self.make_key(method, url, {name: request_headers.get(name, '') for name in vary})
+
+    def domain_ttl(self, url: str) -> Optional[float]:
+        host = urlsplit(url).hostname or ''
+        while host:
+            if host in self.domain_ttls:
+                return self.domain_ttls[host]
+            _, _, host = host.partition('.')
+        return None
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Блокирующий вызов: из цикла событий - через asyncio.to_thread"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, headers, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            status, headers, expires_at = row
+            now = time.time()
+            if expires_at < now:
+                self._delete(key)
+                self._db.commit()
+                return None
+            try:
+                with open(self._body_path(key), 'rb') as f:
+                    body = f.read()
+            except OSError:
+                self._delete(key)
+                self._db.commit()
+                return None
+            self._touched[key] = now
+            if len(self._touched) >= TOUCH_BATCH:
+                self._flush_touched()
+                self._db.commit()
+        return {'status': status, 'headers': json.loads(headers), 'body': body}
+
+    def put(self, key: str, url: str, status: int, headers: Dict[str, str], body: bytes,
+            base: Optional[str] = None) -> bool:
+        """Сохранение ответа, если заголовки (или TTL домена) это разрешают.
+
+        base - ключ без Vary: для него запоминается список заголовков Vary.
+        Блокирующий вызов, как и get.
+        """
+        if status != 200 or len(body) > MAX_ENTRY_BYTES or not shareable(headers):
+            return False
+        now = time.time()
+        ttl = self.domain_ttl(url)
+        if ttl is None:
+            ttl = freshness(headers, now)
+        if not ttl or ttl <= 0:
+            return False
+
+        vary = vary_names(headers)
+        headers = {k: v for k, v in headers.items() if k.lower() not in DROP_HEADERS}
+        with self._lock:
+            self._delete(key)
+            with open(self._body_path(key), 'wb') as f:
+                f.write(body)
+            self._db.execute(
+                "INSERT INTO responses (key, url, status, headers, size, expires_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, url, status, json.dumps(headers), len(body), now + ttl, now),
+            )
+            if base is not None and self.variants.get(base, []) != vary:
+                self.variants[base] = vary
+                self._db.execute("INSERT OR REPLACE INTO variants (base, vary) VALUES (?, ?)",
+                                 (base, json.dumps(vary)))
+            self.total_bytes += len(body)
+            self._evict()
+            self._db.commit()
+        return True
+
+    def close(self):
+        if self._db is not None:
+            with self._lock:
+                self._flush_touched()
+                self._db.commit()
+                self._db.close()
+                self._db = None
+
+    def _flush_touched(self):
+        if self._touched:
+            self._db.executemany("UPDATE responses SET last_used = ? WHERE key = ?",
+                                 [(used, key) for key, used in self._touched.items()])
+            self._touched.clear()
+
+    def _body_path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def _evict(self):
+        if self.total_bytes > self.max_bytes:
+            # Порядок вытеснения - по свежим last_used
+            self._flush_touched()
+        while self.total_bytes > self.max_bytes:
+            row = self._db.execute(
+                "SELECT key FROM responses ORDER BY last_used LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            self._delete(row[0])
+            self.evictions += 1
+
+    def _delete(self, key: str):
+        row = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return
+        self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+        self._touched.pop(key, None)
+        self.total_bytes -= row[0]
+        try:
+            os.remove(self._body_path(key))
+        except OSError:
+            pass
+
+
+class CacheRoute:
+    """Обработчик page.route поверх общего ResponseCache; статистика - на задачу"""
+
+    def __init__(self, cache: ResponseCache):
+        self.cache = cache
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.bytes_served = 0
+        self.bytes_fetched = 0
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'stores': self.stores,
+            'bytes_served': self.bytes_served,
+            'bytes_fetched': self.bytes_fetched,
+        }
+
+    async def attach(self, page):
+        await page.route('**/*', self._handle)
+
+    async def _handle(self, route):
+        request = route.request
+        if request.method != 'GET':
+            await route.fallback()
+            return
+
+        try:
+            # request.headers не содержит Cookie - нужны все заголовки
+            request_headers = await request.all_headers()
+        except Exception:
+            request_headers = {}
+        if 'authorization' in request_headers or (
+                'cookie' in request_headers and request.resource_type not in STATIC_TYPES):
+            # Ответ может быть персональным - мимо общего кэша
+            await route.fallback()
+            return
+
+        key = self.cache.request_key(request.method, request.url, request_headers)
+        entry = await asyncio.to_thread(self.cache.get, key)
+        if entry is not None:
+            self.hits += 1
+            self.bytes_served += len(entry['body'])
+            await route.fulfill(status=entry['status'], headers=entry['headers'], body=entry['body'])
+            return
+
+        self.misses += 1
+        try:
+            response = await route.fetch()
+            body = await response.body()
+        except Exception:
+            # Сетевая ошибка: пусть браузер сам повторит запрос и покажет ошибку
+            await route.fallback()
+            return
+        self.bytes_fetched += len(body)
+        headers = response.headers
+        vary = vary_names(headers)
+        # Ключ ответа - с заголовками запроса из его Vary
+        key = self.cache.request_key(request.method, request.url, request_headers, vary)
+        base = self.cache.make_key(request.method, request.url)
+        if await asyncio.to_thread(self.cache.put, key, request.url, response.status, headers, body, base):
+            self.stores += 1
+        await route.fulfill(response=response, body=body)
+
+
+async def attach_har(page, path: str, mode: str):
+    """HAR-архив: replay - только из архива, record - дописывать архив из сети"""
+    if mode == 'record':
+        await page.route_from_har(path, update=True)
+    else:
+        await page.route_from_har(path, not_found='abort')
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Общий кэш процесса; None, если кэш ответов выключен"""
+    global _cache
+    if _cache is None and Config.RESPONSE_CACHE:
+        _cache = ResponseCache(
+            Config.RESPONSE_CACHE_DIR,
+            Config.RESPONSE_CACHE_MAX_MB * 1024 * 1024,
+            parse_domain_ttls(Config.RESPONSE_CACHE_TTLS),
+        )
+    return _cache
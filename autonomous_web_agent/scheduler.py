@@ -0,0 +1,324 @@
+"""Параллельное выполнение задач на одном браузере.
+
+Chromium запускается один раз. Каждая задача получает свой изолированный
+контекст из ограниченного пула (свои cookies и localStorage) и выполняется
+обычным циклом AutonomousWebAgent.run_task. Число одновременных задач
+ограничено concurrency, у каждой задачи есть таймаут.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, Optional, Union
+
+from agent import AutonomousWebAgent
+from ai_planner import AIPlanner
+from browser_controller import BrowserController
+from config import Config
+from utils import latency_summary
+from warm_pool import connect_or_launch
+
+
+class FairQueue:
+    """Очередь с обходом групп по кругу.
+
+    Задачи одной группы выполняются по порядку, но группа с сотней задач
+    не задерживает группу с одной задачей.
+    """
+
+    def __init__(self, maxsize: int = 0):
+        self.maxsize = maxsize
+        self._groups: Dict[str, deque] = {}
+        self._order: deque = deque()
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._size = 0
+
+    def qsize(self) -> int:
+        return self._size
+
+    def full(self) -> bool:
+        return self.maxsize > 0 and self._size >= self.maxsize
+
+    def put_nowait(self, item: Any, group: str = 'default'):
+        if self.full():
+            raise asyncio.QueueFull()
+        self._append(item, group)
+
+    async def put(self, item: Any, group: str = 'default'):
+        while self.full():
+            self._space.clear()
+            await self._space.wait()
+        self._append(item, group)
+
+    async def get(self) -> Any:
+        while not self._order:
+            self._ready.clear()
+            await self._ready.wait()
+        group = self._order.popleft()
+        items = self._groups[group]
+        item = items.popleft()
+        if items:
+            self._order.append(group)
+        else:
+            del self._groups[group]
+        self._size -= 1
+        self._space.set()
+        return item
+
+    def _append(self, item: Any, group: str):
+        if group not in self._groups:
+            self._groups[group] = deque()
+            self._order.append(group)
+        self._groups[group].append(item)
+        self._size += 1
+        self._ready.set()
+
+    def remove(self, item: Any, group: str = 'default') -> bool:
+        """Снятие элемента с очереди (например, отмененной задачи)"""
+        items = self._groups.get(group)
+        index = next((i for i, queued in enumerate(items or ()) if queued is item), None)
+        if index is None:
+            return False
+        del items[index]
+        if not items:
+            del self._groups[group]
+            self._order.remove(group)
+        self._size -= 1
+        self._space.set()
+        return True
+
+
+class ContextPool:
+    """Ограниченный пул заранее созданных контекстов браузера.
+
+    Контекст после задачи закрывается, вместо него создается новый, так что
+    задачи не видят cookies и хранилище друг друга. Число задач ограничивает
+    семафор слотов, а не число готовых контекстов: если новый контекст не
+    удалось создать заранее, его создаст следующий acquire.
+    """
+
+    def __init__(self, browser, size: int, **context_options):
+        self.browser = browser
+        self.size = size
+        self.context_options = context_options
+        self._slots = asyncio.Semaphore(size)
+        self._free: deque = deque()
+
+    async def start(self):
+        contexts = await asyncio.gather(*(self._new_context() for _ in range(self.size)))
+        self._free.extend(contexts)
+
+    async def acquire(self):
+        await self._slots.acquire()
+        if self._free:
+            return self._free.popleft()
+        try:
+            return await self._new_context()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def release(self, context):
+        try:
+            await context.close()
+        except Exception as e:
+            print(f"Ошибка закрытия контекста: {e}")
+        try:
+            self._free.append(await self._new_context())
+        except Exception as e:
+            print(f"Не удалось заранее создать контекст: {e}")
+        finally:
+            self._slots.release()
+
+    async def close(self):
+        while self._free:
+            await self._free.popleft().close()
+
+    async def _new_context(self):
+        return await self.browser.new_context(**self.context_options)
+
+
+class TaskScheduler:
+    def __init__(self,
+                 concurrency: int = Config.CONCURRENCY,
+                 task_timeout: float = Config.TASK_TIMEOUT,
+                 headless: bool = True,
+                 planner: Optional[AIPlanner] = None,
+                 max_queue: int = 0):
+        self.concurrency = concurrency
+        self.task_timeout = task_timeout
+        self.headless = headless
+        self.planner = planner
+        self._owns_planner = False
+        self.queue = FairQueue(max_queue)
+        self.playwright = None
+        self.browser = None
+        self.pool: Optional[ContextPool] = None
+        self.workers = []
+        self.latencies = []
+        self.queue_waits = []
+        self.completed = 0
+        self.failed = 0
+        self.running = 0
+        self.started_at = None
+
+    async def start(self):
+        """Запуск браузера, пула контекстов и воркеров"""
+        from playwright.async_api import async_playwright
+        self.playwright = await async_playwright().start()
+        self.browser, _ = await connect_or_launch(self.playwright, self.headless)
+        self.pool = ContextPool(self.browser, self.concurrency, viewport=Config.VIEWPORT)
+        await self.pool.start()
+        # Один планировщик на все задачи: состояние задачи между шагами
+        # (эскалация, отпечаток отправленной страницы) хранит агент (PlannerSession)
+        self._owns_planner = self.planner is None
+        self.planner = self.planner or AIPlanner()
+        self.started_at = time.perf_counter()
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def close(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        if self._owns_planner:
+            self.planner.close()
+        if self.pool:
+            await self.pool.close()
+        if self.browser:
+            await self.browser.close()
+        if self.playwright:
+            await self.playwright.stop()
+
+    def submit(self, task: Union[str, Dict], group: str = 'default',
+               listener: Optional[Callable[[Dict], None]] = None):
+        """Постановка задачи в очередь; возвращает Future с результатом.
+
+        Если очередь ограничена и заполнена, выбрасывает asyncio.QueueFull.
+        listener получает события шагов агента (см. add_step_listener).
+        Отмена Future снимает задачу с очереди или прерывает ее выполнение.
+        """
+        job = self._make_job(task, listener, group)
+        self.queue.put_nowait(job, group)
+        return job['future']
+
+    async def submit_wait(self, task: Union[str, Dict], group: str = 'default',
+                          listener: Optional[Callable[[Dict], None]] = None):
+        """Постановка задачи с ожиданием свободного места в очереди"""
+        job = self._make_job(task, listener, group)
+        await self.queue.put(job, group)
+        return job['future']
+
+    async def run(self, tasks: Iterable[Union[str, Dict]]) -> Dict[str, Any]:
+        """Выполнение набора задач; task может быть строкой или {'task', 'group'}"""
+        futures = []
+        for task in tasks:
+            group = task.get('group', 'default') if isinstance(task, dict) else 'default'
+            futures.append(await self.submit_wait(task, group))
+        results = await asyncio.gather(*futures)
+        return {'results': results, 'stats': self.stats()}
+
+    def stats(self) -> Dict[str, Any]:
+        """Пропускная способность и перцентили задержки задач"""
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        finished = self.completed + self.failed
+        return {
+            'completed': self.completed,
+            'failed': self.failed,
+            'running': self.running,
+            'queued': self.queue.qsize(),
+            'elapsed_seconds': round(elapsed, 2),
+            'tasks_per_minute': round(finished / elapsed * 60, 2) if elapsed else 0.0,
+            'latency_seconds': latency_summary(self.latencies),
+            'queue_wait_seconds': latency_summary(self.queue_waits),
+        }
+
+    def _make_job(self, task: Union[str, Dict], listener=None, group: str = 'default') -> Dict[str, Any]:
+        if isinstance(task, str):
+            task = {'task': task}
+        job = {
+            'spec': task,
+            'listener': listener,
+            'future': asyncio.get_running_loop().create_future(),
+            'submitted_at': time.perf_counter(),
+        }
+        # Отмененная в очереди задача сразу освобождает место в ней
+        job['future'].add_done_callback(
+            lambda future: self.queue.remove(job, group) if future.cancelled() else None)
+        return job
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            if job['future'].cancelled():
+                continue
+            self.queue_waits.append(time.perf_counter() - job['submitted_at'])
+            self.running += 1
+            try:
+                result = await self._execute(job)
+            except Exception as e:
+                # Сбой вне задачи: воркер продолжает работу, а получатели
+                # результата, как и при ошибке задачи, получают словарь
+                print(f"Ошибка выполнения задачи: {e}")
+                self.failed += 1
+                result = {'success': False, 'error': str(e), 'task': job['spec'].get('task')}
+            finally:
+                self.running -= 1
+            if not job['future'].done():
+                job['future'].set_result(result)
+
+    async def _execute(self, job: Dict) -> Dict[str, Any]:
+        spec = job['spec']
+        # Контекст и агент задачи - для освобождения после нее
+        acquired: Dict[str, Any] = {}
+        started = time.perf_counter()
+        timeout = spec.get('timeout', self.task_timeout)
+        try:
+            # Ожидание свободного контекста тоже входит в таймаут задачи
+            run = asyncio.ensure_future(self._run(job, acquired))
+            job['future'].add_done_callback(lambda future: run.cancel() if future.cancelled() else None)
+            result = await asyncio.wait_for(run, timeout)
+        except asyncio.TimeoutError:
+            result = {'success': False, 'error': f'Превышен таймаут задачи ({timeout} с)'}
+        except asyncio.CancelledError:
+            # Отменена сама задача, а не воркер - воркер продолжает работу
+            if not job['future'].cancelled():
+                raise
+            result = {'success': False, 'error': 'Задача отменена', 'cancelled': True}
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+        finally:
+            latency = time.perf_counter() - started
+            agent, context = acquired.get('agent'), acquired.get('context')
+            # Ошибка закрытия агента не должна оставлять контекст занятым
+            if agent is not None:
+                try:
+                    await agent.close()
+                except Exception as e:
+                    print(f"Ошибка закрытия агента: {e}")
+            if context is not None:
+                try:
+                    await self.pool.release(context)
+                except Exception as e:
+                    print(f"Ошибка возврата контекста в пул: {e}")
+
+        result = dict(result or {'success': False, 'error': 'Задача прервана'})
+        result['task'] = spec['task']
+        result['latency'] = round(latency, 3)
+        self.latencies.append(latency)
+        if result.get('success'):
+            self.completed += 1
+        else:
+            self.failed += 1
+        return result
+
+    async def _run(self, job: Dict, acquired: Dict[str, Any]) -> Dict[str, Any]:
+        spec = job['spec']
+        acquired['context'] = await self.pool.acquire()
+        agent = AutonomousWebAgent(browser=BrowserController(context=acquired['context']), planner=self.planner)
+        acquired['agent'] = agent
+        if job.get('listener'):
+            agent.add_step_listener(job['listener'])
+        await agent.initialize()
+        if spec.get('url'):
+            await agent.browser.page.goto(spec['url'])
+        return await agent.run_task(spec['task'])
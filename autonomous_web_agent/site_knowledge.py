@@ -0,0 +1,300 @@
+"""Знания о сайтах: какие элементы уже срабатывали на домене и шаблоне страницы.
+
+После задачи агент передает в SiteKnowledge историю из Memory: для
+каждого действия с элементом - URL, действие и запись элемента из
+снимка. По ним строится устойчивый локатор (id, name, placeholder,
+aria-label или текст, xpath - в последнюю очередь) и назначение
+элемента (поиск, вход, пагинация, отправка формы). Хранилище - SQLite с
+индексом по (домен, шаблон страницы).
+
+Успехи засчитываются, только если задача выполнена; ошибки действий -
+всегда. Счетчики затухают с периодом полураспада half_life_days, поэтому
+давно не подтвержденные записи опускаются в выдаче. Записи, которые
+перестали работать (ошибок больше, чем успехов) или затухли почти до
+нуля, удаляются; на домен хранится не больше max_per_domain записей.
+
+База общая для всех агентов процесса (и пула задач): WAL и ожидание
+блокировки вместо ошибки "database is locked". Полная очистка
+(purge) идет не чаще раза в PURGE_INTERVAL на файл базы. learn
+блокирующий - агент вызывает его через asyncio.to_thread.
+
+Перед шагом агент кладет лучшие записи для текущей страницы в
+page_state['site_knowledge']: их видят планировщик (prompt_compiler.py)
+и быстрый путь (fast_path.py).
+"""
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+from urllib.parse import unquote_plus, urlparse
+
+from actions import parse_handle
+
+DAY = 86400
+# Очистка базы - не чаще раза в час на файл; время последней - на процесс
+PURGE_INTERVAL = 3600
+_last_purge: Dict[str, float] = {}
+
+# Сегменты пути, которые меняются от страницы к странице одного шаблона
+VARIABLE_SEGMENT_RE = re.compile(r'^(?:\d+|[0-9a-f]{8,}|[0-9a-f-]{32,36}|.*\d{3,}.*)$', re.IGNORECASE)
+SAFE_ID_RE = re.compile(r'^[A-Za-z][\w-]*$')
+
+PAGINATION_TEXTS = ('дальше', 'далее', 'следующая', 'вперед', 'next', '»', '›', '>')
+LOGIN_TEXTS = ('войти', 'вход', 'login', 'log in', 'sign in')
+SEARCH_HINTS = ('search', 'поиск', 'найти', 'искать', 'query')
+SEARCH_NAMES = ('q', 'query', 'search', 'text', 's', 'k', 'keyword', 'keywords')
+
+
+def page_template(url: str) -> str:
+    """Шаблон страницы: путь без изменчивых сегментов и имена параметров запроса"""
+    parsed = urlparse(url)
+    segments = ['*' if VARIABLE_SEGMENT_RE.match(part) else part
+                for part in parsed.path.split('/') if part]
+    template = '/' + '/'.join(segments)
+    if parsed.query:
+        keys = sorted({pair.split('=', 1)[0] for pair in parsed.query.split('&') if pair})
+        template += '?' + '&'.join(keys)
+    return template
+
+
+def domain_of(url: str) -> str:
+    host = urlparse(url).hostname or ''
+    return host[4:] if host.startswith('www.') else host
+
+
+def _quoted(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def locator_for(el: Dict) -> str:
+    """Устойчивый селектор Playwright для записи элемента из снимка"""
+    tag = el.get('tag', '*')
+    element_id = el.get('id') or ''
+    # Идентификаторы с длинными числами обычно генерируются при каждой загрузке
+    if SAFE_ID_RE.match(element_id) and not re.search(r'\d{3,}', element_id):
+        return f"#{element_id}"
+    for attr, key in (('name', 'name'), ('placeholder', 'placeholder'), ('aria-label', 'label')):
+        if el.get(key):
+            return f'{tag}[{attr}="{_quoted(el[key])}"]'
+    text = ' '.join((el.get('text') or '').split())
+    if text and len(text) <= 40:
+        return f'{tag}:has-text("{_quoted(text)}")'
+    return f"xpath={el.get('xpath', '')}"
+
+
+def element_intent(el: Dict, action_type: str) -> str:
+    """Назначение элемента: search | login | pagination | submit | click | type"""
+    text = ' '.join((el.get('text') or '').split()).lower().rstrip('.!')
+    hints = ' '.join(el.get(key) or '' for key in ('placeholder', 'id', 'class', 'label')).lower()
+    if el.get('tag') in ('input', 'textarea'):
+        if el.get('type') == 'search' or el.get('role') in ('searchbox', 'search') \
+                or (el.get('name') or '').lower() in SEARCH_NAMES or any(h in hints for h in SEARCH_HINTS):
+            return 'search'
+        if el.get('type') == 'password' or any(h in hints for h in ('login', 'логин', 'password', 'пароль')):
+            return 'login'
+    if text in PAGINATION_TEXTS or 'next' in hints or 'pagination' in hints:
+        return 'pagination'
+    if text in LOGIN_TEXTS:
+        return 'login'
+    if el.get('type') == 'submit':
+        return 'submit'
+    return action_type
+
+
+def target_element(action: Dict, page_state: Dict) -> Optional[Dict]:
+    """Элемент из снимка, над которым выполнено действие"""
+    details = action.get('details', {})
+    elements = page_state.get('interactive_elements', [])
+    handle = details.get('element')
+    if handle is not None:
+        handle = parse_handle(handle)
+        if handle is None:
+            return None
+        return next((el for el in elements if el.get('handle') == handle), None)
+    selector = details.get('selector') or ''
+    if selector.startswith('xpath='):
+        xpath = selector[len('xpath='):]
+        return next((el for el in elements if el.get('xpath') == xpath), None)
+    if selector.startswith('#'):
+        return next((el for el in elements if el.get('id') == selector[1:]), None)
+    return next((el for el in elements if locator_for(el) == selector), None)
+
+
+class SiteKnowledge:
+    def __init__(self, path: str, half_life_days: float = 30, max_per_domain: int = 200,
+                 min_weight: float = 0.05):
+        self.half_life = half_life_days * DAY
+        self.max_per_domain = max_per_domain
+        self.min_weight = min_weight
+        self.path = path
+        self.lookups = 0
+        self.hits = 0
+        # learn вызывается из потока asyncio.to_thread
+        self._lock = threading.Lock()
+        # Записи по доменам, прочитанные за текущую задачу (см. cached)
+        self._domains: Dict[str, List[tuple]] = {}
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS knowledge ("
+            "domain TEXT NOT NULL, template TEXT NOT NULL, intent TEXT NOT NULL, "
+            "action TEXT NOT NULL, locator TEXT NOT NULL, label TEXT NOT NULL, "
+            "successes REAL NOT NULL DEFAULT 0, failures REAL NOT NULL DEFAULT 0, "
+            "updated_at REAL NOT NULL, "
+            "PRIMARY KEY (domain, template, action, locator))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS knowledge_page ON knowledge (domain, template)")
+        self._db.commit()
+        self._maybe_purge()
+
+    def _maybe_purge(self):
+        now = time.time()
+        if now - _last_purge.get(self.path, 0.0) >= PURGE_INTERVAL:
+            _last_purge[self.path] = now
+            self.purge(now)
+
+    def _decay(self, updated_at: float, now: float) -> float:
+        return 0.5 ** (max(now - updated_at, 0) / self.half_life)
+
+    def record(self, url: str, action: Dict, element: Dict, success: bool, now: Optional[float] = None,
+               intent: Optional[str] = None):
+        now = now if now is not None else time.time()
+        domain, template = domain_of(url), page_template(url)
+        if not domain:
+            return
+        action_type = action.get('type', '')
+        locator = locator_for(element)
+        row = self._db.execute(
+            "SELECT successes, failures, updated_at, intent FROM knowledge "
+            "WHERE domain = ? AND template = ? AND action = ? AND locator = ?",
+            (domain, template, action_type, locator)).fetchone()
+        successes = failures = 0.0
+        if row:
+            factor = self._decay(row[2], now)
+            successes, failures = row[0] * factor, row[1] * factor
+            # Назначение, выясненное по результату (поиск), не затираем эвристикой
+            intent = intent or row[3]
+        if success:
+            successes += 1
+        else:
+            failures += 1
+        label = ' '.join((element.get('text') or element.get('placeholder') or element.get('label') or '').split())
+        self._db.execute(
+            "INSERT OR REPLACE INTO knowledge "
+            "(domain, template, intent, action, locator, label, successes, failures, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (domain, template, intent or element_intent(element, action_type), action_type, locator,
+             label[:60], successes, failures, now))
+
+    def learn(self, history: List[Dict], task_success: bool, final_url: str = ''):
+        """Действия с элементами из Memory.history (записи с 'url' и 'element');
+        final_url - адрес страницы в конце задачи. Блокирующий вызов"""
+        history = list(history) + [{'url': final_url}]
+        learned = 0
+        with self._lock:
+            for index, record in enumerate(history):
+                element = record.get('element')
+                if not element or not record.get('url'):
+                    continue
+                if record.get('success') and not task_success:
+                    # Действие прошло, но неизвестно, помогло ли оно
+                    continue
+                intent = 'search' if self._led_to_search(record, history[index + 1:index + 4]) else None
+                self.record(record['url'], record['action'], element, bool(record.get('success')),
+                            intent=intent)
+                learned += 1
+            if learned:
+                self._db.commit()
+                self._domains.clear()
+        if learned:
+            self._maybe_purge()
+        return learned
+
+    @staticmethod
+    def _led_to_search(record: Dict, following: List[Dict]) -> bool:
+        """Введенный текст попал в адрес следующих страниц - это было поле поиска"""
+        text = (record['action'].get('details', {}).get('text') or '').strip().lower()
+        if record['action'].get('type') != 'type' or len(text) < 2:
+            return False
+        return any(text in unquote_plus(later.get('url', '')).lower() for later in following)
+
+    def reset_cache(self):
+        """Забыть прочитанные записи: в начале задачи (базу могли изменить другие процессы)"""
+        self._domains.clear()
+
+    def cached(self, url: str) -> bool:
+        """Записи домена уже прочитаны - lookup не обращается к базе"""
+        return domain_of(url) in self._domains
+
+    def lookup(self, url: str, limit: int = 5, now: Optional[float] = None) -> List[Dict]:
+        """Лучшие записи для страницы: сначала ее шаблон, затем весь домен.
+
+        Записи домена читаются из базы один раз до reset_cache или learn;
+        первое чтение блокирующее - агент выполняет его в потоке.
+        """
+        now = now if now is not None else time.time()
+        domain, template = domain_of(url), page_template(url)
+        self.lookups += 1
+        rows = self._domains.get(domain)
+        if rows is None:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT template, intent, action, locator, label, successes, failures, updated_at "
+                    "FROM knowledge WHERE domain = ?", (domain,)).fetchall()
+                self._domains[domain] = rows
+        entries = []
+        for row_template, intent, action, locator, label, successes, failures, updated_at in rows:
+            factor = self._decay(updated_at, now)
+            score = (successes - 2 * failures) * factor
+            if row_template != template:
+                # Элементы шапки сайта (поиск, вход) полезны и на других страницах
+                if intent not in ('search', 'login'):
+                    continue
+                score *= 0.5
+            if score <= 0:
+                continue
+            entries.append({
+                'intent': intent, 'action': action, 'locator': locator, 'label': label,
+                'successes': round(successes * factor, 2), 'failures': round(failures * factor, 2),
+                'score': round(score, 3), 'same_template': row_template == template,
+            })
+        entries.sort(key=lambda entry: -entry['score'])
+        if entries:
+            self.hits += 1
+        return entries[:limit]
+
+    def purge(self, now: Optional[float] = None):
+        """Удаление переставших работать и затухших записей, лимит на домен"""
+        now = now if now is not None else time.time()
+        with self._lock:
+            return self._purge(now)
+
+    def _purge(self, now: float) -> int:
+        stale = []
+        by_domain: Dict[str, List] = {}
+        for rowid, domain, successes, failures, updated_at in self._db.execute(
+                "SELECT rowid, domain, successes, failures, updated_at FROM knowledge"):
+            factor = self._decay(updated_at, now)
+            if failures > successes + 1 or (successes + failures) * factor < self.min_weight:
+                stale.append(rowid)
+            else:
+                by_domain.setdefault(domain, []).append(((successes - 2 * failures) * factor, rowid))
+        for rows in by_domain.values():
+            if len(rows) > self.max_per_domain:
+                rows.sort()
+                stale.extend(rowid for _, rowid in rows[:len(rows) - self.max_per_domain])
+        if stale:
+            self._db.executemany("DELETE FROM knowledge WHERE rowid = ?", [(rowid,) for rowid in stale])
+        self._db.commit()
+        return len(stale)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries, domains = self._db.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT domain) FROM knowledge").fetchone()
+        return {'entries': entries, 'domains': domains, 'lookups': self.lookups, 'hits': self.hits}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,333 @@
+"""Снимок состояния страницы за один вызов page.evaluate.
+
+Скрипт собирает видимый текст, интерактивные элементы и структуру
+страницы за один обход DOM. Все чтения геометрии (offsetParent,
+getBoundingClientRect) идут подряд без записей в DOM, поэтому браузер
+выполняет layout один раз на весь снимок.
+
+В каждый документ один раз ставится трекер (window.__awaTracker) с
+MutationObserver. Он хранит модель последнего снимка внутри страницы:
+если DOM не менялся, снимок возвращает только отпечаток, иначе -
+изменения относительно прошлого снимка в виде splice по строкам текста
+и по элементам. Координаты элементов хранятся относительно документа,
+поэтому скролл сам по себе не меняет модель.
+
+Каждый элемент получает номер (handle), который не меняется, пока узел
+остается в документе. По этому номеру планировщик ссылается на элемент
+("element": N), а контроллер находит его xpath в модели.
+"""
+import hashlib
+
+# Текст собирается со всей страницы; в промпт попадают только релевантные
+# задаче блоки (text_ranking.py)
+MAX_VISIBLE_TEXT = 30000
+
+INTERACTIVE_SELECTOR = ", ".join([
+    'a', 'button', 'input', 'textarea', 'select',
+    '[role="button"]', '[role="link"]', '[role="textbox"]',
+    '[onclick]', '[href]', '[type="submit"]', '[type="button"]',
+])
+
+STRUCTURE_SELECTOR = "h1, h2, h3, h4, h5, h6, nav, header, footer, main, section, article"
+
+TRACKER_SCRIPT = """
+(() => {
+    if (window.__awaTracker) return;
+    const tracker = {
+        version: 1,
+        snapshotVersion: 0,
+        lastMutationAt: performance.now(),
+        fingerprint: null,
+        lines: [],
+        sigs: [],
+        structure: '[]',
+        // Номера элементов: узел сохраняет номер, пока он в документе
+        handles: new WeakMap(),
+        nextHandle: 1
+    };
+    const bump = () => {
+        tracker.version++;
+        tracker.lastMutationAt = performance.now();
+    };
+    new MutationObserver(bump).observe(document, {
+        subtree: true, childList: true, characterData: true, attributes: true
+    });
+    // Прокрутка и размер окна не меняют DOM, но меняют видимую часть
+    // страницы и координаты (в том числе position: fixed) - нужен новый снимок.
+    // lastMutationAt не трогаем: ожидание готовности следит за DOM
+    const moved = () => { tracker.version++; };
+    document.addEventListener('scroll', moved, {passive: true, capture: true});
+    window.addEventListener('resize', moved, {passive: true});
+    Object.defineProperty(window, '__awaTracker', {value: tracker, enumerable: false});
+})();
+"""
+
+SNAPSHOT_SCRIPT = """
+(opts) => {
+    """ + TRACKER_SCRIPT + """
+    const tracker = window.__awaTracker;
+    const scroll = [Math.round(window.scrollX), Math.round(window.scrollY)];
+
+    if (!opts.full && tracker.snapshotVersion === tracker.version) {
+        return {unchanged: true, fingerprint: tracker.fingerprint, title: document.title, scroll};
+    }
+    const reset = opts.full || tracker.snapshotVersion === 0;
+    if (reset) {
+        tracker.lines = [];
+        tracker.sigs = [];
+        tracker.structure = '[]';
+    }
+    tracker.snapshotVersion = tracker.version;
+    const timings = {};
+    let mark = performance.now();
+    const lap = (name) => {
+        const now = performance.now();
+        timings[name] = now - mark;
+        mark = now;
+    };
+
+    const visible = new Map();
+    const isVisible = (el) => {
+        let v = visible.get(el);
+        if (v === undefined) {
+            v = el.offsetParent !== null;
+            visible.set(el, v);
+        }
+        return v;
+    };
+
+    const xpaths = new Map();
+    const getXPath = (el) => {
+        let cached = xpaths.get(el);
+        if (cached !== undefined) return cached;
+        let path;
+        if (el.id !== '') {
+            path = '//*[@id="' + el.id + '"]';
+        } else if (el === document.body || !el.parentElement) {
+            path = '/html/body';
+        } else {
+            let ix = 1;
+            for (let s = el.previousElementSibling; s; s = s.previousElementSibling) {
+                if (s.tagName === el.tagName) ix++;
+            }
+            path = getXPath(el.parentElement) + '/' + el.tagName.toLowerCase() + '[' + ix + ']';
+        }
+        xpaths.set(el, path);
+        return path;
+    };
+
+    // Видимый текст: обход останавливается, как только набран лимит
+    // Для каждой строки - ее вертикальная позиция в документе (для ранжирования
+    // текста по экранам, см. text_ranking.py); соседние узлы одного родителя
+    // делят одно измерение
+    const lines = [];
+    const positions = [];
+    const tops = new Map();
+    let textLength = 0;
+    if (document.body) {
+        const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT);
+        let node;
+        while (textLength < opts.maxText && (node = walker.nextNode())) {
+            const parent = node.parentElement;
+            if (!parent || !isVisible(parent)) continue;
+            const text = node.textContent.trim();
+            if (text.length > 0) {
+                let top = tops.get(parent);
+                if (top === undefined) {
+                    top = Math.round(parent.getBoundingClientRect().top) + scroll[1];
+                    tops.set(parent, top);
+                }
+                lines.push(text.substring(0, opts.maxText - textLength));
+                positions.push(top);
+                textLength += text.length + 1;
+            }
+        }
+    }
+
+    lap('text');
+
+    // Один селектор на все типы: каждый узел попадает в список один раз
+    const elements = [];
+    const sigs = [];
+    const contentSigs = [];
+    document.querySelectorAll(opts.interactiveSelector).forEach(el => {
+        if (!isVisible(el) || (el.offsetWidth <= 0 && el.offsetHeight <= 0)) return;
+        const rect = el.getBoundingClientRect();
+        const record = {
+            tag: el.tagName.toLowerCase(),
+            text: el.textContent?.trim().substring(0, 100) || '',
+            placeholder: el.placeholder || '',
+            type: el.type || '',
+            name: el.getAttribute('name') || '',
+            href: el.href || '',
+            id: el.id || '',
+            class: typeof el.className === 'string' ? el.className : '',
+            role: el.getAttribute('role') || '',
+            label: el.getAttribute('aria-label') || el.title || '',
+            xpath: getXPath(el),
+            doc_x: Math.floor(rect.left + rect.width / 2) + scroll[0],
+            doc_y: Math.floor(rect.top + rect.height / 2) + scroll[1],
+            visible: true
+        };
+        let handle = tracker.handles.get(el);
+        if (handle === undefined) {
+            handle = tracker.nextHandle++;
+            tracker.handles.set(el, handle);
+        }
+        record.handle = handle;
+        elements.push(record);
+        const sig = [record.tag, record.text, record.placeholder, record.type, record.name, record.href,
+                     record.class, record.role, record.label, record.xpath,
+                     record.doc_x, record.doc_y].join('|');
+        contentSigs.push(sig);
+        sigs.push(sig + '|' + handle);
+    });
+
+    lap('elements');
+
+    const structure = [];
+    document.querySelectorAll(opts.structureSelector).forEach(el => {
+        if (!isVisible(el)) return;
+        structure.push({
+            tag: el.tagName.toLowerCase(),
+            text: el.textContent?.trim().substring(0, 200) || '',
+            id: el.id || ''
+        });
+    });
+
+    lap('structure');
+
+    // Изменение списка как один splice: общий префикс и суффикс не пересылаем
+    const diff = (prev, next, items) => {
+        let start = 0;
+        while (start < prev.length && start < next.length && prev[start] === next[start]) start++;
+        let endPrev = prev.length, endNext = next.length;
+        while (endPrev > start && endNext > start && prev[endPrev - 1] === next[endNext - 1]) {
+            endPrev--;
+            endNext--;
+        }
+        if (endPrev === start && endNext === start) return null;
+        return {start, remove: endPrev - start, insert: items.slice(start, endNext)};
+    };
+
+    // Отпечаток содержимого (FNV-1a) - без учета скролла
+    let hash = 0x811c9dc5;
+    const feed = (s) => {
+        for (let i = 0; i < s.length; i++) {
+            hash ^= s.charCodeAt(i);
+            hash = Math.imul(hash, 0x01000193);
+        }
+        hash ^= 10;
+    };
+    // Номера элементов в отпечаток не входят: перерисовка тех же узлов
+    // фреймворком не считается изменением содержимого
+    lines.forEach(feed);
+    contentSigs.forEach(feed);
+    const fingerprint = (hash >>> 0).toString(16).padStart(8, '0');
+
+    const structureJson = JSON.stringify(structure);
+    const result = {
+        unchanged: !reset && fingerprint === tracker.fingerprint,
+        reset,
+        fingerprint,
+        title: document.title,
+        scroll,
+        text: diff(tracker.lines, lines, lines),
+        positions: null,
+        page: [document.documentElement ? document.documentElement.scrollHeight : 0, window.innerHeight],
+        elements: diff(tracker.sigs, sigs, elements),
+        structure: structureJson !== tracker.structure ? structure : null,
+        timings
+    };
+    if (result.text || reset) result.positions = positions;
+    lap('diff');
+    tracker.lines = lines;
+    tracker.sigs = sigs;
+    tracker.structure = structureJson;
+    tracker.fingerprint = fingerprint;
+    return result;
+}
+"""
+
+
+def snapshot_options(max_text: int = MAX_VISIBLE_TEXT, full: bool = False) -> dict:
+    """Аргументы для SNAPSHOT_SCRIPT"""
+    return {
+        'maxText': max_text,
+        'full': full,
+        'interactiveSelector': INTERACTIVE_SELECTOR,
+        'structureSelector': STRUCTURE_SELECTOR,
+    }
+
+
+class PageModel:
+    """Копия модели страницы на стороне Python, собираемая из дельт"""
+
+    def __init__(self):
+        self.lines = []
+        self.elements = []
+        self.structure = []
+        self.positions = []
+        self.page_size = (0, 0)
+        self.fingerprint = None
+
+    def apply(self, snapshot: dict) -> dict:
+        """Применение ответа SNAPSHOT_SCRIPT; возвращает дельту"""
+        if snapshot.get('reset'):
+            self.lines, self.elements, self.structure = [], [], []
+
+        delta = {}
+        for key, items in (('text', self.lines), ('elements', self.elements)):
+            splice = snapshot.get(key)
+            if splice:
+                start = splice['start']
+                items[start:start + splice['remove']] = splice['insert']
+                delta[key] = splice
+        if snapshot.get('structure') is not None:
+            self.structure = snapshot['structure']
+            delta['structure'] = self.structure
+        if snapshot.get('positions') is not None:
+            self.positions = snapshot['positions']
+        if snapshot.get('page'):
+            self.page_size = tuple(snapshot['page'])
+
+        self.fingerprint = snapshot.get('fingerprint')
+        return delta
+
+    def visible_text(self) -> str:
+        return '\n'.join(self.lines)
+
+    def element(self, handle) -> dict:
+        """Элемент по номеру из последнего снимка или None"""
+        for el in self.elements:
+            if el.get('handle') == handle:
+                return el
+        return None
+
+    def interactive_elements(self, scroll) -> list:
+        """Элементы с координатами центра относительно окна"""
+        scroll_x, scroll_y = scroll
+        return [
+            dict(el, center_x=el['doc_x'] - scroll_x, center_y=el['doc_y'] - scroll_y)
+            for el in self.elements
+        ]
+
+
+def structural_fingerprint(page_state: dict) -> str:
+    """Отпечаток структуры страницы без изменчивого текста.
+
+    Учитывает только теги, типы, роли и идентификаторы элементов и
+    заголовочную структуру, поэтому новости в ленте или цены его не меняют.
+    """
+    digest = hashlib.sha1()
+    for el in page_state.get('interactive_elements', []):
+        digest.update('|'.join((
+            el.get('tag', ''), el.get('type', ''), el.get('role', ''),
+            el.get('id', ''), el.get('placeholder', ''),
+        )).encode('utf-8'))
+        digest.update(b'\n')
+    digest.update(b'#')
+    for item in page_state.get('page_structure', []):
+        digest.update(item.get('tag', '').encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()[:16]
@@ -0,0 +1,125 @@
+"""Обнаружение зацикливания агента и ранняя остановка.
+
+Детектор получает каждое выполненное действие вместе с состоянием
+страницы, на котором оно сделано (URL и отпечаток содержимого), и
+распознает три ситуации:
+
+    fallback      планировщик несколько раз подряд не дал ответа
+    cycle         пары (страница, действие) повторяются по кругу
+    no_progress   несколько шагов подряд без нового действия на новой
+                  странице или без успешного результата
+
+Реакция нарастает с каждым обнаружением: подсказка в промпт, затем
+восстанавливающее действие, затем остановка задачи с понятной причиной.
+Несколько шагов с прогрессом подряд сбрасывают уровень реакции.
+"""
+from collections import Counter, deque
+from typing import Dict, List, Optional
+
+from decision_cache import action_signature
+
+HINT, RECOVER, ABORT = 1, 2, 3
+
+
+class Stall:
+    __slots__ = ('kind', 'reason')
+
+    def __init__(self, kind: str, reason: str):
+        self.kind = kind
+        self.reason = reason
+
+
+class StallDetector:
+    def __init__(self, window: int = 12, max_period: int = 4, repeat_limit: int = 3,
+                 no_progress_limit: int = 5, fallback_limit: int = 3, recovery_streak: int = 3):
+        self.window = window
+        self.max_period = max_period
+        self.repeat_limit = repeat_limit
+        self.no_progress_limit = no_progress_limit
+        self.fallback_limit = fallback_limit
+        self.recovery_streak = recovery_streak
+        self.detections: Counter = Counter()
+        self.reset()
+
+    def reset(self):
+        """Новая задача"""
+        self._pairs: deque = deque(maxlen=self.window)
+        self._seen = set()
+        self.no_progress = 0
+        self.fallbacks = 0
+        self.progress_streak = 0
+        self.level = 0
+
+    def record(self, url: str, fingerprint: Optional[str], action: Dict, success: bool,
+               fallback: bool = False):
+        pair = (f"{url}#{fingerprint}", action_signature(action))
+        progressed = success and not fallback and pair not in self._seen
+        self._seen.add(pair)
+        self._pairs.append(pair)
+
+        self.fallbacks = self.fallbacks + 1 if fallback else 0
+        if progressed:
+            self.no_progress = 0
+            self.progress_streak += 1
+            if self.progress_streak >= self.recovery_streak:
+                self.level = 0
+        else:
+            self.no_progress += 1
+            self.progress_streak = 0
+
+    def check(self) -> Optional[Stall]:
+        if self.fallbacks >= self.fallback_limit:
+            return Stall('fallback', f"планировщик {self.fallbacks} раз подряд не дал ответа")
+        period = self._cycle_period()
+        if period == 1:
+            return Stall('cycle', "одно и то же действие повторяется на той же странице")
+        if period:
+            return Stall('cycle', f"действия повторяются по кругу (цикл из {period})")
+        if self.no_progress >= self.no_progress_limit:
+            return Stall('no_progress', f"{self.no_progress} шагов подряд без продвижения")
+        return None
+
+    def escalate(self, stall: Stall) -> int:
+        """Следующий уровень реакции; окно очищается, чтобы новая реакция
+        срабатывала только на новые повторы"""
+        self.level = min(self.level + 1, ABORT)
+        self.detections[stall.kind] += 1
+        self._pairs.clear()
+        self.no_progress = 0
+        self.fallbacks = 0
+        return self.level
+
+    def _cycle_period(self) -> int:
+        pairs = list(self._pairs)
+        for period in range(1, self.max_period + 1):
+            repeats = self.repeat_limit if period == 1 else 2
+            length = period * repeats
+            if len(pairs) < length:
+                break
+            tail = pairs[-length:]
+            if all(tail[i] == tail[i + period] for i in range(length - period)):
+                return period
+        return 0
+
+
+def stall_hint(stall: Stall) -> str:
+    """Подсказка для промпта планировщика"""
+    return (f"Агент застрял: {stall.reason}. Не повторяй предыдущие действия - "
+            f"выбери другой элемент, другой способ или другую страницу.")
+
+
+def recovery_actions(stall: Stall, last_action: Optional[Dict]) -> List[Dict]:
+    """Действия, которые выводят страницу из тупика без вызова модели"""
+    if stall.kind == 'fallback':
+        # Модель недоступна или отвечает мусором - даем ей время
+        return [{'type': 'wait', 'details': {'seconds': 5}}]
+    last_action = last_action or {}
+    # Если застряли на прокрутке вниз - пробуем в обратную сторону
+    scrolled_down = (last_action.get('type') == 'scroll'
+                     and last_action.get('details', {}).get('direction', 'down') == 'down')
+    direction = 'up' if scrolled_down else 'down'
+    return [
+        # Закрыть модальное окно или выпадающее меню, перекрывающее страницу
+        {'type': 'press', 'details': {'key': 'Escape'}},
+        {'type': 'scroll', 'details': {'direction': direction, 'amount': 600}},
+    ]
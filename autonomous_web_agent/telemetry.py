@@ -0,0 +1,210 @@
+"""Трассировка фаз шага и семплирующий профайлер.
+
+Фазы шага оборачиваются в спаны:
+
+    with get_tracer().span('llm', model=...) as span:
+        ...
+        span.attrs['output_tokens'] = 120
+
+Завершенные спаны уходят в экспортеры: JsonlExporter пишет их в файл,
+AggregatingExporter считает перцентили по имени спана в памяти процесса
+(их печатает /status). Вложенность спанов отслеживается через contextvars,
+поэтому параллельные задачи asyncio не путают родителей.
+"""
+import contextvars
+import json
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from utils import percentile
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    __slots__ = ('name', 'parent', 'start', 'duration_ms', 'attrs')
+
+    def __init__(self, name: str, parent: Optional[str], attrs: Dict[str, Any]):
+        self.name = name
+        self.parent = parent
+        self.start = time.time()
+        self.duration_ms = 0.0
+        self.attrs = attrs
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'parent': self.parent,
+            'start': round(self.start, 4),
+            'duration_ms': round(self.duration_ms, 2),
+            **self.attrs,
+        }
+
+
+class JsonlExporter:
+    def __init__(self, path: str):
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def export(self, span: Span):
+        self._file.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + '\n')
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+class AggregatingExporter:
+    """Длительности спанов в памяти; последние max_samples на имя"""
+
+    def __init__(self, max_samples: int = 1000):
+        self.max_samples = max_samples
+        self.durations: Dict[str, List[float]] = defaultdict(list)
+        self.totals: Dict[str, Counter] = defaultdict(Counter)
+
+    def export(self, span: Span):
+        samples = self.durations[span.name]
+        samples.append(span.duration_ms)
+        if len(samples) > self.max_samples:
+            del samples[0]
+        for key, value in span.attrs.items():
+            if key.endswith('_tokens') and isinstance(value, (int, float)):
+                self.totals[span.name][key] += value
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {
+            name: {
+                'count': len(values),
+                'p50': round(percentile(values, 50), 1),
+                'p95': round(percentile(values, 95), 1),
+                **self.totals.get(name, {}),
+            }
+            for name, values in self.durations.items()
+        }
+
+    def format(self) -> str:
+        lines = []
+        for name, stats in sorted(self.summary().items()):
+            extra = ''.join(f", {k}: {v}" for k, v in stats.items() if k.endswith('_tokens'))
+            lines.append(f"  {name:<22} p50 {stats['p50']:>8.1f} мс  p95 {stats['p95']:>8.1f} мс"
+                         f"  (n={stats['count']}{extra})")
+        return "\n".join(lines) if lines else "  Нет данных"
+
+    def close(self):
+        pass
+
+
+class Tracer:
+    def __init__(self, exporters: Optional[list] = None):
+        self.aggregator = AggregatingExporter()
+        self.exporters = [self.aggregator] + list(exporters or [])
+
+    def add_exporter(self, exporter):
+        self.exporters.append(exporter)
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        parent = _current_span.get()
+        span = Span(name, parent.name if parent else None, attrs)
+        token = _current_span.set(span)
+        started = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span.duration_ms = (time.perf_counter() - started) * 1000
+            _current_span.reset(token)
+            self._export(span)
+
+    def record(self, name: str, duration_ms: float, **attrs):
+        """Спан с уже измеренной длительностью (например, время внутри страницы)"""
+        parent = _current_span.get()
+        span = Span(name, parent.name if parent else None, attrs)
+        span.duration_ms = duration_ms
+        self._export(span)
+
+    def close(self):
+        for exporter in self.exporters:
+            exporter.close()
+
+    def _export(self, span: Span):
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                print(f"Ошибка экспорта спана: {e}")
+
+
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    """Общий трассировщик процесса"""
+    return _tracer
+
+
+class SamplingProfiler:
+    """Семплирующий профайлер потока цикла событий.
+
+    Фоновый поток раз в interval секунд снимает стек целевого потока через
+    sys._current_frames(). Считаются функции на вершине стека (self) и все
+    функции в стеке (total). Кадры внутри select() - это ожидание ввода-вывода.
+    """
+
+    def __init__(self, interval: float = 0.005, thread_id: Optional[int] = None):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.samples = 0
+        self.self_counts: Counter = Counter()
+        self.total_counts: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self.thread_id = self.thread_id or threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def report(self, top: int = 15) -> str:
+        if not self.samples:
+            return "Профайлер: нет семплов"
+        lines = [f"Профайлер: {self.samples} семплов, шаг {self.interval * 1000:.0f} мс",
+                 f"  {'self %':>7} {'total %':>8}  функция"]
+        for func, count in self.self_counts.most_common(top):
+            lines.append(f"  {count / self.samples * 100:>7.1f} "
+                         f"{self.total_counts[func] / self.samples * 100:>8.1f}  {func}")
+        return "\n".join(lines)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            seen = set()
+            leaf = True
+            while frame is not None:
+                code = frame.f_code
+                func = f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}"
+                if leaf:
+                    self.self_counts[func] += 1
+                    leaf = False
+                if func not in seen:
+                    self.total_counts[func] += 1
+                    seen.add(func)
+                frame = frame.f_back
@@ -0,0 +1,202 @@
+"""Отбор текста и элементов страницы для промпта по релевантности задаче.
+
+Весь видимый текст страницы делится на блоки (соседние строки с близкой
+вертикальной позицией). Блоки ранжируются BM25 по словам задачи и
+последних действий, и бюджет символов заполняется самыми релевантными
+блоками. Остаток бюджета занимает текст текущего экрана, затем начало
+страницы. Блоки выводятся в порядке следования на странице и помечены
+номером экрана, чтобы модель знала, куда прокручивать.
+
+Интерактивные элементы ранжируются так же по словам задачи, а также по
+близости к текущему экрану и по типу (поля ввода и кнопки полезнее ссылок).
+
+BM25 считается по спискам вхождений: для каждого слова запроса
+обновляются только блоки, где оно встречается.
+"""
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+VOWEL_ENDINGS = set('аеёиоуыэюяйь')
+STOPWORDS = frozenset("""
+и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по только
+ее мне было вот от меня еще нет о из ему теперь когда даже ну вдруг ли если уже или ни
+быть был него до вас нибудь опять уж вам ведь там потом себя ничего ей может они тут где
+есть надо ней для мы тебя их чем была сам чтоб без будто чего раз тоже себе под будет ж
+тогда кто этот того потому этого какой совсем ним здесь этом один почти мой тем чтобы нее
+сейчас были куда зачем всех никогда можно при наконец два об другой хоть после над больше
+тот через эти нас про всего них какая много разве три эту моя впрочем хорошо свою этой
+перед иногда лучше чуть том нельзя такой им более всегда конечно всю между
+найди найти открой перейди сайт сайте страницу страница
+the a an and or of to in on at for is are be with by from this that it as find open site page
+""".split())
+
+# Блок не длиннее этого числа символов и строки в нем не дальше этого по вертикали
+MAX_BLOCK_CHARS = 600
+MAX_LINE_GAP = 60
+
+# Вклад типа элемента в ранг; остальные теги и роли - DEFAULT_TYPE_WEIGHT
+TYPE_WEIGHTS = {
+    'input': 1.0, 'textarea': 1.0, 'select': 0.9, 'textbox': 1.0, 'searchbox': 1.0,
+    'button': 0.8, 'a': 0.5, 'link': 0.5,
+}
+DEFAULT_TYPE_WEIGHT = 0.3
+RELEVANCE_WEIGHT = 2.0
+
+
+def stem(token: str) -> str:
+    """Грубая основа слова: без окончания и не длиннее 6 символов"""
+    if token.isdigit():
+        return token
+    if token.isascii() and len(token) > 3 and token.endswith('s'):
+        token = token[:-1]
+    for _ in range(2):
+        if len(token) > 4 and token[-1] in VOWEL_ENDINGS | {'e'}:
+            token = token[:-1]
+    return token[:6]
+
+
+def tokenize(text: str) -> List[str]:
+    return [stem(t) for t in TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def split_blocks(lines: List[str], positions: List[int]) -> List[Tuple[int, str]]:
+    """Строки текста -> блоки (y, текст) в порядке страницы"""
+    blocks = []
+    text_parts: List[str] = []
+    block_y = last_y = None
+    length = 0
+    for i, line in enumerate(lines):
+        y = positions[i] if i < len(positions) else (last_y or 0)
+        if text_parts and (abs(y - last_y) > MAX_LINE_GAP or length + len(line) > MAX_BLOCK_CHARS):
+            blocks.append((block_y, ' '.join(text_parts)))
+            text_parts, length = [], 0
+        if not text_parts:
+            block_y = y
+        text_parts.append(line)
+        length += len(line) + 1
+        last_y = y
+    if text_parts:
+        blocks.append((block_y, ' '.join(text_parts)))
+    return blocks
+
+
+class BM25:
+    def __init__(self, documents: Iterable[List[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.lengths: List[int] = []
+        for doc_id, tokens in enumerate(documents):
+            self.lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                self.postings[term].append((doc_id, tf))
+        self.avgdl = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    def scores(self, query: Dict[str, float]) -> List[float]:
+        """query: слово -> вес"""
+        n = len(self.lengths)
+        scores = [0.0] * n
+        if not n or not self.avgdl:
+            return scores
+        norm = [self.k1 * (1 - self.b + self.b * dl / self.avgdl) for dl in self.lengths]
+        for term, weight in query.items():
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for doc_id, tf in postings:
+                scores[doc_id] += weight * idf * tf * (self.k1 + 1) / (tf + norm[doc_id])
+        return scores
+
+
+def build_query(task: str, history: List[Dict], history_weight: float = 0.5) -> Dict[str, float]:
+    """Слова задачи с весом 1 и слова из деталей последних действий с меньшим весом"""
+    query: Dict[str, float] = {}
+    for action in history:
+        details = action.get('details', {})
+        text = ' '.join(str(details.get(key, '')) for key in ('text', 'url', 'selector', 'question'))
+        for token in tokenize(text):
+            query[token] = max(query.get(token, 0.0), history_weight)
+    for token in tokenize(task):
+        query[token] = 1.0
+    return query
+
+
+def select_blocks(blocks: List[Tuple[int, str]], query: Dict[str, float], budget: int,
+                  view: Tuple[int, int] = (0, 0)) -> List[Tuple[int, str]]:
+    """Блоки в пределах бюджета символов: сначала релевантные, затем текущий
+    экран (view - верх и низ окна в координатах документа), затем начало страницы"""
+    if not blocks:
+        return []
+    scores = BM25(tokenize(text) for _, text in blocks).scores(query)
+    ranked = sorted((i for i, score in enumerate(scores) if score > 0), key=lambda i: -scores[i])
+    on_screen = [i for i, (y, _) in enumerate(blocks) if view[0] <= y < view[1]]
+
+    chosen = set()
+    used = 0
+    for i in ranked + on_screen + list(range(len(blocks))):
+        if i in chosen:
+            continue
+        length = len(blocks[i][1])
+        if used + length > budget:
+            if used == 0:
+                # Единственный огромный блок - обрезаем, а не пропускаем
+                chosen.add(i)
+                used = budget
+            continue
+        chosen.add(i)
+        used += length
+        if used >= budget:
+            break
+    return [(blocks[i][0], blocks[i][1][:budget]) for i in sorted(chosen)]
+
+
+def format_blocks(selected: List[Tuple[int, str]], viewport: int, scroll_y: int = 0,
+                  page_height: Optional[int] = None) -> str:
+    """Блоки с пометкой экрана: [экран N] или [экран N, виден]"""
+    viewport = max(viewport, 1)
+    current = scroll_y // viewport + 1
+    lines = []
+    for y, text in selected:
+        mark = f"экран {y // viewport + 1}"
+        if scroll_y <= y < scroll_y + viewport:
+            mark += ", виден"
+        lines.append(f"[{mark}] {text}")
+    header = ""
+    if page_height:
+        header = f"(всего экранов: {math.ceil(page_height / viewport)}, сейчас: {current})\n"
+    return header + "\n".join(lines)
+
+
+def element_text(el: Dict) -> str:
+    return ' '.join(el.get(key) or '' for key in ('text', 'label', 'placeholder', 'name', 'id'))
+
+
+def rank_elements(elements: List[Dict], query: Dict[str, float], limit: int,
+                  view: Tuple[int, int] = (0, 0)) -> List[Dict]:
+    """limit самых полезных элементов, лучшие первыми.
+
+    Ранг - сумма релевантности задаче (BM25, нормированный к лучшему
+    элементу), близости к текущему экрану (1 на экране, 1/(1+N) на
+    расстоянии N экранов) и веса типа элемента.
+    """
+    if len(elements) <= 1:
+        return list(elements)
+    relevance = BM25(tokenize(element_text(el)) for el in elements).scores(query)
+    best = max(relevance) or 1.0
+    top, bottom = view
+    height = max(bottom - top, 1)
+
+    def score(i: int) -> float:
+        el = elements[i]
+        y = el.get('doc_y', 0)
+        distance = 0 if top <= y < bottom else (top - y if y < top else y - bottom) / height + 1
+        kind = TYPE_WEIGHTS.get(el.get('role')) or TYPE_WEIGHTS.get(el.get('tag'), DEFAULT_TYPE_WEIGHT)
+        return RELEVANCE_WEIGHT * relevance[i] / best + 1 / (1 + int(distance)) + kind
+
+    order = sorted(range(len(elements)), key=lambda i: -score(i))
+    return [elements[i] for i in order[:limit]]
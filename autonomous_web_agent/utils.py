@@ -0,0 +1,24 @@
+"""Общие вспомогательные функции"""
+import math
+from typing import Dict, Iterable, List
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Перцентиль p (0-100) методом ближайшего ранга"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def latency_summary(values: Iterable[float]) -> Dict[str, float]:
+    """p50/p90/p99 и максимум для списка задержек"""
+    values = list(values)
+    return {
+        'count': len(values),
+        'p50': percentile(values, 50),
+        'p90': percentile(values, 90),
+        'p99': percentile(values, 99),
+        'max': max(values) if values else 0.0,
+    }
@@ -0,0 +1,123 @@
+"""Прогретый браузер для быстрого старта коротких задач.
+
+Запуск Chromium - самая долгая часть старта агента. Демон запускает
+браузер один раз с открытым CDP-портом и держит его, пока не остановлен:
+
+    python warm_pool.py --port 9222 &
+
+Адрес браузера записывается в файл состояния (Config.WARM_STATE_FILE).
+BrowserController и TaskScheduler при старте проверяют этот файл (или
+переменную AGENT_WARM_BROWSER) и подключаются к готовому браузеру через
+connect_over_cdp. Каждая задача получает свой новый контекст - на прогретом
+браузере это миллисекунды. Если демон недоступен, браузер запускается
+как обычно.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+from typing import Optional, Tuple
+from urllib.request import urlopen
+
+from config import Config
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _warm_state() -> Optional[dict]:
+    """Файл состояния запущенного демона или None"""
+    try:
+        with open(Config.WARM_STATE_FILE, encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(state, dict) or not _alive(state.get('pid', 0)):
+        return None
+    return state
+
+
+def warm_endpoint() -> Optional[str]:
+    """CDP-адрес прогретого браузера или None"""
+    if Config.WARM_BROWSER:
+        return Config.WARM_BROWSER
+    state = _warm_state()
+    return state.get('endpoint') if state else None
+
+
+async def connect_or_launch(playwright, headless: bool, args=None) -> Tuple[object, bool]:
+    """Браузер для агента; второй элемент - True, если это прогретый браузер"""
+    endpoint = warm_endpoint()
+    if endpoint:
+        try:
+            browser = await playwright.chromium.connect_over_cdp(endpoint)
+        except Exception as e:
+            print(f"Прогретый браузер недоступен ({e}), запускаю новый")
+        else:
+            # Режим окон задан при запуске демона, headless агента не применяется
+            state = None if Config.WARM_BROWSER else _warm_state()
+            warm_headless = state.get('headless') if state else None
+            if warm_headless != headless:
+                mode = {True: 'без окон', False: 'с окнами'}.get(warm_headless, 'в режиме демона')
+                print(f"Параметр headless={headless} не учитывается: прогретый браузер запущен {mode}")
+            return browser, True
+    browser = await playwright.chromium.launch(headless=headless, args=args or [])
+    return browser, False
+
+
+async def serve(port: int, headless: bool):
+    from playwright.async_api import async_playwright
+
+    async with async_playwright() as playwright:
+        browser = await playwright.chromium.launch(
+            headless=headless,
+            args=[f'--remote-debugging-port={port}'],
+        )
+        # Первая страница поднимает процессы рендерера и сети заранее
+        context = await browser.new_context(viewport=Config.VIEWPORT)
+        page = await context.new_page()
+        await page.goto('about:blank')
+        await context.close()
+
+        with urlopen(f'http://127.0.0.1:{port}/json/version') as response:
+            endpoint = json.load(response)['webSocketDebuggerUrl']
+        state = {'pid': os.getpid(), 'endpoint': endpoint, 'port': port, 'headless': headless}
+        with open(Config.WARM_STATE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        print(f"Прогретый браузер готов: {endpoint}")
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        browser.on('disconnected', lambda _: stop.set())
+        try:
+            await stop.wait()
+        finally:
+            try:
+                os.remove(Config.WARM_STATE_FILE)
+            except OSError:
+                pass
+            if browser.is_connected():
+                await browser.close()
+        print("Прогретый браузер остановлен")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Демон с прогретым браузером')
+    parser.add_argument('--port', type=int, default=9222, help='CDP-порт браузера')
+    parser.add_argument('--headed', action='store_true', help='Показывать окна браузера')
+    args = parser.parse_args()
+    asyncio.run(serve(args.port, headless=not args.headed))
+
+
+if __name__ == "__main__":
+    main()